@@ -1,5 +1,6 @@
 import os
 import logging
+import click
 from flask import Flask, render_template
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
@@ -46,6 +47,9 @@ with app.app_context():
         logger.info("Initializing database tables...")
         db.create_all() # データベースとテーブルが存在しない場合に作成
         logger.info("Database tables checked/created successfully.")
+        models.ensure_columns() # 既存テーブルに後から追加した列を作成
+        models.ensure_indexes() # 既存テーブルに後から追加したインデックスを作成
+        models.ensure_rollups() # 既存DBの履歴から日別集計を初回作成
 
         # データベース接続テスト (オプション)
         try:
@@ -71,6 +75,33 @@ def index():
     # return render_template('index.html')
     return "Kart Rumble Backend is running!", 200
 
+# --- メンテナンス用CLIコマンド (flask --app app <コマンド名>) ---
+@app.cli.command('ensure-indexes')
+def ensure_indexes_command():
+    """既存DBに不足しているインデックスを作成する"""
+    import models
+    models.ensure_indexes()
+
+@app.cli.command('rebuild-rollups')
+@click.option('--guild-id', default=None, help="対象サーバーID (省略時は全サーバー)")
+def rebuild_rollups_command(guild_id):
+    """ポイント履歴から日別集計 (player_point_daily) を作り直す"""
+    from models import PlayerPointDaily
+    rows = PlayerPointDaily.rebuild(guild_id)
+    click.echo(f"Rebuilt {rows} daily rollup rows.")
+
+@app.cli.command('check-rollups')
+@click.option('--guild-id', default=None, help="対象サーバーID (省略時は全サーバー)")
+def check_rollups_command(guild_id):
+    """日別集計がポイント履歴と一致しているか確認する"""
+    from models import PlayerPointDaily
+    mismatches = PlayerPointDaily.check_consistency(guild_id)
+    for mismatch in mismatches[:50]:
+        click.echo(f"MISMATCH {mismatch}")
+    if mismatches:
+        raise SystemExit(f"{len(mismatches)} inconsistent rollup rows found. Run 'flask --app app rebuild-rollups' to fix.")
+    click.echo("Daily rollups are consistent with point history.")
+
 # 不要になった create_database 関数は削除しました。
 # def create_database():
 #     if not os.path.exists('site.db'):
@@ -0,0 +1,178 @@
+"""ゲートウェイのインテント・キャッシュ設定 (gateway_profile) によるメモリ使用量の比較
+
+    python benchmarks/bench_gateway_memory.py --guilds 300 --messages 200
+
+多数のサーバーに参加している状態を再現し、疑似的な GUILD_CREATE と、各インテントで届くイベント
+(MESSAGE_CREATE・MESSAGE_REACTION_ADD・TYPING_START・VOICE_STATE_UPDATE) を discord.py の
+ConnectionState にそのまま読み込ませて、キャッシュに残るメモリ (tracemalloc) と処理時間を比較する。
+メモリはサーバー情報の読み込み後 (guilds) と全イベントの処理後 (total) に計る。
+処理時間は tracemalloc の影響を受けないよう、計測を止めた別の実行で計る。
+Discord はインテントを有効にしていないイベントを送らないので、プロファイルごとに届くイベントだけを流す。
+メッセージ本文のインテントが無い場合は、本文を空にして流す (Bot へのメンションを除く)。
+イベントの処理は commands.Bot で行うので、プレフィックスのコマンド判定 (on_message) の時間も含まれる。
+"""
+import gc
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOT_USER_ID = 10_000
+TIMESTAMP = "2024-01-01T00:00:00+00:00"
+
+
+def user_payload(user_id: int) -> dict:
+    return {"id": str(user_id), "username": f"user{user_id}", "discriminator": "0", "avatar": None, "global_name": f"User {user_id}"}
+
+
+def member_payload(user_id: int) -> dict:
+    return {"user": user_payload(user_id), "roles": [], "joined_at": TIMESTAMP, "deaf": False, "mute": False, "flags": 0}
+
+
+def guild_payload(guild_id: int, args) -> dict:
+    base = guild_id * 100_000
+    channels = [{"id": str(base + 1 + i), "type": 0, "name": f"text-{i}", "position": i, "permission_overwrites": []}
+                for i in range(args.channels)]
+    channels += [{"id": str(base + 1_001 + i), "type": 2, "name": f"voice-{i}", "position": i, "permission_overwrites": [], "bitrate": 64000, "user_limit": 0}
+                 for i in range(2)]
+    roles = [{"id": str(guild_id), "name": "@everyone", "permissions": "104324673", "position": 0, "color": 0, "hoist": False, "managed": False, "mentionable": False}]
+    roles += [{"id": str(base + 2_001 + i), "name": f"role-{i}", "permissions": "0", "position": i + 1, "color": 0, "hoist": False, "managed": False, "mentionable": False}
+              for i in range(args.roles)]
+    emojis = [{"id": str(base + 3_001 + i), "name": f"emoji{i}", "roles": [], "require_colons": True, "managed": False, "animated": False, "available": True}
+              for i in range(args.emojis)]
+    return {
+        "id": str(guild_id), "name": f"guild-{guild_id}", "owner_id": str(base + 50_000), "member_count": args.users * 10,
+        "channels": channels, "roles": roles, "emojis": emojis, "stickers": [], "features": [], "threads": [],
+        "members": [member_payload(BOT_USER_ID)], "voice_states": [], "presences": [], "large": True, "unavailable": False,
+    }
+
+
+def guild_events(guild_id: int, args, intents, rng: random.Random):
+    """1サーバー分のイベント (届くものだけ) を (イベント名, データ) で返す"""
+    base = guild_id * 100_000
+    users = [base + 50_000 + i for i in range(args.users)]
+    events = []
+    if intents.voice_states:
+        for user_id in users[:args.voice_members]:
+            events.append(("VOICE_STATE_UPDATE", {"guild_id": str(guild_id), "channel_id": str(base + 1_001), "user_id": str(user_id),
+                                                  "member": member_payload(user_id), "session_id": "x", "deaf": False, "mute": False,
+                                                  "self_deaf": False, "self_mute": False, "self_video": False, "suppress": False,
+                                                  "request_to_speak_timestamp": None}))
+    for i in range(args.messages):
+        user_id = rng.choice(users)
+        channel_id = str(base + 1 + rng.randrange(args.channels))
+        message_id = base * 1_000 + i
+        if intents.guild_typing:
+            events.append(("TYPING_START", {"guild_id": str(guild_id), "channel_id": channel_id, "user_id": str(user_id),
+                                            "timestamp": 1_700_000_000, "member": member_payload(user_id)}))
+        if intents.guild_messages:
+            content = f"message {i} from {user_id} " + "x" * rng.randrange(10, 120)
+            mentions = []
+            if i % 50 == 0:
+                content = f"<@{BOT_USER_ID}> ranking" # Bot へのメンション (本文のインテントが無くても届く)
+                mentions = [user_payload(BOT_USER_ID)]
+            elif not intents.message_content:
+                content = ""
+            events.append(("MESSAGE_CREATE", {
+                "id": str(message_id), "channel_id": channel_id, "guild_id": str(guild_id), "author": user_payload(user_id),
+                "member": {k: v for k, v in member_payload(user_id).items() if k != "user"}, "content": content,
+                "timestamp": TIMESTAMP, "edited_timestamp": None, "tts": False, "mention_everyone": False, "mentions": mentions,
+                "mention_roles": [], "attachments": [], "embeds": [], "pinned": False, "type": 0}))
+        if intents.guild_reactions and rng.random() < args.reaction_rate:
+            reactor = rng.choice(users)
+            events.append(("MESSAGE_REACTION_ADD", {"guild_id": str(guild_id), "channel_id": channel_id, "message_id": str(message_id),
+                                                    "user_id": str(reactor), "member": member_payload(reactor), "emoji": {"id": None, "name": "🔥"},
+                                                    "type": 0, "burst": False}))
+    return events
+
+
+async def run_profile(options: dict, args) -> dict:
+    """1つの設定で全サーバー分の GUILD_CREATE とイベントを処理し、計測結果を返す (メモリは tracemalloc の実行中のみ)"""
+    import discord
+    from discord.ext import commands
+
+    gc.collect()
+    tracing = tracemalloc.is_tracing()
+    before = tracemalloc.get_traced_memory()[0] if tracing else 0
+    bot = commands.Bot(command_prefix='!' if options["intents"].message_content else commands.when_mentioned, **options)
+    await bot._async_setup_hook() # ログイン時と同じくイベントループを設定する
+    state = bot._connection
+    state.user = discord.ClientUser(state=state, data=user_payload(BOT_USER_ID) | {"bot": True})
+    rng = random.Random(args.seed)
+    intents = options["intents"]
+
+    guild_ids = [1_000 + i for i in range(args.guilds)]
+    for guild_id in guild_ids:
+        state._get_create_guild(guild_payload(guild_id, args))
+    gc.collect()
+    guilds_loaded = tracemalloc.get_traced_memory()[0] if tracing else 0
+
+    events, parse_seconds = 0, 0.0
+    for guild_id in guild_ids:
+        batch = guild_events(guild_id, args, intents, rng) # イベントデータの生成は計測に含めない
+        started = time.perf_counter()
+        for name, data in batch:
+            state.parsers[name](data)
+        await asyncio.sleep(0) # on_message (コマンド判定) のタスクを実行させる
+        await asyncio.sleep(0)
+        parse_seconds += time.perf_counter() - started
+        events += len(batch)
+        del batch
+
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0] if tracing else 0
+    result = {
+        "intents": intents.value,
+        "events": events,
+        "parse_seconds": parse_seconds,
+        "guilds_mb": (guilds_loaded - before) / 1024 / 1024,
+        "total_mb": (after - before) / 1024 / 1024,
+        "members": sum(len(guild._members) for guild in bot.guilds),
+        "messages": len(state._messages) if state._messages is not None else 0,
+    }
+    state.clear()
+    del bot, state
+    gc.collect()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--guilds', type=int, default=300, help="参加しているサーバー数")
+    parser.add_argument('--channels', type=int, default=20, help="1サーバーのテキストチャンネル数")
+    parser.add_argument('--roles', type=int, default=30, help="1サーバーのロール数")
+    parser.add_argument('--emojis', type=int, default=40, help="1サーバーの絵文字数")
+    parser.add_argument('--users', type=int, default=200, help="1サーバーで発言するユーザー数")
+    parser.add_argument('--voice-members', type=int, default=5, help="1サーバーのボイスチャンネル参加者数")
+    parser.add_argument('--messages', type=int, default=200, help="1サーバーのメッセージ数")
+    parser.add_argument('--reaction-rate', type=float, default=0.3, help="メッセージ1件あたりのリアクション数")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_ROOT)
+    from gateway_profile import PROFILE_DEFAULT, PROFILE_MINIMAL, build_client_options
+    logging.disable(logging.WARNING)
+
+    profiles = [
+        ("default", build_client_options(PROFILE_DEFAULT, message_content=True, prefix_commands=True)),
+        ("minimal (mention)", build_client_options(PROFILE_MINIMAL, message_content=False, prefix_commands=True)),
+        ("minimal (slash)", build_client_options(PROFILE_MINIMAL, message_content=False, prefix_commands=False)),
+    ]
+    print(f"guilds: {args.guilds}, channels: {args.channels}, roles: {args.roles}, emojis: {args.emojis}, "
+          f"users: {args.users}, messages/guild: {args.messages}")
+    print(f"{'profile':<20}{'intents':>10}{'events':>9}{'parse':>9}{'guilds':>10}{'total':>10}{'members':>9}{'messages':>10}")
+    for label, options in profiles:
+        timing = asyncio.run(run_profile(options, args))
+        tracemalloc.start()
+        memory = asyncio.run(run_profile(options, args))
+        tracemalloc.stop()
+        print(f"{label:<20}{memory['intents']:>10}{memory['events']:>9}{timing['parse_seconds']:>8.2f}s"
+              f"{memory['guilds_mb']:>8.1f}MB{memory['total_mb']:>8.1f}MB{memory['members']:>9}{memory['messages']:>10}")
+
+if __name__ == '__main__':
+    main()
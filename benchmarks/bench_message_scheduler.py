@@ -0,0 +1,139 @@
+"""送信スケジューラ (message_scheduler) の効果の計測
+
+    python benchmarks/bench_message_scheduler.py --races 60 --players 20 --time-scale 0.02
+
+同時に進行する複数レースの実況を、Discord のレート制限 (1チャンネル 5件/5秒・全体 50件/秒) を
+再現した疑似チャンネルに送り、従来どおり1行ずつ直接送る場合とスケジューラ経由の場合とで
+API 呼び出し回数・429 (制限超過) の回数・レース1本の所要時間・送信までの待ち時間を比較する。
+429 を受けたら discord.py と同じく retry_after だけ待って再送する。
+時間 (実況の待ち時間・制限の窓・API の応答時間) はすべて --time-scale 倍に縮めて実行する。
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import argparse
+from collections import deque
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FakeDiscord:
+    """レート制限付きの疑似 Discord (スライディングウィンドウで送信数を数える)"""
+
+    def __init__(self, scale: float, api_latency: float):
+        self.scale = scale
+        self.api_latency = api_latency * scale
+        self.global_window = deque() # 直近1秒の送信時刻
+        self.channel_windows = {} # channel_id -> 直近5秒の送信時刻
+        self.calls = 0
+        self.rate_limited = 0
+
+    async def send(self, channel_id: int, text: str):
+        while True:
+            await asyncio.sleep(self.api_latency)
+            now = time.perf_counter()
+            global_window = self.global_window
+            channel_window = self.channel_windows.setdefault(channel_id, deque())
+            while global_window and now - global_window[0] > 1.0 * self.scale: global_window.popleft()
+            while channel_window and now - channel_window[0] > 5.0 * self.scale: channel_window.popleft()
+            self.calls += 1
+            if len(global_window) >= 50:
+                retry_after = 1.0 * self.scale - (now - global_window[0])
+            elif len(channel_window) >= 5:
+                retry_after = 5.0 * self.scale - (now - channel_window[0])
+            else:
+                global_window.append(now); channel_window.append(now)
+                return text
+            self.rate_limited += 1
+            await asyncio.sleep(max(retry_after, 0.0))
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int, discord_api: FakeDiscord):
+        self.id = channel_id
+        self.api = discord_api
+        self.messages = []
+
+    async def send(self, text: str):
+        message = await self.api.send(self.id, text)
+        self.messages.append(message)
+        return message
+
+
+def build_scripts(races: int, players: int):
+    """races 本のレースを最後まで計算し、実況メッセージの一覧を返す"""
+    from game_logic import GameState, Player
+    from race_events import RaceEvents, RaceCourse
+    from race_script import build_race_script
+    scripts = []
+    for race in range(races):
+        game = GameState(str(race), RaceEvents(), points_saver=lambda *args: None, seed=race)
+        course_name, _ = RaceCourse(rng=game.rng).get_random_course()
+        for i in range(players):
+            player = Player(1_000_000 + i, f"Player{i}")
+            player.strategy = random.choice(GameState.STRATEGIES)
+            game.add_player(player)
+        game.race_started = True
+        scripts.append(build_race_script(game, course_name))
+    return scripts
+
+
+async def run_races(scripts, scale: float, api_latency: float, use_scheduler: bool):
+    """全レースを同時に再生し、(疑似Discord, 所要時間のリスト, スケジューラ統計) を返す"""
+    from race_script import RacePlayback
+    from message_scheduler import (MessageScheduler, PRIORITY_HIGH, PRIORITY_LOW, MESSAGE_CHANNEL_RATE, MESSAGE_CHANNEL_BURST,
+                                   MESSAGE_GLOBAL_RATE, MESSAGE_GLOBAL_BURST)
+    api = FakeDiscord(scale, api_latency)
+    scheduler = MessageScheduler(channel_rate=MESSAGE_CHANNEL_RATE / scale, channel_burst=MESSAGE_CHANNEL_BURST,
+                                 global_rate=MESSAGE_GLOBAL_RATE / scale, global_burst=MESSAGE_GLOBAL_BURST)
+    durations = []
+
+    async def sleep(seconds: float):
+        await asyncio.sleep(seconds * scale)
+
+    async def race(channel_id: int, script):
+        channel = FakeChannel(channel_id, api)
+        started = time.perf_counter()
+        if use_scheduler:
+            async def send_line(line):
+                await scheduler.send(channel, line.text, PRIORITY_HIGH if line.kind in ('outcome', 'result') else PRIORITY_LOW)
+            await RacePlayback(script).play(send_line, sleep)
+            await scheduler.flush(channel_id)
+        else:
+            await RacePlayback(script).play(lambda line: channel.send(line.text), sleep)
+        durations.append((time.perf_counter() - started) / scale)
+
+    await asyncio.gather(*(race(index, script) for index, script in enumerate(scripts)))
+    return api, durations, scheduler.get_stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--races', type=int, default=60, help="同時に進行するレース数")
+    parser.add_argument('--players', type=int, default=20, help="1レースの人間プレイヤー数")
+    parser.add_argument('--time-scale', type=float, default=0.02, help="時間の縮尺")
+    parser.add_argument('--api-latency', type=float, default=0.15, help="1回の送信にかかる秒数 (縮尺前)")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_ROOT)
+    logging.disable(logging.WARNING)
+
+    random.seed(args.seed)
+    scripts = build_scripts(args.races, args.players)
+    lines = sum(len(script) for script in scripts)
+    print(f"races: {args.races} (同時進行), players: {args.players}, messages: {lines}, time scale: {args.time_scale}")
+    print(f"{'mode':<12}{'API calls':>10}{'429s':>8}{'race avg':>10}{'race max':>10}{'queue avg':>11}{'queue max':>11}")
+    for label, use_scheduler in (("direct", False), ("scheduler", True)):
+        api, durations, stats = asyncio.run(run_races(scripts, args.time_scale, args.api_latency, use_scheduler))
+        queue_avg = f"{stats['avg_latency_seconds'] / args.time_scale:.2f}s" if use_scheduler else "-"
+        queue_max = f"{stats['max_latency_seconds'] / args.time_scale:.2f}s" if use_scheduler else "-"
+        print(f"{label:<12}{api.calls:>10}{api.rate_limited:>8}{sum(durations) / len(durations):>9.1f}s"
+              f"{max(durations):>9.1f}s{queue_avg:>11}{queue_max:>11}")
+
+
+if __name__ == '__main__':
+    main()
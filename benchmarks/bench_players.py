@@ -0,0 +1,91 @@
+"""プレイヤー表現 (Player / PlayerTable) のメモリ量とラップ処理時間の計測
+
+    python benchmarks/bench_players.py --players 500 --races 200
+
+PlayerTable を使う場合 (既定) と各 Player に状態を持たせる場合とで、
+1レース (GameState + 参加者) あたりのメモリ量と、
+ラップ処理 (reset_lap_usage から check_game_end まで) 1回あたりの時間を比較する。
+ポイントはDBに保存せず捨てる。
+"""
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def build_game(GameState, Player, RaceEvents, players: int, use_player_table: bool):
+    """人間プレイヤーを参加させた開始前の GameState を作る"""
+    game = GameState("bench", RaceEvents(), points_saver=lambda *args: None, use_player_table=use_player_table)
+    for i in range(players):
+        player = Player(1_000_000 + i, f"Player{i}")
+        player.strategy = random.choice(GameState.STRATEGIES)
+        game.add_player(player)
+    return game
+
+
+def run_laps(game) -> int:
+    """レースを最後まで進め、処理したラップ数を返す (bot.py のラップループと同じ順序)"""
+    game.race_started = True
+    laps = 0
+    while not game.game_finished and game.current_lap < 200:
+        game.reset_lap_usage()
+        laps += 1
+        if game.final_duel:
+            game.process_final_duel()
+            game.check_game_end()
+            break
+        game.process_lap_pairwise()
+        game.process_revivals()
+        game.process_forced_elimination()
+        game.process_revolution()
+        game.get_lap_summary()
+        if game.check_game_end():
+            break
+    return laps
+
+
+def measure(GameState, Player, RaceEvents, args, use_player_table: bool):
+    """(1レースあたりのメモリ KiB, 1ラップあたりの時間 us) を返す"""
+    random.seed(args.seed)
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    game = build_game(GameState, Player, RaceEvents, args.players, use_player_table)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del game
+    memory_kib = (after - before) / 1024
+
+    random.seed(args.seed)
+    games = [build_game(GameState, Player, RaceEvents, args.players, use_player_table) for _ in range(args.races)]
+    started = time.perf_counter()
+    total_laps = sum(run_laps(game) for game in games)
+    elapsed = time.perf_counter() - started
+    return memory_kib, elapsed / total_laps * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--players', type=int, default=500, help="1レースの人間プレイヤー数")
+    parser.add_argument('--races', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_ROOT)
+    from game_logic import GameState, Player # noqa: E402
+    from race_events import RaceEvents # noqa: E402
+    logging.disable(logging.WARNING) # ラップごとのログ出力を計測に含めない
+
+    print(f"players: {args.players}, races: {args.races}, sizeof(Player): {sys.getsizeof(Player(0, 'x'))} bytes")
+    print(f"{'layout':<16}{'memory/race (KiB)':>20}{'time/lap (us)':>16}")
+    for label, use_player_table in (("Player only", False), ("PlayerTable", True)):
+        memory_kib, lap_us = measure(GameState, Player, RaceEvents, args, use_player_table)
+        print(f"{label:<16}{memory_kib:>20.1f}{lap_us:>16.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""レース1回あたりのテキスト生成コスト (RaceEvents / RaceCourse) の計測
+
+    python benchmarks/bench_race_events.py --races 2000
+
+start_race_command と同じく1レースごとに RaceEvents / RaceCourse を生成し、
+典型的な1レース分のテキスト (追い抜き・スキル・復活・最終決戦) を生成したときの
+所要時間と tracemalloc で計測したメモリ確保量を表示する。
+
+比較のため、共有カタログ (TEXT_CATALOG) 導入前の実装も LegacyRaceEvents / LegacyRaceCourse として
+このファイルに残してある (レースごとにテキストの dict / list を作り直し、未使用テキストを線形に探し、
+最終決戦は30個の候補を毎回すべて整形する)。両方を同じ実行で計測し、並べて表示する。
+  - setup: RaceEvents / RaceCourse の生成 + アナウンス + 最終決戦のみ
+  - race:  setup に加えて各ラップの追い抜き・スキル・復活のテキストを生成
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from race_events import RaceEvents, RaceCourse # noqa: E402
+from race_events import (COURSES, STRATEGY_DESCRIPTIONS, EVENT_TEMPLATES, ANNOUNCER_COMMENT_TEMPLATES, # noqa: E402
+                         ANNOUNCER_NAMES, FINAL_BATTLE_TEMPLATES, FINAL_BATTLE_CLOSING_TEMPLATE)
+
+
+class BenchPlayer:
+    """テキスト生成に必要な属性だけを持つダミープレイヤー"""
+    def __init__(self, id: int, name: str):
+        self.id = id
+        self.name = name
+
+
+class LegacyRaceCourse:
+    """カタログ導入前の RaceCourse (コースの dict をレースごとに作る)"""
+    def __init__(self, rng: random.Random) -> None:
+        self.courses = dict(COURSES)
+        self.rng = rng
+
+    def get_random_course(self):
+        course_name = self.rng.choice(list(self.courses.keys()))
+        return course_name, self.courses[course_name]
+
+
+class LegacyRaceEvents:
+    """カタログ導入前の RaceEvents (テキストの dict / list と使用済みの set をレースごとに作る)"""
+    def __init__(self, rng: random.Random) -> None:
+        self.rng = rng
+        self.strategy_descriptions = dict(STRATEGY_DESCRIPTIONS)
+        self.events = {event_type: list(templates) for event_type, templates in EVENT_TEMPLATES.items()}
+        self._used_event_texts = {key: set() for key in self.events}
+
+    def get_announcer_comment(self, favored_strategy, course_name: str) -> str:
+        base_comments = list(ANNOUNCER_COMMENT_TEMPLATES)
+        announcers = list(ANNOUNCER_NAMES)
+        comment_template = self.rng.choice(base_comments)
+        strategy_desc = "各レーサーの腕の見せ所"
+        if favored_strategy and favored_strategy in self.strategy_descriptions:
+            strategy_desc = self.strategy_descriptions[favored_strategy]
+        return comment_template.format(announcer_name=self.rng.choice(announcers), course_name=course_name, strategy_desc=strategy_desc)
+
+    def _get_unused_event(self, event_type: str) -> str:
+        available_events = [event for event in self.events[event_type] if event not in self._used_event_texts.get(event_type, set())]
+        if not available_events:
+            self._used_event_texts[event_type] = set()
+            available_events = self.events[event_type]
+        selected_event = self.rng.choice(available_events)
+        self._used_event_texts[event_type].add(selected_event)
+        return selected_event
+
+    def get_overtake_text(self, winner, loser) -> str:
+        return self._get_unused_event('overtake').format(winner=winner.name, loser=loser.name)
+
+    def get_skill_text(self, player) -> str:
+        return self._get_unused_event('skill').format(player=player.name)
+
+    def get_revival_text(self, player) -> str:
+        return self._get_unused_event('revival').format(player=player.name)
+
+    def get_random_final_battle_text(self, player1, player2):
+        # 旧実装は30個の f-string を呼び出しのたびにすべて整形していた
+        battle_texts_pool = [template.format(player1=player1.name, player2=player2.name) for template in FINAL_BATTLE_TEMPLATES]
+        selected_texts = self.rng.sample(battle_texts_pool, 7)
+        selected_texts.append(FINAL_BATTLE_CLOSING_TEMPLATE.format(player1=player1.name, player2=player2.name))
+        return selected_texts
+
+
+IMPLEMENTATIONS = {
+    "legacy": (LegacyRaceEvents, LegacyRaceCourse),
+    "catalog": (RaceEvents, RaceCourse),
+}
+
+
+def run_race_texts(events_cls, course_cls, rng: random.Random, players, laps: int, battles_per_lap: int, skills_per_lap: int):
+    """1レース分のテキストを生成する (毎回同じ処理量になるよう、乱数は呼び出し元のシード付き rng を使う)"""
+    race_events = events_cls(rng=rng)
+    course_name, _ = course_cls(rng=rng).get_random_course()
+    race_events.get_announcer_comment('top_speed', course_name)
+    for _ in range(laps):
+        for _ in range(battles_per_lap):
+            winner, loser = rng.sample(players, 2)
+            race_events.get_overtake_text(winner, loser)
+        for player in rng.sample(players, skills_per_lap):
+            race_events.get_skill_text(player)
+        race_events.get_revival_text(players[0])
+    race_events.get_random_final_battle_text(players[0], players[1])
+
+
+def measure(events_cls, course_cls, args, players, laps: int):
+    """(1レースあたりの時間 [us], 1レースあたりの確保量のピーク [KiB]) を返す"""
+    rng = random.Random(args.seed)
+    skills = min(args.skills, len(players))
+    run_race_texts(events_cls, course_cls, rng, players, laps, args.battles, skills) # ウォームアップ
+
+    started = time.perf_counter()
+    for _ in range(args.races):
+        run_race_texts(events_cls, course_cls, rng, players, laps, args.battles, skills)
+    elapsed = time.perf_counter() - started
+
+    # メモリ確保量は1レース分ずつ計測して平均する
+    sample_races = min(args.races, 200)
+    total_allocated = 0
+    tracemalloc.start()
+    for _ in range(sample_races):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        run_race_texts(events_cls, course_cls, rng, players, laps, args.battles, skills)
+        _, peak = tracemalloc.get_traced_memory()
+        total_allocated += peak - before
+    tracemalloc.stop()
+    return elapsed / args.races * 1e6, total_allocated / sample_races / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--races', type=int, default=2000)
+    parser.add_argument('--players', type=int, default=30)
+    parser.add_argument('--laps', type=int, default=8)
+    parser.add_argument('--battles', type=int, default=4, help="1ラップあたりの追い抜き数")
+    parser.add_argument('--skills', type=int, default=10, help="1ラップあたりのスキル数")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    players = [BenchPlayer(i, f"Player{i}") for i in range(args.players)]
+
+    print(f"races: {args.races}, players: {args.players}, laps: {args.laps}")
+    print(f"{'':<8}{'legacy us':>12}{'catalog us':>12}{'ratio':>8}{'legacy KiB':>13}{'catalog KiB':>13}{'ratio':>8}")
+    for label, laps in (("setup", 0), ("race", args.laps)):
+        results = {name: measure(events_cls, course_cls, args, players, laps) for name, (events_cls, course_cls) in IMPLEMENTATIONS.items()}
+        (legacy_us, legacy_kib), (catalog_us, catalog_kib) = results["legacy"], results["catalog"]
+        print(f"{label:<8}{legacy_us:>12.1f}{catalog_us:>12.1f}{catalog_us / legacy_us:>7.2f}x"
+              f"{legacy_kib:>13.1f}{catalog_kib:>13.1f}{catalog_kib / legacy_kib:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
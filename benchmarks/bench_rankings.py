@@ -0,0 +1,102 @@
+"""ランキング取得 (PlayerPoints.get_rankings) のレイテンシ計測
+
+    python benchmarks/bench_rankings.py --rows 1000000
+
+一時的な SQLite DB に player_point_history を指定行数投入し、
+日別集計 (player_point_daily) を作成したうえで、
+インデックスあり/なしで週間・月間・累計ランキングの取得時間を比較する。
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def populate(db, PlayerPoints, PlayerPointHistory, rows: int, guilds: int, players: int, seed: int):
+    """ベンチマーク用の履歴とプレイヤーデータを投入する"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    chunk_size = 50_000
+    totals = {}
+    inserted = 0
+    while inserted < rows:
+        batch = []
+        for _ in range(min(chunk_size, rows - inserted)):
+            guild_id = str(rng.randrange(guilds))
+            discord_id = str(rng.randrange(players))
+            points = rng.choice((2, 2, 2, 5, 7, 10))
+            key = (discord_id, guild_id)
+            totals[key] = totals.get(key, 0) + points
+            batch.append({
+                'discord_id': discord_id,
+                'guild_id': guild_id,
+                'points_earned': points,
+                'total_points': totals[key],
+                'timestamp': now - timedelta(seconds=rng.randrange(365 * 24 * 3600)),
+                'game_number': 0,
+            })
+        db.session.execute(PlayerPointHistory.__table__.insert(), batch)
+        inserted += len(batch)
+    db.session.execute(PlayerPoints.__table__.insert(), [
+        {'discord_id': discord_id, 'guild_id': guild_id, 'points': points, 'total_games': 0, 'last_updated': now}
+        for (discord_id, guild_id), points in totals.items()
+    ])
+    db.session.commit()
+
+
+def measure(PlayerPoints, guilds: int, repeat: int):
+    """各期間のランキング取得時間 (1回あたりの平均ミリ秒) を返す"""
+    results = {}
+    for period in ('weekly', 'monthly', 'all'):
+        started = time.perf_counter()
+        for i in range(repeat):
+            PlayerPoints.get_rankings(guild_id=str(i % guilds), period=period, limit=5)
+        results[period] = (time.perf_counter() - started) * 1000 / repeat
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000, help="player_point_history の行数")
+    parser.add_argument('--guilds', type=int, default=50, help="サーバー数")
+    parser.add_argument('--players', type=int, default=2_000, help="プレイヤー数")
+    parser.add_argument('--repeat', type=int, default=20, help="期間ごとの計測回数")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    # app をインポートする前に一時DBを指定する
+    db_path = os.path.join(tempfile.mkdtemp(prefix="kart_rumble_bench_"), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    sys.path.insert(0, REPO_ROOT)
+    from app import app, db
+    from models import PlayerPoints, PlayerPointHistory, PlayerPointDaily, ensure_indexes
+
+    with app.app_context():
+        started = time.perf_counter()
+        populate(db, PlayerPoints, PlayerPointHistory, args.rows, args.guilds, args.players, args.seed)
+        print(f"Inserted {args.rows} history rows in {time.perf_counter() - started:.1f}s ({db_path})")
+        started = time.perf_counter()
+        rollup_rows = PlayerPointDaily.rebuild()
+        print(f"Built {rollup_rows} daily rollup rows in {time.perf_counter() - started:.1f}s")
+
+        with_indexes = measure(PlayerPoints, args.guilds, args.repeat)
+
+        indexes = [index for model in (PlayerPoints, PlayerPointHistory, PlayerPointDaily) for index in model.__table__.indexes]
+        for index in indexes:
+            index.drop(bind=db.engine)
+        without_indexes = measure(PlayerPoints, args.guilds, args.repeat)
+        ensure_indexes()
+
+    print(f"{'period':<10}{'no index (ms)':>16}{'indexed (ms)':>16}{'speedup':>10}")
+    for period in ('weekly', 'monthly', 'all'):
+        before, after = without_indexes[period], with_indexes[period]
+        print(f"{period:<10}{before:>16.2f}{after:>16.2f}{before / after if after else float('inf'):>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""ベクトル化ラップ処理 (lap_engine.VectorLapEngine) と従来処理の統計的な同等性チェック
+
+    python benchmarks/check_lap_engine.py --players 300 --races 400
+
+同じ人数のレースを従来処理とベクトル化処理でそれぞれ最後まで進め、
+ラップ数・脱落/復活人数・強制脱落や革命の回数・有利作戦の優勝率などの平均を比較する。
+レースは bot.py と同じ race_script.generate_race_script で進める。
+平均の差を標準誤差で割った z 値の絶対値が --max-z を超えた項目があれば終了コード 1 を返す。
+1ラップあたりの処理時間も表示する。ポイントはDBに保存せず捨てる。
+"""
+import os
+import sys
+import math
+import time
+import random
+import logging
+import argparse
+from collections import Counter
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+METRICS = ("laps", "eliminated_lap1", "survivors_lap1", "revived", "forced_elims", "revolutions", "favored_winner", "final_duel")
+
+
+def run_race(GameState, Player, RaceEvents, RaceCourse, generate_race_script, players: int, vectorized: bool):
+    """1レースを bot.py と同じ generate_race_script で最後まで進め、(指標の辞書, ラップ数, 処理時間) を返す"""
+    game = GameState("check", RaceEvents(), points_saver=lambda *args: None,
+                     vector_lap_min_players=0 if vectorized else sys.maxsize)
+    course_name, _ = RaceCourse(rng=game.rng).get_random_course()
+    for i in range(players):
+        player = Player(1_000_000 + i, f"Player{i}")
+        player.strategy = random.choice(GameState.STRATEGIES)
+        game.add_player(player)
+    game.race_started = True
+    stats = dict.fromkeys(METRICS, 0)
+
+    def count_lap(kinds: Counter):
+        stats["revolutions"] += 1 if kinds['revolution'] else 0
+        stats["forced_elims"] += 1 if kinds['accident'] else 0
+        stats["revived"] += max(0, kinds['revival'] - 1) # 見出し1行 + 復活者1人につき1行
+
+    started = time.perf_counter()
+    lap_kinds: Counter = Counter()
+    for line in generate_race_script(game, course_name): # 実況テキストは出来事を数えるためだけに使う
+        if line.kind == 'lap':
+            count_lap(lap_kinds); lap_kinds.clear()
+            if game.current_lap > 200: break
+        elif line.kind == 'summary' and game.current_lap == 1:
+            stats["eliminated_lap1"] = len(game.eliminated_this_lap)
+            stats["survivors_lap1"] = game.get_active_count()
+        lap_kinds[line.kind] += 1
+    count_lap(lap_kinds)
+    elapsed = time.perf_counter() - started
+
+    stats["laps"] = game.current_lap
+    stats["final_duel"] = 1 if game.final_duel else 0
+    favored = game.get_favored_strategy()
+    stats["favored_winner"] = 1 if game.winner is not None and game.winner.strategy == favored else 0
+    return stats, game.current_lap, elapsed
+
+
+def summarize(samples):
+    """指標ごとの (平均, 分散) を返す"""
+    summary = {}
+    count = len(samples)
+    for metric in METRICS:
+        values = [sample[metric] for sample in samples]
+        mean = sum(values) / count
+        variance = sum((value - mean) ** 2 for value in values) / (count - 1) if count > 1 else 0.0
+        summary[metric] = (mean, variance)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--players', type=int, default=300, help="1レースの人間プレイヤー数")
+    parser.add_argument('--races', type=int, default=400, help="処理ごとのレース数")
+    parser.add_argument('--max-z', type=float, default=4.0, help="許容する z 値の上限")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_ROOT)
+    import lap_engine # noqa: E402
+    from game_logic import GameState, Player # noqa: E402
+    from race_events import RaceEvents, RaceCourse # noqa: E402
+    from race_script import generate_race_script # noqa: E402
+    logging.disable(logging.WARNING) # ラップごとのログ出力を計測に含めない
+    if not lap_engine.is_available():
+        print("NumPy is not installed; the vectorized lap engine is unavailable.")
+        return 1
+
+    results = {}
+    for label, vectorized in (("scalar", False), ("vectorized", True)):
+        random.seed(args.seed)
+        samples, total_laps, total_seconds = [], 0, 0.0
+        for _ in range(args.races):
+            stats, laps, elapsed = run_race(GameState, Player, RaceEvents, RaceCourse, generate_race_script, args.players, vectorized)
+            samples.append(stats); total_laps += laps; total_seconds += elapsed
+        results[label] = (summarize(samples), total_seconds / total_laps * 1e6)
+
+    scalar, scalar_lap_us = results["scalar"]
+    vectorized, vectorized_lap_us = results["vectorized"]
+    print(f"players: {args.players}, races: {args.races} per engine")
+    print(f"{'metric':<18}{'scalar':>12}{'vectorized':>12}{'z':>8}")
+    failed = False
+    for metric in METRICS:
+        (mean_a, var_a), (mean_b, var_b) = scalar[metric], vectorized[metric]
+        stderr = math.sqrt(var_a / args.races + var_b / args.races)
+        z = (mean_b - mean_a) / stderr if stderr else 0.0
+        flag = " *" if abs(z) > args.max_z else ""
+        failed = failed or bool(flag)
+        print(f"{metric:<18}{mean_a:>12.3f}{mean_b:>12.3f}{z:>8.2f}{flag}")
+    print(f"time per lap: scalar {scalar_lap_us:.1f} us, vectorized {vectorized_lap_us:.1f} us")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
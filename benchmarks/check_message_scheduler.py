@@ -0,0 +1,76 @@
+"""送信スケジューラ (message_scheduler) のチャンネル単位のレート制限のチェック
+
+    python benchmarks/check_message_scheduler.py --messages 40 --time-scale 0.05
+
+1つのチャンネルへ一定間隔でメッセージを enqueue し (実況のように、送信の合間にキューが空になる)、
+実際に送信された時刻を記録する。どの --window 秒の区間でも送信数が
+MESSAGE_CHANNEL_BURST + MESSAGE_CHANNEL_RATE * window を超えないことを、いくつかの送信間隔で確認する。
+まとめて送られた分も含め、全てのメッセージが届いたことも確認する。
+超えた区間か届かなかったメッセージがあれば終了コード 1 を返す。時間はすべて --time-scale 倍に縮めて実行する。
+"""
+import os
+import sys
+import asyncio
+import argparse
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+        self.sent_at = []
+        self.lines = 0
+
+    async def send(self, text: str):
+        self.sent_at.append(asyncio.get_running_loop().time())
+        self.lines += text.count("\n") + 1
+        return text
+
+
+async def run_channel(interval: float, messages: int, scale: float):
+    """interval 秒ごとに1件ずつ enqueue し、(チャンネル, burst, rate) を返す"""
+    from message_scheduler import MessageScheduler, MESSAGE_CHANNEL_RATE, MESSAGE_CHANNEL_BURST, MESSAGE_GLOBAL_RATE, MESSAGE_GLOBAL_BURST
+    scheduler = MessageScheduler(channel_rate=MESSAGE_CHANNEL_RATE / scale, channel_burst=MESSAGE_CHANNEL_BURST,
+                                 global_rate=MESSAGE_GLOBAL_RATE / scale, global_burst=MESSAGE_GLOBAL_BURST)
+    channel = FakeChannel(1)
+    for i in range(messages):
+        scheduler.enqueue(channel, f"line {i}")
+        await asyncio.sleep(interval * scale)
+    await scheduler.flush(channel.id)
+    return channel, MESSAGE_CHANNEL_BURST, MESSAGE_CHANNEL_RATE
+
+
+def max_in_window(times, window: float) -> int:
+    """長さ window のどの区間でも、その中に入る時刻の最大数"""
+    best, start = 0, 0
+    for end in range(len(times)):
+        while times[end] - times[start] >= window: start += 1
+        best = max(best, end - start + 1)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=40, help="1回の確認で enqueue するメッセージ数")
+    parser.add_argument('--intervals', type=str, default="0.05,0.5,1.0,2.0", help="enqueue の間隔 (秒, カンマ区切り)")
+    parser.add_argument('--window', type=float, default=5.0, help="Discord の制限の窓 (秒)")
+    parser.add_argument('--time-scale', type=float, default=0.05, help="時間の縮尺")
+    args = parser.parse_args()
+    sys.path.insert(0, REPO_ROOT)
+
+    print(f"messages: {args.messages}, window: {args.window}s, time scale: {args.time_scale}")
+    print(f"{'interval':>10}{'lines':>8}{'sent':>8}{'max/window':>12}{'limit':>8}")
+    failed = False
+    for interval in (float(value) for value in args.intervals.split(',')):
+        channel, burst, rate = asyncio.run(run_channel(interval, args.messages, args.time_scale))
+        limit = burst + rate * args.window
+        worst = max_in_window(channel.sent_at, args.window * args.time_scale)
+        flag = " *" if worst > limit or channel.lines != args.messages else ""
+        failed = failed or bool(flag)
+        print(f"{interval:>9.2f}s{channel.lines:>8}{len(channel.sent_at):>8}{worst:>12}{limit:>8.1f}{flag}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
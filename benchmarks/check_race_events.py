@@ -0,0 +1,88 @@
+"""実況テキストの山札 (RaceEvents._get_unused_event_index) のチェック
+
+    python benchmarks/check_race_events.py --passes 20 --races 20000
+
+イベントタイプごとに次の3点を確認し、1つでも満たさなければ終了コード 1 を返す。
+  - 山札を --passes 周引いたとき、各周がテンプレート番号の順列になっている (使い切るまで同じテキストが出ない)
+  - --races 本の新しいレースで最初に引かれる番号の頻度が一様 (各番号の z 値の絶対値が --max-z 以下)
+  - 途中まで引いた山札を get_deck_state → JSON → set_deck_state で復元すると、以降に引く番号が元と一致する
+"""
+import os
+import sys
+import json
+import math
+import random
+import argparse
+from collections import Counter
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def check_permutations(RaceEvents, event_type: str, size: int, passes: int, seed: int) -> bool:
+    """山札の各周がテンプレート番号の順列になっているか"""
+    events = RaceEvents(rng=random.Random(seed))
+    for _ in range(passes):
+        drawn = [events._get_unused_event_index(event_type) for _ in range(size)]
+        if sorted(drawn) != list(range(size)):
+            return False
+    return True
+
+
+def first_draw_max_z(RaceEvents, event_type: str, size: int, races: int, seed: int) -> float:
+    """新しいレースで最初に引かれる番号の頻度の、一様分布からのずれの最大 z 値"""
+    rng = random.Random(seed)
+    counts = Counter(RaceEvents(rng=rng)._get_unused_event_index(event_type) for _ in range(races))
+    expected = races / size
+    stddev = math.sqrt(races * (1 / size) * (1 - 1 / size)) or 1.0
+    return max(abs(counts.get(index, 0) - expected) / stddev for index in range(size))
+
+
+def check_round_trip(RaceEvents, event_types, seed: int) -> bool:
+    """get_deck_state / set_deck_state で復元した山札から、元と同じ順に引けるか"""
+    rng = random.Random(seed)
+    events = RaceEvents(rng=rng)
+    for offset, event_type in enumerate(event_types):
+        for _ in range(offset * 3 + 1): # タイプごとに引く位置をずらす
+            events._get_unused_event_index(event_type)
+    state = json.loads(json.dumps(events.get_deck_state())) # チェックポイントと同じく JSON を経由する
+    restored = RaceEvents(rng=random.Random())
+    restored.rng.setstate(rng.getstate())
+    restored.set_deck_state(state)
+    if restored.get_deck_state() != events.get_deck_state():
+        return False
+    for event_type in event_types:
+        for _ in range(50): # 山札の引き直しをまたぐ
+            if restored._get_unused_event_index(event_type) != events._get_unused_event_index(event_type):
+                return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--passes', type=int, default=20, help="順列を確認する山札の周回数")
+    parser.add_argument('--races', type=int, default=20000, help="最初の1枚の頻度を数えるレース数")
+    parser.add_argument('--max-z', type=float, default=4.5, help="許容する z 値の上限")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_ROOT)
+    from race_events import RaceEvents, TEXT_CATALOG # noqa: E402
+
+    event_types = [event_type for event_type, templates in TEXT_CATALOG.events.items() if templates]
+    print(f"passes: {args.passes}, races: {args.races}")
+    print(f"{'event type':<32}{'texts':>6}{'permutation':>13}{'first z':>9}")
+    failed = False
+    for event_type in event_types:
+        size = len(TEXT_CATALOG.events[event_type])
+        permutations_ok = check_permutations(RaceEvents, event_type, size, args.passes, args.seed)
+        max_z = first_draw_max_z(RaceEvents, event_type, size, args.races, args.seed)
+        flag = " *" if not permutations_ok or max_z > args.max_z else ""
+        failed = failed or bool(flag)
+        print(f"{event_type:<32}{size:>6}{'ok' if permutations_ok else 'NG':>13}{max_z:>9.2f}{flag}")
+    round_trip_ok = check_round_trip(RaceEvents, event_types, args.seed)
+    print(f"deck state round trip: {'ok' if round_trip_ok else 'NG *'}")
+    return 1 if failed or not round_trip_ok else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,21 +1,32 @@
 import os
+import sys
 import discord
 from discord.ext import commands
 import asyncio
 import logging
-import random
 from dotenv import load_dotenv
-from typing import Dict, Optional # Optional をインポート
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Callable, Dict, List, NamedTuple, Optional, Set # Optional をインポート
 
 # UI部品をインポート
-from discord import Interaction, ButtonStyle
+from discord import Interaction, ButtonStyle, app_commands
 from discord.ui import View, Button
 
 # 修正: 正しい場所からインポート
-from app import app, db # FlaskアプリとDBオブジェクト
 from game_logic import GameState, Player, STRATEGY_START_DASH, STRATEGY_TOP_SPEED, STRATEGY_CORNERING # 作戦定数もインポート
 from race_events import RaceEvents, RaceCourse # イベントテキストとコース
-from models import PlayerPoints, PlayerPointHistory # DBモデル
+import db_executor # DB処理をイベントループ外のスレッドプールで実行
+from leaderboard_cache import leaderboard_cache # ランキングキャッシュ (統計表示用)
+from user_resolver import UserNameResolver # ランキング表示用の表示名解決
+import race_log # レース展開の記録 (オフライン再生用)
+from race_script import RacePlayback, ScriptLine, build_race_script, generate_race_script # レース実況の生成と再生
+from message_scheduler import message_scheduler, PRIORITY_LOW, PRIORITY_NORMAL, PRIORITY_HIGH # レート制限を考慮した送信キュー
+from pacing import PACING_PROFILES, PacingProfile, Pacer, get_profile # 実況の送信間隔
+from join_updater import JoinMessageUpdater # 参加受付メッセージの更新をまとめる
+from gateway_profile import GATEWAY_PROFILE, build_client_options # インテントとキャッシュの設定
+import race_checkpoint # 進行中のレースの保存と再起動後の再開
+from race_checkpoint import checkpoint_writer, RACE_CHECKPOINT_ENABLED, RACE_CHECKPOINT_RESUME_MAX_AGE_SECONDS, PHASE_RECRUITING, PHASE_RUNNING, PHASE_PLAYBACK
 
 # ロギング設定 (bot.py 用)
 logging.basicConfig(
@@ -31,21 +42,43 @@ logger = logging.getLogger(__name__)
 # .envファイルから環境変数を読み込む
 load_dotenv()
 
+# --- シャード設定 (shard_supervisor.py がワーカーごとに設定する) ---
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '0')) # 0 ならシャード分割しない
+SHARD_IDS = [int(shard_id) for shard_id in os.getenv('SHARD_IDS', '').split(',') if shard_id.strip()] # このプロセスが担当するシャード (空なら全て)
+FAKE_GATEWAY = os.getenv('FAKE_GATEWAY', 'False') == 'True' # Discord に接続せず疑似サーバーでレースを開催する (fake_gateway.py)
+
+# --- コマンド設定 ---
+MESSAGE_CONTENT_INTENT = os.getenv('MESSAGE_CONTENT_INTENT', 'True') == 'True' # False なら本文を受け取らない (スラッシュコマンドと @メンション のコマンドのみ)
+APP_COMMANDS_SYNC = os.getenv('APP_COMMANDS_SYNC', 'True') == 'True' # 起動時にスラッシュコマンドを Discord へ登録する
+PREFIX_COMMANDS_ENABLED = os.getenv('PREFIX_COMMANDS_ENABLED', 'True') == 'True' # False ならメッセージのイベントを受け取らない (スラッシュコマンドのみ, minimal のとき)
+
 # トークンの取得
 token = os.getenv('DISCORD_TOKEN')
-if not token:
+if not token and not FAKE_GATEWAY:
     logger.critical("Discord token not found! Please set the DISCORD_TOKEN environment variable.")
     exit(1)
 
-# Botの設定
-intents = discord.Intents.default()
-intents.message_content = True
-intents.reactions = True
-# intents.members = True # 必要なら有効化
-bot = commands.Bot(command_prefix='!', intents=intents)
-
-# 進行中のゲームをチャンネルIDごとに管理する辞書
+# Botの設定 (インテントとキャッシュは GATEWAY_PROFILE で選ぶ)
+try:
+    client_options = build_client_options(GATEWAY_PROFILE, MESSAGE_CONTENT_INTENT, PREFIX_COMMANDS_ENABLED)
+except ValueError as e:
+    logger.critical(str(e))
+    exit(1)
+# 本文を受け取らない場合、プレフィックスのコマンドは Bot へのメンション (本文が届く) でだけ受け付ける
+command_prefix = '!' if MESSAGE_CONTENT_INTENT else commands.when_mentioned
+if SHARD_COUNT:
+    # 担当シャードのサーバーのイベントだけを受け取る (games もそのサーバーのレースだけになる)
+    bot = commands.AutoShardedBot(command_prefix=command_prefix, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS or None, **client_options)
+else:
+    bot = commands.Bot(command_prefix=command_prefix, **client_options)
+
+# 進行中のゲームをチャンネルIDごとに管理する辞書 (シャード分割時はこのプロセスの担当サーバー分のみ)
 games: Dict[int, GameState] = {}
+race_playbacks: Dict[int, RacePlayback] = {} # 事前計算済みで再生中のレース (channel_id -> 再生カーソル)
+guild_pacing_profiles: Dict[str, Optional[str]] = {} # サーバーごとの実況ペース設定 (DBから読み込んだもの)
+
+# ランキング表示用の表示名リゾルバ (キャッシュ + 並列 fetch_user)
+user_name_resolver = UserNameResolver(bot)
 
 # --- CPU名解決ヘルパー ---
 CPU_NAMES_LOOKUP = {
@@ -63,14 +96,21 @@ async def on_ready():
         logger.info(f'Bot is ready! Logged in as {bot.user.name} (ID: {bot.user.id})')
         logger.info(f'Using discord.py version {discord.__version__}')
         logger.info(f'Connected to {len(bot.guilds)} guilds')
+        logger.info(f'Gateway profile: {GATEWAY_PROFILE} (intents: {bot.intents.value})')
+        if SHARD_COUNT: logger.info(f'Shards: {SHARD_IDS or "all"} of {SHARD_COUNT}')
         try:
-            with app.app_context():
-                from sqlalchemy import text
-                db.session.execute(text('SELECT 1'))
+            await db_executor.ping()
             logger.info("Database connection test successful on_ready.")
         except Exception as e:
             logger.error(f"Database connection test failed on_ready: {e}", exc_info=True)
             # await bot.close() # DB接続必須なら終了
+        global _checkpoints_restored
+        if not _checkpoints_restored:
+            _checkpoints_restored = True
+            try:
+                await restore_race_checkpoints([str(guild.id) for guild in bot.guilds], bot.get_channel) # 中断されたレースを再開
+            except Exception as e:
+                logger.error(f"Failed to restore race checkpoints: {e}", exc_info=True)
         logger.info("Bot is online and ready!")
     except Exception as e:
         logger.error(f"Error in on_ready: {e}", exc_info=True)
@@ -94,227 +134,288 @@ async def on_guild_join(guild: discord.Guild):
 
 
 # --- ゲーム進行ロジック ---
-async def run_race_simulation(ctx: commands.Context, game: GameState, course_name: str): # course_name を引数に追加
-    """レースのシミュレーションを実行し、Discordに状況を送信する"""
-    channel = ctx.channel
-    logger.info(f"Starting race simulation in channel {channel.id} (Guild: {game.guild_id})")
+RACE_PRECOMPUTE = os.getenv('RACE_PRECOMPUTE', 'True') == 'True' # レース全体を先に計算してから再生する
+MESSAGE_SCHEDULER_ENABLED = os.getenv('MESSAGE_SCHEDULER_ENABLED', 'True') == 'True' # 実況を送信スケジューラ経由で送る
 
+# 実況メッセージの種類ごとの送信優先度 (最終結果を演出テキストより先に送る)
+LINE_PRIORITIES = {'outcome': PRIORITY_HIGH, 'result': PRIORITY_HIGH, 'summary': PRIORITY_NORMAL}
+
+async def get_guild_pacing(guild_id: str) -> PacingProfile:
+    """サーバーの実況ペースのプロファイルを返す (初回のみDBから読み込む)"""
+    if guild_id not in guild_pacing_profiles:
+        try:
+            guild_pacing_profiles[guild_id] = await db_executor.get_pacing_profile(guild_id)
+        except Exception as e:
+            logger.error(f"Failed to load pacing profile for guild {guild_id}: {e}", exc_info=True)
+            return get_profile(None) # 読み込めなければ既定 (次回また読み込む)
+    return get_profile(guild_pacing_profiles[guild_id])
+
+def count_live_races() -> int:
+    """進行中 (開始済み) のレース数"""
+    return len(race_playbacks) + sum(1 for game in games.values() if game.race_started)
+
+def race_line_sender(channel: discord.abc.Messageable):
+    """実況メッセージを1つ送る関数を返す (スケジューラ有効時はキューに入れるだけで送信完了を待たない)"""
+    if not MESSAGE_SCHEDULER_ENABLED:
+        async def send_direct(line: ScriptLine):
+            await channel.send(line.text)
+        return send_direct
+    async def send_scheduled(line: ScriptLine):
+        await message_scheduler.send(channel, line.text, LINE_PRIORITIES.get(line.kind, PRIORITY_LOW))
+    return send_scheduled
+
+def save_checkpoint(channel_id: int, guild_id: str, phase: str, data: race_checkpoint.CheckpointData, position: int = 0, urgent: bool = False):
+    """レースのチェックポイントを書き込み待ちに入れる (DBへはまとめて書き込まれる)"""
+    if RACE_CHECKPOINT_ENABLED:
+        checkpoint_writer.put(channel_id, guild_id, phase, data, position, urgent)
+
+def checkpoint_game(channel_id: int, game: GameState, course_name: str, phase: str, urgent: bool = False):
+    """現在のゲーム状態をチェックポイントとして保存する"""
+    if not RACE_CHECKPOINT_ENABLED: return
     try:
-        # 0. コース発表 (run_race_simulation の呼び出し元で行うように変更しても良い)
-        # await channel.send(f"🏁 レース開始！今回のコースは『**{course_name}**』！\n*{course_description}*")
-        # await asyncio.sleep(3)
-
-        # ★追加: アナウンサーコメント
-        favored_strategy = game.get_favored_strategy()
-        announcer_comment = game.race_events.get_announcer_comment(favored_strategy, course_name)
-        await channel.send(f"🎤 **アナウンス**\n{announcer_comment}")
-        await asyncio.sleep(3)
-
-        # 1. メインループ (ゲーム終了まで)
-        while not game.check_game_end():
-            # 1.1 ラップ開始処理
-            game.reset_lap_usage()
-            current_lap = game.current_lap
-            await channel.send(f"\n━━━━━━━━━━━━━━━━━━━━━\n**📢 LAP {current_lap}!**\n━━━━━━━━━━━━━━━━━━━━━")
-            await asyncio.sleep(2)
-
-            # --- ★ 修正: 一騎打ちでないラップでのみ通常イベントを処理 ---
-            if not game.final_duel:
-                # 1.2 イベントフェーズ (革命、復活、強制脱落)
-                logger.debug(f"Lap {current_lap}: Starting event phase.")
-                # (革命)
-                rev_happened, rev_msg, _, _ = game.process_revolution()
-                if rev_happened:
-                    await channel.send(f"\n🚨 **革命発生！** 🚨\n{rev_msg}")
-                    await asyncio.sleep(3)
-                    if game.check_game_end(): break # イベントで終了する可能性
-                # (復活)
-                # (重要: 革命で終了していなければ復活チェック)
-                if not game.game_finished:
-                    revived_players, revival_msgs = game.process_revivals()
-                    if revival_msgs:
-                         await channel.send("\n🔥 **猛烈な追い上げ！** 🔥") # テキスト変更済み
-                         for msg in revival_msgs: await channel.send(msg); await asyncio.sleep(1.5)
-                # (強制脱落)
-                # (重要: 革命や復活で終了していなければ強制脱落チェック)
-                if not game.game_finished:
-                    eliminated_players, forced_elim_msgs = game.process_forced_elimination()
-                    if forced_elim_msgs:
-                        await channel.send("\n💥 **アクシデント発生！** 💥")
-                        await channel.send(forced_elim_msgs[0]); await asyncio.sleep(1)
-                        await channel.send(forced_elim_msgs[1]); await asyncio.sleep(2)
-                        if game.check_game_end(): break # イベントで終了する可能性
-            # --- ★ イベントフェーズの if ブロックここまで ---
-
-           # bot.py の run_race_simulation 関数内
-
-            # 1.3 アクションフェーズ (ペア対決 or 一騎打ち)
-            logger.debug(f"Lap {current_lap}: Starting action phase.")
-            if game.game_finished: break
-
-            if game.final_duel:
-                # 一騎打ち処理 (変更なし)
-                logger.info(f"Lap {current_lap}: Processing final duel.")
-                battle_msgs, outcome_msg = game.process_final_duel()
-                if battle_msgs:
-                     await channel.send("\n🔥 **最終決戦！一騎打ち！** 🔥"); await asyncio.sleep(1)
-                     for msg in battle_msgs: await channel.send(msg); await asyncio.sleep(2.5)
-                     await asyncio.sleep(1)
-                await channel.send(f"\n**{outcome_msg}**")
-                break
-            else:
-                # bot.py の run_race_simulation 関数内 (アクションフェーズの else ブロック)
-
-                # --- ★ 通常ラップのメッセージ送信方法を変更 ---
-                logger.debug(f"Lap {current_lap}: Processing pairwise lap.")
-                overtake_msgs, skill_msgs = game.process_lap_pairwise()
-
-                # 追い抜きメッセージをまとめる (変更なし)
-                if overtake_msgs:
-                    combined_overtakes = "\n💥 **今ラップの主な攻防！** 💥\n" + "\n".join(overtake_msgs)
-                    if len(combined_overtakes) > 2000:
-                         await channel.send("\n💥 **今ラップの主な攻防！** 💥\n（多数の追い抜きが発生）") # 短縮版
-                         logger.warning("Combined overtake message too long.")
-                    else:
-                         await channel.send(combined_overtakes)
-                    await asyncio.sleep(2)
-
-                # --- ★ スキルメッセージの表示数を制限する ---
-                if skill_msgs:
-                    max_skill_display = 5 # 表示する最大スキル数
-                    if len(skill_msgs) > max_skill_display:
-                        # リストからランダムに5つ選ぶ
-                        display_skills = random.sample(skill_msgs, max_skill_display)
-                        # 省略したことを示すメッセージを追加
-                        display_skills.append(f"（他 {len(skill_msgs) - max_skill_display} 人もスキルを発揮！）")
-                    else:
-                        # 5つ以下の場合はそのまま表示
-                        display_skills = skill_msgs
+        data = race_checkpoint.encode_checkpoint(game, course_name)
+    except Exception as e:
+        logger.error(f"Failed to encode race checkpoint for channel {channel_id}: {e}", exc_info=True)
+        return
+    save_checkpoint(channel_id, game.guild_id, phase, data, urgent=urgent)
+
+def remove_checkpoint(channel_id: int):
+    """レースが終わった (または再開できない) チャンネルのチェックポイントをすぐに削除する"""
+    if RACE_CHECKPOINT_ENABLED:
+        checkpoint_writer.remove(channel_id, urgent=True)
+
+async def run_race_simulation(channel: discord.abc.Messageable, game: GameState, course_name: str,
+                              playback_position: Optional[int] = None):
+    """レースのシミュレーションを実行し、Discordに状況を送信する
+
+    RACE_PRECOMPUTE が有効なら、レース全体を先に計算して (ポイントもこの時点で保存される)
+    GameState を破棄し、実況メッセージの再生カーソルだけを残して送信する。
+    無効なら従来どおり、メッセージを送るたびにゲームを1ステップずつ進める。
+    メッセージの間隔はサーバーの実況ペース設定と混雑度で決め、
+    送信スケジューラがレート制限に合わせて (溜まった分はまとめて) 送る。
+    進行状況はラップの区切りごとにチェックポイントとして保存し、再起動後に続きから再開できるようにする
+    (playback_position を渡すと、ポイント保存済みのレースを計算し直してその位置から再生する)。"""
+    logger.info(f"Starting race simulation in channel {channel.id} (Guild: {game.guild_id})")
+    resume = game.current_lap > 0 # ラップの区切りから復元したゲーム
+    if not resume and playback_position is None:
+        race_log.start_recording(game, channel.id, course_name) # ラップごとの展開を記録し、終了時にファイルへ追記
+    send_line = race_line_sender(channel)
+    pacer = Pacer(await get_guild_pacing(game.guild_id), live_races=count_live_races(), players=len(game.players))
+    finished = False
+    settled = False # 逐次進行でポイントが保存済みになったか
 
-                    combined_skills = "\n✨ **各車の走り！** ✨\n" + "\n".join(display_skills)
+    try:
+        if RACE_PRECOMPUTE or playback_position is not None:
+            start_data = race_checkpoint.encode_checkpoint(game, course_name) if RACE_CHECKPOINT_ENABLED else b'' # 計算前の状態から再計算できる
+            save_checkpoint(channel.id, game.guild_id, PHASE_RUNNING, start_data) # 計算中にゲームを読まないよう、受付中の保存を置き換える
+            script = await asyncio.to_thread(build_race_script, game, course_name, resume) # ゲームロジックはイベントループ外で一気に計算
+            await asyncio.to_thread(race_log.finish_recording, game)
+            script = pacer.retime(script)
+            playback = RacePlayback(script)
+            if playback_position is not None: playback.position = min(playback_position, len(script))
+            save_checkpoint(channel.id, game.guild_id, PHASE_PLAYBACK, start_data, playback.position, urgent=True) # ポイント保存済みになった
+            race_playbacks[channel.id] = playback
+            games.pop(channel.id, None)
+            logger.info(f"Race precomputed for channel {channel.id}: {len(script)} messages, {game.current_lap} laps, "
+                        f"{sum(line.delay for line in script):.0f}s ({pacer.profile.name}, x{pacer.compression:.2f}).")
+            guild_id = game.guild_id
+            game = None # 以降は再生カーソルと計算前の状態だけを保持する
+
+            async def send_playback_line(line: ScriptLine):
+                if line.kind == 'lap': # ラップの頭から再生し直せるように位置を残す
+                    save_checkpoint(channel.id, guild_id, PHASE_PLAYBACK, start_data, playback.position)
+                await send_line(line)
+            await playback.play(send_playback_line)
+        else:
+            checkpoint_game(channel.id, game, course_name, PHASE_RUNNING, urgent=True)
+            for line in generate_race_script(game, course_name, resume):
+                if game.game_finished and not settled:
+                    settled = True
+                    remove_checkpoint(channel.id) # ポイント保存済みなので再開させない
+                await send_line(line)
+                if line.kind == 'summary' and not game.game_finished:
+                    checkpoint_game(channel.id, game, course_name, PHASE_RUNNING) # ラップの区切り
+                delay = pacer.delay(line) # 全体の長さは分からないので目標時間での圧縮はしない
+                if delay > 0: await asyncio.sleep(delay)
+        await message_scheduler.flush(channel.id) # 最後のメッセージが送られるまでレース中として扱う
+        finished = True
+        logger.info(f"Race finished in channel {channel.id}")
 
-                    # メッセージ長制限チェックは念のため残す
-                    if len(combined_skills) > 2000:
-                        await channel.send("✨ **各車の走り！** ✨\n（多くのプレイヤーがスキルを発揮！）") # 短縮版
-                        logger.warning("Combined skill message too long even after sampling.")
-                    else:
-                        await channel.send(combined_skills)
-                    await asyncio.sleep(2)
-                # --- ★ スキルメッセージ制限ここまで ---
-
-                # もし両方とも空だったら
-                if not overtake_msgs and not skill_msgs:
-                    await channel.send("\n🌀 静かなラップ...波乱は起きなかったようだ。")
-                    await asyncio.sleep(1.5)
-                # --- ★ メッセージ送信方法の変更ここまで ---
-
-            # (1.4 サマリーフェーズ以降は変更なし)
-            # ...
-
-           # 1.4 サマリーフェーズ
-            logger.debug(f"[DEBUG] Lap {game.current_lap}: Starting summary phase.")
-            if game.game_finished: logger.debug("[DEBUG] Game finished before summary phase."); break
-
-            logger.debug("[DEBUG] Calling game.get_lap_summary()")
-            summary = game.get_lap_summary()
-            logger.debug(f"[DEBUG] Lap summary data: {summary}")
-
-            # --- ★ トップグループの表示を条件分岐 ---
-            top_group_line = ""
-            if "survivor_names" in summary:
-                # 5人以下の場合: 名前を表示
-                survivor_names_str = ", ".join(summary['survivor_names'])
-                top_group_line = f" > トップグループ ({summary['survivors_count']}台): {survivor_names_str}"
-            else:
-                # 6人以上の場合: 人数のみ表示
-                top_group_line = f" > トップグループ: {summary['survivors_count']}台"
-            # --- ★ ここまで変更 ---
-
-            summary_msg = (
-                f"📊 **LAP {game.current_lap} 結果**\n"
-                f"{top_group_line}\n" # ★ 変更した行を使用
-                f" > 下位グループ: {summary['eliminated_names']}"
-            )
-            if 'revived_names' in summary:
-                 summary_msg += f"\n > 追い上げ: {summary['revived_names']}"
-
-            logger.debug("[DEBUG] Sending lap summary message...")
-            await channel.send(summary_msg)
-            # await channel.send("\u200B") # ★ 空行はサマリーの後には不要かも？ 好みで調整
-            await asyncio.sleep(3)
-            logger.debug("[DEBUG] Lap summary sent.")
-
-            if game.check_game_end(): logger.info(f"Game ended after lap {current_lap} summary."); break
-
-        # --- ★ 2. ループ終了後 (最終結果発表) ---
-        logger.info(f"[DEBUG] Exited main race loop for channel {channel.id}.")
-
-        final_standings_msg = None # 最終結果メッセージ用変数
-        outcome_already_sent = False # 一騎打ち/大逆転メッセージが送られたか
-
-        # まず、一騎打ち/大逆転の outcome_msg が送られたかチェック
-        # (ループ内で break する前に outcome_msg が送信されている想定)
-        # ※ただし、大逆転の場合は専用の結果メッセージをここで作る
-        if game.great_comeback_occurred and game.great_comeback_winner:
-            # 大逆転の場合
-             loser_names = " / ".join([p.name for p in game.great_comeback_losers])
-             final_standings_msg = (
-                 f"\n--- 最終結果 ---\n"
-                 f"🥇 **優勝:** {game.great_comeback_winner.name} (大逆転！)\n"
-                 f"🥈 **準優勝:** {loser_names} (同時)"
-             )
-             outcome_already_sent = True # 大逆転メッセージはループ内で送信済み扱い
-
-        elif game.final_duel and game.winner and game.second_place:
-             # 通常の一騎打ちで終了した場合
-             final_standings_msg = (
-                 f"\n--- 最終結果 ---\n"
-                 f"🥇 **優勝:** {game.winner.name}\n"
-                 f"🥈 **準優勝:** {game.second_place.name}"
-             )
-             outcome_already_sent = True # 一騎打ち結果メッセージはループ内で送信済み扱い
-
-        elif game.winner: # 一人残りでの通常終了
-             # まだ優勝者アナウンスがされていなければアナウンスする
-             if not outcome_already_sent:
-                 await channel.send(f"\n🏆🏆🏆 **レース終了！ 優勝者は {game.winner.name} です！おめでとう！** 🏆🏆🏆")
-                 await channel.send("\u200B") # 空行
-
-             # 結果表示
-             final_standings_msg = (
-                 f"\n--- 最終結果 ---\n"
-                 f"🥇 **優勝:** {game.winner.name}\n"
-                 f"(準優勝者なし)"
-             )
-
-        elif not game.winner and game.game_finished: # 勝者なし終了
-             if not outcome_already_sent:
-                 await channel.send("\n🏁 レース終了！今回は勝者なしとなりました...！")
-
-        # 最終結果メッセージがあれば送信
-        if final_standings_msg:
-            await channel.send(final_standings_msg)
-            logger.info(f"Final standings sent for channel {channel.id}")
-        # --- ★ 結果発表ここまで ---
-
-    # (エラーハンドリングとfinallyブロックは変更なし)
     except asyncio.CancelledError:
-         logger.warning(f"[DEBUG] Race simulation task cancelled for channel {channel.id}")
-         await channel.send("⚠️ レースシミュレーションがキャンセルされました。")
+         # Bot の終了時など。チェックポイントは残し、再起動後に再開する
+         logger.warning(f"Race simulation task cancelled for channel {channel.id}")
+         message_scheduler.discard(channel.id)
+         await channel.send("⚠️ レースシミュレーションがキャンセルされました。" +
+                            ("Botの再起動後に続きから再開します。" if RACE_CHECKPOINT_ENABLED else ""))
     except Exception as e:
-        logger.error(f"[DEBUG] Unhandled error during race simulation in channel {channel.id}: {e}", exc_info=True)
+        logger.error(f"Unhandled error during race simulation in channel {channel.id}: {e}", exc_info=True)
+        finished = True # 再開しても同じエラーになるので、チェックポイントは消す
+        await message_scheduler.flush(channel.id) # ここまでの実況を送ってから通知する
         await channel.send("レースの進行中に予期せぬエラーが発生しました。レースを中断します。")
     finally:
-         # (変更なし)
-         logger.debug(f"[DEBUG] Entering finally block for run_race_simulation channel {channel.id}")
-         if channel.id in games:
-             del games[channel.id]
-             logger.info(f"Removed game state for channel {channel.id}")
-         logger.info(f"[DEBUG] Exiting run_race_simulation for channel {channel.id}")
+         if game is not None:
+             await asyncio.to_thread(race_log.finish_recording, game) # 中断時も途中までの展開を残す
+         if finished: remove_checkpoint(channel.id)
+         games.pop(channel.id, None)
+         race_playbacks.pop(channel.id, None)
+         logger.info(f"Removed race state for channel {channel.id}")
+
+
+# --- 再起動後のレース再開 ---
+resumed_race_tasks: Set[asyncio.Task] = set() # 再開したレースのタスク (完了まで参照を保持する)
+_checkpoints_restored = False # on_ready は再接続のたびに呼ばれるので、復元は最初の1回だけ行う
+
+def _no_points_saver(*args):
+    """ポイント保存済みのレースを計算し直すときに使う (二重に保存しない)"""
+    return None
+
+async def resume_race(channel: Optional[discord.abc.Messageable], channel_id: int, guild_id: str,
+                      phase: str, position: int, data: bytes, updated_at: Optional[datetime]):
+    """チェックポイントからレースを再開する
+
+    チャンネルが見つからない・古すぎるレースは実況せずに最後まで計算してポイントを確定し (集計)、
+    チャンネルがあれば最終結果だけを送る。参加者のいない募集中のレースは破棄する。"""
+    points_saved = phase == PHASE_PLAYBACK
+    try:
+        game, course_name = race_checkpoint.restore_game(
+            data, guild_id, points_saver=_no_points_saver if points_saved else db_executor.submit_points_save)
+    except Exception as e:
+        logger.error(f"Failed to restore race checkpoint for channel {channel_id}: {e}", exc_info=True)
+        remove_checkpoint(channel_id)
+        return
+    if not game.get_human_players():
+        logger.info(f"Dropping race checkpoint for channel {channel_id}: no participants.")
+        remove_checkpoint(channel_id)
+        return
+    game.race_started = True
+    age = (datetime.utcnow() - updated_at).total_seconds() if updated_at else float('inf')
+
+    if channel is None or age > RACE_CHECKPOINT_RESUME_MAX_AGE_SECONDS:
+        logger.info(f"Settling interrupted race in channel {channel_id} (phase: {phase}, age: {age:.0f}s, channel found: {channel is not None}).")
+        script = await asyncio.to_thread(build_race_script, game, course_name, game.current_lap > 0) # 未保存ならポイントもここで保存される
+        remove_checkpoint(channel_id)
+        if channel is not None:
+            results = "\n".join(line.text for line in script if line.kind in ('outcome', 'result'))
+            try:
+                await channel.send(f"⚠️ Botの停止中に中断されたレース ({course_name}) の結果を集計しました。{results}"[:2000])
+            except Exception as e:
+                logger.error(f"Failed to send settled race result to channel {channel_id}: {e}")
+        return
+
+    logger.info(f"Resuming race in channel {channel_id} (phase: {phase}, lap: {game.current_lap}, position: {position}).")
+    games[channel_id] = game
+    try:
+        await channel.send(f"♻️ Botの再起動で中断していたレース ({course_name}) を再開します！")
+    except Exception as e:
+        logger.error(f"Failed to send resume notice to channel {channel_id}: {e}")
+    await run_race_simulation(channel, game, course_name, playback_position=position if points_saved else None)
+
+async def restore_race_checkpoints(guild_ids: List[str], get_channel: Callable[[int], Optional[discord.abc.Messageable]]) -> List[asyncio.Task]:
+    """指定サーバーの中断されたレースを再開 (または集計) するタスクを作って返す"""
+    if not RACE_CHECKPOINT_ENABLED: return []
+    rows = await db_executor.load_checkpoints(guild_ids)
+    tasks = []
+    for channel_id, guild_id, phase, position, data, updated_at in rows:
+        channel_id = int(channel_id)
+        if channel_id in games or channel_id in race_playbacks: continue # 既に新しいレースが始まっている
+        task = asyncio.create_task(resume_race(get_channel(channel_id), channel_id, guild_id, phase, position, data, updated_at))
+        resumed_race_tasks.add(task)
+        task.add_done_callback(resumed_race_tasks.discard)
+        tasks.append(task)
+    if tasks: logger.info(f"Restoring {len(tasks)} interrupted races from checkpoints.")
+    return tasks
+
+
+# --- 参加ボタン (永続ビュー) ---
+JOIN_WAIT_SECONDS = 60.0 # 参加受付の待機時間（秒）
+STRATEGY_LABELS = {STRATEGY_START_DASH: "スタート重視", STRATEGY_TOP_SPEED: "速度重視", STRATEGY_CORNERING: "コーナー重視"}
+JOIN_STRATEGIES = {f"join_{strategy}": strategy for strategy in STRATEGY_LABELS} # custom_id -> 作戦
+
+class Recruitment(NamedTuple):
+    """参加受付中のレースの表示用の情報 (ゲーム本体は games に入る)"""
+    course_name: str
+    join_updater: JoinMessageUpdater
+
+recruitments: Dict[int, Recruitment] = {} # 参加受付中のチャンネル (channel_id -> 表示用の情報)
+
+class JoinView(View):
+    """参加ボタンの永続ビュー (timeout なし・固定の custom_id)
+
+    起動時に1つだけ bot.add_view で登録し、全チャンネルの募集メッセージのボタンをこれで受ける。
+    押されたボタンの作戦は custom_id から、ゲームはチャンネルIDから辞書で引く。
+    レースごとにビューやコールバックを作らず、再接続後もボタンはそのまま使える。"""
+
+    def __init__(self):
+        super().__init__(timeout=None)
+        for strategy, style, emoji in ((STRATEGY_START_DASH, ButtonStyle.primary, "🚀"),
+                                       (STRATEGY_TOP_SPEED, ButtonStyle.success, "💨"),
+                                       (STRATEGY_CORNERING, ButtonStyle.secondary, "✨")):
+            button = Button(style=style, emoji=emoji, label=f"参加({STRATEGY_LABELS[strategy]})", custom_id=f"join_{strategy}")
+            button.callback = self.join_callback
+            self.add_item(button)
+
+    async def join_callback(self, interaction: Interaction):
+        """参加ボタンが押されたときの処理 (すぐに defer し、表示の更新は join_updater がまとめて行う)"""
+        await interaction.response.defer() # 応答（必須）
+        current_game = games.get(interaction.channel_id)
+        recruitment = recruitments.get(interaction.channel_id)
+        if current_game is None or recruitment is None:
+            await interaction.followup.send("現在、参加可能なレースはありません。", ephemeral=True); return
+        if current_game.race_started:
+            await interaction.followup.send("レースは既に開始されています！", ephemeral=True); return
+
+        custom_id = (interaction.data or {}).get('custom_id')
+        strategy = JOIN_STRATEGIES.get(custom_id)
+        if not strategy:
+            logger.warning(f"Could not determine strategy from custom_id: {custom_id}")
+            await interaction.followup.send("作戦の選択でエラーが発生しました。", ephemeral=True); return
+
+        # プレイヤー作成・追加
+        user = interaction.user
+        player = Player(user.id, user.display_name, is_bot=False)
+        player.strategy = strategy
+        if current_game.add_player(player):
+            checkpoint_recruiting(interaction.channel_id, current_game, recruitment.course_name)
+            # 参加通知と募集メッセージの参加者数は一定間隔でまとめて更新する
+            recruitment.join_updater.add_join(f"{user.display_name} が **{STRATEGY_LABELS[strategy]}** でレースに参加しました！")
+        else:
+            await interaction.followup.send("既に参加済みか、レースが開始されています。", ephemeral=True)
+
+join_view: Optional[JoinView] = None # bot.add_view で登録した受付用のビュー
+join_buttons: Optional[JoinView] = None # 募集メッセージに付ける表示用のコピー (停止済みなので、送信ごとに ViewStore へ登録されない)
+
+async def setup_hook():
+    """ログイン時に1回だけ呼ばれる (ビューはイベントループ上で作る必要がある)"""
+    global join_view, join_buttons
+    join_view = JoinView()
+    bot.add_view(join_view) # メッセージを問わず custom_id で受け付ける
+    join_buttons = JoinView()
+    join_buttons.stop()
+    # スラッシュコマンドの登録はプロセス間で重複しないよう、シャード0を担当するプロセスだけが行う
+    if APP_COMMANDS_SYNC and (not SHARD_IDS or 0 in SHARD_IDS):
+        try:
+            synced = await bot.tree.sync()
+            logger.info(f"Synced {len(synced)} application commands.")
+        except Exception as e:
+            logger.error(f"Failed to sync application commands: {e}", exc_info=True)
+bot.setup_hook = setup_hook
+
+def checkpoint_recruiting(channel_id: int, game: GameState, course_name: str):
+    """参加受付中の状態を保存する (変換は書き込み時に1回だけ行う)"""
+    save_checkpoint(channel_id, game.guild_id, PHASE_RECRUITING, partial(race_checkpoint.encode_checkpoint, game, course_name))
+
+def render_join_embed(embed: discord.Embed, game: GameState) -> discord.Embed:
+    """最新の参加者数で募集メッセージの Embed を作る"""
+    embed.description = (
+        f"参加作戦を選んでボタンを押してください！\n"
+        f"**約{int(JOIN_WAIT_SECONDS)}秒後**にレースが開始されます！\n"
+        f"現在の参加者数: {game.get_player_count()}人 (CPU除く)"
+    )
+    return embed
 
 
 # --- Botコマンド ---
-@bot.command(name='start') # コマンド名
+@bot.hybrid_command(name='start') # コマンド名 (!start と /start)
 @commands.guild_only()
 async def start_race_command(ctx: commands.Context):
     """レースを開始します。"""
@@ -323,137 +424,58 @@ async def start_race_command(ctx: commands.Context):
     author = ctx.author
     logger.info(f"'start' command received from {author.name} in channel {channel_id} (Guild: {guild_id})")
 
-    if channel_id in games:
+    if channel_id in games or channel_id in race_playbacks:
         await ctx.send("このチャンネルでは既にレースが進行中です！🏁", ephemeral=True) # 本人のみに通知
         return
 
     # ★ GameState と RaceEvents を先に生成
     race_events = RaceEvents()
-    game_state = GameState(guild_id=guild_id, race_events=race_events)
+    game_state = GameState(guild_id=guild_id, race_events=race_events,
+                           points_saver=db_executor.submit_points_save) # ポイント保存はDBスレッドプールで実行
     games[channel_id] = game_state
     logger.info(f"New game created for channel {channel_id}.")
 
     # コース情報を先に取得
-    race_course = RaceCourse()
+    race_course = RaceCourse(rng=game_state.rng) # コースもレースの乱数で選ぶ (シードから再現可能)
     course_name, course_description = race_course.get_random_course()
+    checkpoint_recruiting(channel_id, game_state, course_name)
 
-
-    # --- ★ 参加ボタンとビューの作成 (作戦選択式) ---
-    WAIT_TIME = 60.0 # 待機時間（秒）
-
-    view = View(timeout=WAIT_TIME)
-
-    # ボタンの定義
-    button_start_dash = Button(style=ButtonStyle.primary, emoji="🚀", label="参加(スタート重視)", custom_id=f"join_{STRATEGY_START_DASH}")
-    button_top_speed = Button(style=ButtonStyle.success, emoji="💨", label="参加(速度重視)", custom_id=f"join_{STRATEGY_TOP_SPEED}")
-    button_cornering = Button(style=ButtonStyle.secondary, emoji="✨", label="参加(コーナー重視)", custom_id=f"join_{STRATEGY_CORNERING}")
-
-    async def join_callback(interaction: Interaction):
-        """参加ボタンが押されたときの処理"""
-        if not interaction.channel_id:
-             await interaction.response.send_message("エラー：チャンネル情報が取得できませんでした。", ephemeral=True); return
-        if interaction.channel_id not in games:
-             await interaction.response.send_message("現在、参加可能なレースはありません。", ephemeral=True); return
-
-        current_game = games[interaction.channel_id]
-        user = interaction.user
-
-        if current_game.race_started:
-            await interaction.response.send_message("レースは既に開始されています！", ephemeral=True); return
-
-        # custom_id から作戦を決定
-        strategy = None
-        if interaction.data and 'custom_id' in interaction.data:
-             custom_id = interaction.data['custom_id']
-             if custom_id == f"join_{STRATEGY_START_DASH}": strategy = STRATEGY_START_DASH
-             elif custom_id == f"join_{STRATEGY_TOP_SPEED}": strategy = STRATEGY_TOP_SPEED
-             elif custom_id == f"join_{STRATEGY_CORNERING}": strategy = STRATEGY_CORNERING
-
-        if not strategy:
-             logger.warning(f"Could not determine strategy from custom_id: {interaction.data.get('custom_id')}")
-             await interaction.response.send_message("作戦の選択でエラーが発生しました。", ephemeral=True); return
-
-        # プレイヤー作成・追加
-        player = Player(user.id, user.display_name, is_bot=False)
-        player.strategy = strategy # ★ 作戦を設定
-
-        if current_game.add_player(player):
-            player_count = current_game.get_player_count()
-            strategy_map = {STRATEGY_START_DASH: "スタート重視", STRATEGY_TOP_SPEED: "速度重視", STRATEGY_CORNERING: "コーナー重視"}
-            strategy_name = strategy_map.get(strategy, "不明な作戦")
-
-            # 参加通知 (一時メッセージ)
-            join_notify_embed = discord.Embed(
-                 description=f"{user.display_name} が **{strategy_name}** でレースに参加しました！",
-                 color=discord.Color.green()
-            )
-            await interaction.channel.send(embed=join_notify_embed, delete_after=10.0)
-
-            # 募集メッセージの更新
-            if interaction.message:
-                 try:
-                      embed = interaction.message.embeds[0]
-                      embed.description = (
-                           f"参加作戦を選んでボタンを押してください！\n"
-                           f"**約{int(WAIT_TIME)}秒後**にレースが開始されます！\n"
-                           f"現在の参加者数: {player_count}人 (CPU除く)"
-                      )
-                      await interaction.message.edit(embed=embed, view=view)
-                      await interaction.response.defer() # 応答（必須）
-                 except Exception as e:
-                      logger.error(f"Error editing join message: {e}", exc_info=True)
-                      await interaction.response.defer() # エラーでも応答
-            else:
-                 await interaction.response.defer()
-        else:
-            await interaction.response.send_message("既に参加済みか、レースが開始されています。", ephemeral=True)
-
-    # ボタンにコールバックを設定し、ビューに追加
-    button_start_dash.callback = join_callback
-    button_top_speed.callback = join_callback
-    button_cornering.callback = join_callback
-    view.add_item(button_start_dash)
-    view.add_item(button_top_speed)
-    view.add_item(button_cornering)
-
-    # --- 募集開始メッセージ ---
+    # --- 募集開始メッセージ (ボタンは共通の永続ビュー) ---
     initial_embed = discord.Embed(
         title=f"🏎️ カートランブル@{course_name}", # コース名を表示
         description=(
             f"参加作戦を選んでボタンを押してください！\n"
-            f"**約{int(WAIT_TIME)}秒後**にレースが開始されます！\n"
+            f"**約{int(JOIN_WAIT_SECONDS)}秒後**にレースが開始されます！\n"
             f"現在の参加者数: 0人 (CPU除く)\n\n"
             f"*コース: {course_description}*" # コース説明も追加
         ),
         color=discord.Color.blue()
     )
-    # メッセージを送信し、後で編集できるように Message オブジェクトを保存
-    sent_message = await ctx.send(embed=initial_embed, view=view)
-    # view に message を紐付ける (タイムアウト処理で使うため)
-    view.message = sent_message
-    logger.info(f"Join message sent to channel {channel_id}. Waiting {WAIT_TIME} seconds...")
+    sent_message = await ctx.send(embed=initial_embed, view=join_buttons)
+    join_updater = JoinMessageUpdater(ctx.channel, sent_message, partial(render_join_embed, initial_embed, game_state))
+    recruitments[channel_id] = Recruitment(course_name, join_updater)
+    logger.info(f"Join message sent to channel {channel_id}. Waiting {JOIN_WAIT_SECONDS} seconds...")
 
     # --- 待機 ---
-    await asyncio.sleep(WAIT_TIME)
+    try:
+        await asyncio.sleep(JOIN_WAIT_SECONDS)
+    finally:
+        recruitments.pop(channel_id, None) # 以降のボタン操作は受け付けない
+        await join_updater.close() # 未反映の更新を取り消し、参加通知を削除
 
     # --- 待機終了後 ---
     if channel_id not in games:
-         logger.info(f"Game for channel {channel_id} was removed before starting."); return
+         logger.info(f"Game for channel {channel_id} was removed before starting."); remove_checkpoint(channel_id); return
     game_to_start = games[channel_id]
     if game_to_start.race_started: # 他のプロセスで開始された場合など
          logger.warning(f"Race in {channel_id} already marked as started. Aborting duplicate start process."); return
 
-    # ボタンを無効化
+    # ボタンを外す
     try:
-        # view に紐付けた message を使う
-        if view.message:
-              view.stop()
-              disabled_embed = view.message.embeds[0]
-              disabled_embed.description = "参加受付は終了しました。レースを開始します！"
-              disabled_embed.color = discord.Color.red()
-              await view.message.edit(embed=disabled_embed, view=None)
-        else:
-             logger.warning("Could not find the original message to disable buttons via view.")
+        disabled_embed = initial_embed.copy()
+        disabled_embed.description = "参加受付は終了しました。レースを開始します！"
+        disabled_embed.color = discord.Color.red()
+        await sent_message.edit(embed=disabled_embed, view=None)
     except Exception as e:
         logger.error(f"Error disabling join button view: {e}", exc_info=True)
 
@@ -462,53 +484,86 @@ async def start_race_command(ctx: commands.Context):
         await ctx.send("参加者が集まらなかったため、レースは中止となりました。")
         logger.info(f"Race cancelled in channel {channel_id} due to no participants.")
         if channel_id in games: del games[channel_id]
+        remove_checkpoint(channel_id)
         return
 
     game_to_start.race_started = True
-    logger.info(f"Starting race in channel {channel_id} with {len(human_players)} human players.")
+    logger.info(f"Starting race in channel {channel_id} with {len(human_players)} human players (seed: {game_to_start.seed}).")
 
     # ★ コース名を渡してレースシミュレーションを実行
-    await run_race_simulation(ctx, game_to_start, course_name)
+    await run_race_simulation(ctx.channel, game_to_start, course_name)
+
+
+# --- 表示名のバックグラウンド更新 ---
+DISPLAY_NAME_STALE_DAYS = int(os.getenv('DISPLAY_NAME_STALE_DAYS', '7')) # これより古い保存済み表示名は更新対象
+DISPLAY_NAME_BACKGROUND_REFRESH = os.getenv('DISPLAY_NAME_BACKGROUND_REFRESH', 'True') == 'True'
+_name_refresh_in_progress: Set[str] = set() # 更新中のサーバーID
+
+async def refresh_stored_display_names(guild_id: str, guild: Optional[discord.Guild], discord_ids: List[str]):
+    """保存済みの表示名を最新のものに更新する (ランキング表示後に実行)"""
+    try:
+        names = await user_name_resolver.resolve_many(discord_ids, guild, include_failures=False)
+        if names:
+            updated = await db_executor.update_display_names(guild_id, names)
+            logger.info(f"Refreshed {updated} stored display names for guild {guild_id}.")
+    except Exception as e:
+        logger.error(f"Error refreshing display names for guild {guild_id}: {e}", exc_info=True)
+    finally:
+        _name_refresh_in_progress.discard(guild_id)
 
 
 # --- ランキングコマンド (変更なし、CPU名解決は bot.py 内のヘルパー使用) ---
-@bot.command(name='ranking')
+@bot.hybrid_command(name='ranking')
 @commands.guild_only()
 async def show_rankings(ctx: commands.Context):
     """週間・月間・全期間のランキングを表示します。"""
+    await ctx.defer() # スラッシュコマンドの応答期限 (3秒) までにDB処理が終わらない場合に備える
     guild_id = str(ctx.guild.id)
     logger.info(f"'ranking' command received from {ctx.author.name} in guild {guild_id}")
     embed = discord.Embed(title=f"🏆 {ctx.guild.name} ランキング 🏆", color=discord.Color.gold())
     periods = {'weekly': '📅 週間', 'monthly': '🗓️ 月間', 'all': '👑 累計'}
     rank_emojis = {1: "🥇", 2: "🥈", 3: "🥉"}
     try:
-        with app.app_context():
-            for period, title_prefix in periods.items():
-                rankings_data = PlayerPoints.get_rankings(guild_id=guild_id, period=period, limit=5)
-                ranking_text = ""
-                if not rankings_data: ranking_text = "まだデータがありません"
-                else:
-                    for i, (discord_id_str, points) in enumerate(rankings_data, 1):
-                        rank_emoji = rank_emojis.get(i, f"{i}.")
-                        try:
-                            if discord_id_str.startswith("CPU_"):
-                                username = CPU_NAMES_LOOKUP.get(discord_id_str, discord_id_str) # CPU名解決
-                            else:
-                                user = await bot.fetch_user(int(discord_id_str))
-                                username = user.display_name if user else f"不明なUser({discord_id_str})"
-                        except ValueError: username = f"不正なID({discord_id_str})"
-                        except discord.NotFound: username = f"見つからないUser({discord_id_str})"
-                        except Exception as e: logger.error(f"Error fetching user {discord_id_str} for ranking: {e}"); username = f"エラー({discord_id_str})"
-                        ranking_text += f"{rank_emoji} {username}: {points} ポイント\n"
-                embed.add_field(name=f"{title_prefix}ランキング (Top 5)", value=ranking_text, inline=False)
+        # DBクエリはスレッドプールでまとめて実行 (イベントループをブロックしない)
+        rankings_by_period = await db_executor.get_rankings(guild_id, list(periods), limit=5)
+        # 表示名はDBに保存済みのものを使う。未保存のユーザーだけその場で解決 (キャッシュ優先、REST は重複排除して並列実行)
+        stale_before = datetime.utcnow() - timedelta(days=DISPLAY_NAME_STALE_DAYS)
+        stored_names: Dict[str, str] = {}
+        missing_ids, stale_ids = [], []
+        for rankings_data in rankings_by_period.values():
+            for discord_id_str, _, display_name, name_updated_at in rankings_data:
+                if discord_id_str.startswith("CPU_"): continue
+                if display_name: stored_names[discord_id_str] = display_name
+                else: missing_ids.append(discord_id_str)
+                if not display_name or name_updated_at is None or name_updated_at < stale_before: stale_ids.append(discord_id_str)
+        usernames = await user_name_resolver.resolve_many(missing_ids, ctx.guild) if missing_ids else {}
+        usernames.update(stored_names)
+        for period, title_prefix in periods.items():
+            rankings_data = rankings_by_period.get(period, [])
+            ranking_text = ""
+            if not rankings_data: ranking_text = "まだデータがありません"
+            else:
+                for i, (discord_id_str, points, _, _) in enumerate(rankings_data, 1):
+                    rank_emoji = rank_emojis.get(i, f"{i}.")
+                    if discord_id_str.startswith("CPU_"):
+                        username = CPU_NAMES_LOOKUP.get(discord_id_str, discord_id_str) # CPU名解決
+                    else:
+                        username = usernames.get(discord_id_str, f"不明なUser({discord_id_str})")
+                    ranking_text += f"{rank_emoji} {username}: {points} ポイント\n"
+            embed.add_field(name=f"{title_prefix}ランキング (Top 5)", value=ranking_text, inline=False)
         await ctx.send(embed=embed)
+        # 未保存・古くなった表示名は表示後にバックグラウンドで更新する (同じサーバーで重複実行しない)
+        if DISPLAY_NAME_BACKGROUND_REFRESH and stale_ids and guild_id not in _name_refresh_in_progress:
+            _name_refresh_in_progress.add(guild_id)
+            asyncio.create_task(refresh_stored_display_names(guild_id, ctx.guild, stale_ids))
     except Exception as e:
         logger.error(f"Error fetching or displaying rankings for guild {guild_id}: {e}", exc_info=True)
         await ctx.send("ランキングの取得中にエラーが発生しました。")
 
 # --- ランキングリセットコマンド (変更なし) ---
-@bot.command(name='reset_ranking')
+@bot.hybrid_command(name='reset_ranking')
 @commands.has_permissions(administrator=True)
+@app_commands.default_permissions(administrator=True) # スラッシュコマンドの一覧も管理者にだけ表示する
 @commands.guild_only()
 async def reset_ranking(ctx: commands.Context):
     """このサーバーのランキングデータを全てリセットします（管理者のみ）。"""
@@ -521,14 +576,13 @@ async def reset_ranking(ctx: commands.Context):
     async def confirm_callback(interaction: Interaction):
         if interaction.user.id != ctx.author.id: await interaction.response.send_message("コマンド実行者のみ操作できます。", ephemeral=True); return
         logger.info(f"Ranking reset confirmed by {ctx.author.name} for guild {guild_id}.")
+        # DB処理に時間がかかっても応答期限を過ぎないよう先に defer する
+        await interaction.response.defer()
         try:
-            with app.app_context():
-                deleted_points = PlayerPoints.query.filter_by(guild_id=guild_id).delete()
-                deleted_history = PlayerPointHistory.query.filter_by(guild_id=guild_id).delete()
-                db.session.commit()
-                logger.info(f"Deleted {deleted_points} points, {deleted_history} history records for guild {guild_id}.")
-                await interaction.response.edit_message(content="✅ ランキングデータがリセットされました。", view=None)
-        except Exception as e: db.session.rollback(); logger.error(f"DB error during ranking reset for guild {guild_id}: {e}", exc_info=True); await interaction.response.edit_message(content="❌ DBエラー発生。", view=None)
+            deleted = await db_executor.reset_rankings(guild_id)
+            logger.info(f"Deleted {deleted['points']} points, {deleted['history']} history records for guild {guild_id}.")
+            await interaction.edit_original_response(content="✅ ランキングデータがリセットされました。", view=None)
+        except Exception as e: logger.error(f"DB error during ranking reset for guild {guild_id}: {e}", exc_info=True); await interaction.edit_original_response(content="❌ DBエラー発生。", view=None)
         view.stop()
     async def cancel_callback(interaction: Interaction):
         if interaction.user.id != ctx.author.id: await interaction.response.send_message("コマンド実行者のみ操作できます。", ephemeral=True); return
@@ -546,6 +600,69 @@ async def reset_ranking(ctx: commands.Context):
         except discord.NotFound: pass
         except Exception as e: logger.error(f"Error editing reset confirmation on timeout: {e}")
 
+# --- 実況ペース設定コマンド ---
+@bot.hybrid_command(name='pace')
+@commands.has_permissions(administrator=True)
+@app_commands.default_permissions(administrator=True) # スラッシュコマンドの一覧も管理者にだけ表示する
+@commands.guild_only()
+@app_commands.describe(profile_name=f"変更後のペース ({', '.join(PACING_PROFILES)})。省略すると現在の設定を表示")
+async def pacing_command(ctx: commands.Context, profile_name: Optional[str] = None):
+    """レース実況のペースを表示・変更します（管理者のみ）。例: !pace fast"""
+    await ctx.defer() # 設定の読み込み・保存はDBスレッドプールで行う
+    guild_id = str(ctx.guild.id)
+    if profile_name is None:
+        current = await get_guild_pacing(guild_id)
+        lines = [f"⏱️ **実況ペース**: {current.label} (`{current.name}`)"]
+        for profile in PACING_PROFILES.values():
+            limit = f" (待ち時間 最長 約{int(profile.target_seconds)}秒)" if profile.target_seconds else ""
+            lines.append(f" > `{profile.name}`: {profile.label}{limit}")
+        lines.append(f"変更するには `{ctx.clean_prefix}pace <名前>` を実行してください。")
+        await ctx.send("\n".join(lines))
+        return
+
+    profile_name = profile_name.lower()
+    if profile_name not in PACING_PROFILES:
+        await ctx.send(f"⚠️ 不明なペースです: `{profile_name}` (選択肢: {', '.join(PACING_PROFILES)})")
+        return
+    try:
+        await db_executor.set_pacing_profile(guild_id, profile_name)
+    except Exception as e:
+        logger.error(f"DB error while saving pacing profile for guild {guild_id}: {e}", exc_info=True)
+        await ctx.send("❌ 設定の保存中にエラーが発生しました。")
+        return
+    guild_pacing_profiles[guild_id] = profile_name
+    logger.info(f"Pacing profile for guild {guild_id} set to '{profile_name}' by {ctx.author.name}.")
+    await ctx.send(f"⏱️ 実況ペースを **{PACING_PROFILES[profile_name].label}** に変更しました。次のレースから反映されます。")
+
+# --- DBスレッドプール統計コマンド ---
+@bot.hybrid_command(name='dbstats')
+@commands.has_permissions(administrator=True)
+@app_commands.default_permissions(administrator=True) # スラッシュコマンドの一覧も管理者にだけ表示する
+@commands.guild_only()
+async def show_db_stats(ctx: commands.Context):
+    """DBスレッドプール・ランキングキャッシュ・送信キュー・チェックポイントの統計を表示します（管理者のみ）。"""
+    stats = db_executor.get_stats()
+    cache_stats = leaderboard_cache.get_stats()
+    send_stats = message_scheduler.get_stats()
+    checkpoint_stats = checkpoint_writer.get_stats()
+    await ctx.send(
+        f"🗄️ **DB統計**\n"
+        f" > 待ち行列: {stats['queue_depth']} (最大 {stats['max_queue_depth']}) / 実行中: {stats['running']}\n"
+        f" > 完了: {stats['completed']} / 失敗: {stats['failed']}\n"
+        f" > 平均待ち: {stats['avg_wait_seconds']*1000:.1f}ms (最大 {stats['max_wait_seconds']*1000:.1f}ms)\n"
+        f" > 平均実行: {stats['avg_run_seconds']*1000:.1f}ms (最大 {stats['max_run_seconds']*1000:.1f}ms)\n"
+        f"🏆 **ランキングキャッシュ**\n"
+        f" > ヒット: {cache_stats['hits']} / ミス: {cache_stats['misses']} (ヒット率 {cache_stats['hit_rate']*100:.1f}%)\n"
+        f" > 保持数: {cache_stats['entries']} / 追い出し: {cache_stats['evictions']} / 無効化: {cache_stats['invalidations']}\n"
+        f"📨 **送信キュー**\n"
+        f" > 待ち行列: {send_stats['queue_depth']} ({send_stats['active_channels']}チャンネル) / 送信: {send_stats['sent']} / まとめ: {send_stats['coalesced']} / 失敗: {send_stats['failed']}\n"
+        f" > 制限待ち: チャンネル {send_stats['channel_waits']} / 全体 {send_stats['global_waits']}\n"
+        f" > 平均待ち: {send_stats['avg_latency_seconds']*1000:.0f}ms (最大 {send_stats['max_latency_seconds']*1000:.0f}ms)\n"
+        f"💾 **チェックポイント**\n"
+        f" > 書き込み: {checkpoint_stats['batches']}回 ({checkpoint_stats['rows_written']}件, 最大 {checkpoint_stats['max_batch_rows']}件/回) / 失敗: {checkpoint_stats['failed_batches']}\n"
+        f" > 更新: {checkpoint_stats['puts']} / 削除: {checkpoint_stats['removes']} / まとめ: {checkpoint_stats['coalesced']} / 待ち: {checkpoint_stats['pending']}"
+    )
+
 # --- エラーハンドラ (変更なし) ---
 @bot.event
 async def on_command_error(ctx: commands.Context, error):
@@ -557,7 +674,7 @@ async def on_command_error(ctx: commands.Context, error):
     elif isinstance(error, commands.GuildNotFound): await ctx.send("🚫 サーバー内限定コマンドです。")
     elif isinstance(error, commands.CheckFailure): await ctx.send("🚫 コマンド実行条件未達。")
     elif isinstance(error, commands.CommandOnCooldown): await ctx.send(f"⏳ クールダウン中。あと {error.retry_after:.2f} 秒。")
-    elif isinstance(error, commands.UserInputError): await ctx.send(f"⚠️ コマンドの使い方が不正です。\n`!help {ctx.command.qualified_name}` 確認推奨。\n詳細: {error}")
+    elif isinstance(error, commands.UserInputError): await ctx.send(f"⚠️ コマンドの使い方が不正です。\n`{ctx.clean_prefix}help {ctx.command.qualified_name}` 確認推奨。\n詳細: {error}")
     else:
         invoke_error = getattr(error, 'original', error) # CommandInvokeError の場合、元のエラーを取得
         logger.error(f"Unhandled command error in command '{ctx.command}': {invoke_error}", exc_info=invoke_error)
@@ -566,9 +683,14 @@ async def on_command_error(ctx: commands.Context, error):
 
 # Botの起動
 if __name__ == "__main__":
+    if FAKE_GATEWAY:
+        import fake_gateway
+        sys.exit(asyncio.run(fake_gateway.run_worker(sys.modules[__name__])))
     try:
         logger.info("Attempting to start the Discord bot...")
         bot.run(token, log_handler=None)
-    except discord.errors.LoginFailure: logger.critical("ログイン失敗。トークンを確認してください。")
-    except discord.errors.PrivilegedIntentsRequired: logger.critical("特権インテント（メッセージコンテンツ等）が無効です。Developer Portalで有効化してください。")
-    except Exception as e: logger.critical(f"Bot実行中に予期せぬエラー発生: {e}", exc_info=True)
+    except discord.errors.LoginFailure: logger.critical("ログイン失敗。トークンを確認してください。"); sys.exit(1)
+    except discord.errors.PrivilegedIntentsRequired: logger.critical("特権インテント（メッセージコンテンツ等）が無効です。Developer Portalで有効化してください。"); sys.exit(1)
+    except Exception as e: logger.critical(f"Bot実行中に予期せぬエラー発生: {e}", exc_info=True); sys.exit(1) # スーパーバイザーが再起動する
+    finally:
+        checkpoint_writer.flush_sync() # 書き込み待ちのチェックポイントを残してから終了する
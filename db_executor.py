@@ -0,0 +1,220 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app import app, db
+from models import PlayerPoints, GuildSettings, RaceCheckpoint
+from leaderboard_cache import leaderboard_cache
+
+logger = logging.getLogger(__name__)
+
+RankingRow = Tuple[str, int, Optional[str], Optional[datetime]] # (discord_id, points, display_name, name_updated_at)
+
+# --- DBスレッドプール設定 ---
+DB_EXECUTOR_MAX_WORKERS = int(os.environ.get("DB_EXECUTOR_MAX_WORKERS", "4")) # 同時に走るDB処理の上限
+DB_QUEUE_WARN_DEPTH = int(os.environ.get("DB_QUEUE_WARN_DEPTH", "20")) # 待ち行列がこれを超えたら警告
+DB_SLOW_JOB_WARN_SECONDS = float(os.environ.get("DB_SLOW_JOB_WARN_SECONDS", "1.0")) # 待ち+実行時間がこれを超えたら警告
+
+
+class DBExecutor:
+    """DB処理を専用のスレッドプールで実行し、Discordのイベントループをブロックしないようにするクラス
+
+    各ジョブは独自のアプリケーションコンテキスト内で実行されるため、
+    Flask-SQLAlchemy のスコープ付きセッションもジョブごとに独立する
+    (コンテキスト終了時にセッションは自動的に破棄される)。"""
+
+    def __init__(self, max_workers: int = DB_EXECUTOR_MAX_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="db-worker")
+        self._lock = threading.Lock()
+        self._queued = 0 # 実行待ちのジョブ数
+        self._running = 0 # 実行中のジョブ数
+        self._stats: Dict[str, Any] = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "max_queue_depth": 0,
+            "total_wait_seconds": 0.0,
+            "total_run_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+            "max_run_seconds": 0.0,
+        }
+
+    def submit(self, func: Callable[..., Any], *args: Any) -> Future:
+        """DB処理をスレッドプールに投入し、concurrent.futures.Future を返す"""
+        with self._lock:
+            self._queued += 1
+            self._stats["submitted"] += 1
+            depth = self._queued
+            if depth > self._stats["max_queue_depth"]:
+                self._stats["max_queue_depth"] = depth
+        if depth > DB_QUEUE_WARN_DEPTH:
+            logger.warning(f"DB queue depth is {depth} (> {DB_QUEUE_WARN_DEPTH}). The database may be a bottleneck.")
+        return self._executor.submit(self._run_job, func, args, time.perf_counter())
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """DB処理をスレッドプールで実行し、結果を await で受け取る"""
+        return await asyncio.wrap_future(self.submit(func, *args))
+
+    def _run_job(self, func: Callable[..., Any], args: Tuple[Any, ...], enqueued_at: float) -> Any:
+        started_at = time.perf_counter()
+        wait_seconds = started_at - enqueued_at
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        failed = False
+        try:
+            with app.app_context():
+                return func(*args)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            run_seconds = time.perf_counter() - started_at
+            with self._lock:
+                self._running -= 1
+                self._stats["failed" if failed else "completed"] += 1
+                self._stats["total_wait_seconds"] += wait_seconds
+                self._stats["total_run_seconds"] += run_seconds
+                self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], wait_seconds)
+                self._stats["max_run_seconds"] = max(self._stats["max_run_seconds"], run_seconds)
+            if wait_seconds + run_seconds > DB_SLOW_JOB_WARN_SECONDS:
+                logger.warning(f"Slow DB job {getattr(func, '__name__', func)}: waited {wait_seconds:.3f}s, ran {run_seconds:.3f}s.")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """キューの深さ・待ち時間・実行時間の統計を返す"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["queue_depth"] = self._queued
+            stats["running"] = self._running
+        finished = stats["completed"] + stats["failed"]
+        stats["avg_wait_seconds"] = stats["total_wait_seconds"] / finished if finished else 0.0
+        stats["avg_run_seconds"] = stats["total_run_seconds"] / finished if finished else 0.0
+        return stats
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+# プロセス全体で共有するDBスレッドプール
+_db_executor = DBExecutor()
+
+
+# --- スレッドプール上で実行されるジョブ ---
+def _save_points_job(guild_id: str, points_by_id: Dict[str, int], display_names: Optional[Dict[str, str]]) -> Dict[str, str]:
+    try:
+        return PlayerPoints.add_points_bulk(guild_id, points_by_id, display_names)
+    finally:
+        leaderboard_cache.invalidate(guild_id) # コミット後 (失敗時も念のため) にキャッシュを破棄
+
+def _get_rankings_job(guild_id: str, periods: List[str], limit: int) -> Dict[str, List[RankingRow]]:
+    return {period: PlayerPoints.get_rankings(guild_id=guild_id, period=period, limit=limit, with_names=True) for period in periods}
+
+def _update_display_names_job(guild_id: str, display_names: Dict[str, str]) -> int:
+    try:
+        return PlayerPoints.update_display_names(guild_id, display_names)
+    finally:
+        leaderboard_cache.invalidate(guild_id)
+
+def _reset_rankings_job(guild_id: str) -> Dict[str, int]:
+    try:
+        return PlayerPoints.reset_guild(guild_id)
+    finally:
+        leaderboard_cache.invalidate(guild_id)
+
+def _get_pacing_profile_job(guild_id: str) -> Optional[str]:
+    return GuildSettings.get_pacing_profile(guild_id)
+
+def _set_pacing_profile_job(guild_id: str, profile: Optional[str]):
+    GuildSettings.set_pacing_profile(guild_id, profile)
+
+def _apply_checkpoints_job(changes: Dict[str, Optional[Tuple[str, str, int, bytes]]]) -> int:
+    return RaceCheckpoint.apply_batch(changes)
+
+def _load_checkpoints_job(guild_ids: List[str]) -> List[Tuple[str, str, str, int, bytes, Optional[datetime]]]:
+    return RaceCheckpoint.load_for_guilds(guild_ids)
+
+def _ping_job() -> bool:
+    from sqlalchemy import text
+    db.session.execute(text('SELECT 1'))
+    return True
+
+
+# --- await 可能なラッパー ---
+def _log_save_result(guild_id: str, future: Future):
+    try:
+        save_errors = future.result()
+    except Exception as e:
+        logger.error(f"Failed to save race points for guild {guild_id}: {e}", exc_info=True)
+        return
+    for discord_id, db_err in save_errors.items():
+        logger.error(f"Failed to save points for {discord_id}: {db_err}")
+
+def submit_points_save(guild_id: str, points_by_id: Dict[str, int], display_names: Optional[Dict[str, str]] = None) -> Future:
+    """レース結果のポイント (と表示名) の保存をスレッドプールに投入する (呼び出し元はブロックしない)
+
+    GameState の points_saver としてそのまま渡せる。失敗はログに記録される。"""
+    future = _db_executor.submit(_save_points_job, guild_id, dict(points_by_id), dict(display_names or {}))
+    future.add_done_callback(lambda f: _log_save_result(guild_id, f))
+    return future
+
+def save_points_sync(guild_id: str, points_by_id: Dict[str, int], display_names: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """ポイントを呼び出し元のスレッドで保存する (points_saver を使わない GameState 用。キャッシュの破棄はプール経由と同じ)"""
+    with app.app_context():
+        return _save_points_job(guild_id, dict(points_by_id), dict(display_names or {}))
+
+async def save_points(guild_id: str, points_by_id: Dict[str, int], display_names: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """ポイントをまとめて保存し、保存できなかった discord_id とエラー内容を返す"""
+    return await _db_executor.run(_save_points_job, guild_id, dict(points_by_id), dict(display_names or {}))
+
+async def get_rankings(guild_id: str, periods: List[str], limit: int = 5) -> Dict[str, List[RankingRow]]:
+    """複数期間のランキングを保存済みの表示名付きで取得する (キャッシュにあればDBにアクセスしない)
+
+    各行は (discord_id, points, display_name, name_updated_at)。"""
+    cached = leaderboard_cache.get(guild_id, periods, limit)
+    if cached is not None:
+        return cached
+    generation = leaderboard_cache.generation(guild_id) # 読み込み中の書き込みを検出するため先に取得
+    rankings = await _db_executor.run(_get_rankings_job, guild_id, list(periods), limit)
+    leaderboard_cache.put(guild_id, limit, rankings, generation)
+    return rankings
+
+async def update_display_names(guild_id: str, display_names: Dict[str, str]) -> int:
+    """保存済みの表示名をまとめて更新する"""
+    return await _db_executor.run(_update_display_names_job, guild_id, dict(display_names))
+
+async def reset_rankings(guild_id: str) -> Dict[str, int]:
+    """サーバーのランキングデータを削除し、削除件数を返す"""
+    return await _db_executor.run(_reset_rankings_job, guild_id)
+
+async def get_pacing_profile(guild_id: str) -> Optional[str]:
+    """サーバーの実況ペース設定を取得する (未設定なら None)"""
+    return await _db_executor.run(_get_pacing_profile_job, guild_id)
+
+async def set_pacing_profile(guild_id: str, profile: Optional[str]):
+    """サーバーの実況ペース設定を保存する"""
+    await _db_executor.run(_set_pacing_profile_job, guild_id, profile)
+
+def submit_checkpoints(changes: Dict[str, Optional[Tuple[str, str, int, bytes]]]) -> Future:
+    """レースのチェックポイントの保存・削除をまとめてスレッドプールに投入する (race_checkpoint.CheckpointWriter が使う)"""
+    return _db_executor.submit(_apply_checkpoints_job, dict(changes))
+
+async def load_checkpoints(guild_ids: List[str]) -> List[Tuple[str, str, str, int, bytes, Optional[datetime]]]:
+    """指定サーバーのレースのチェックポイントを取得する"""
+    return await _db_executor.run(_load_checkpoints_job, list(guild_ids))
+
+async def ping() -> bool:
+    """DB接続テスト"""
+    return await _db_executor.run(_ping_job)
+
+def get_stats() -> Dict[str, Any]:
+    """DBスレッドプールの統計 (キュー深さ・レイテンシ) を返す"""
+    return _db_executor.get_stats()
+
+def shutdown(wait: bool = True):
+    """DBスレッドプールを停止する (wait=True なら投入済みの処理が終わるまで待つ)"""
+    _db_executor.shutdown(wait=wait)
@@ -0,0 +1,106 @@
+"""シャード分割の動作確認用の疑似ゲートウェイ (Discord には接続しない)
+
+FAKE_GATEWAY=True で bot.py を起動すると、bot.run の代わりに run_worker が呼ばれる。
+FAKE_GATEWAY_GUILDS 個の疑似サーバーのうち、このプロセスのシャード (SHARD_IDS / SHARD_COUNT) が
+担当するサーバーだけで、bot.py と同じ run_race_simulation を使ってレースを同時に開催する。
+メッセージは疑似チャンネルに送られ (送信数だけ数える)、ポイントは DATABASE_URL のDBに保存される。
+起動時には前回の異常終了で中断されたレースをチェックポイントから再開する。
+shard_supervisor.py の --fake-gateway から起動すれば、トークン無しで複数プロセス構成を試せる。
+"""
+import os
+import time
+import types
+import random
+import asyncio
+import logging
+from typing import List
+
+from game_logic import GameState, Player
+from race_events import RaceEvents, RaceCourse
+import db_executor
+from race_checkpoint import checkpoint_writer
+
+logger = logging.getLogger(__name__)
+
+# --- 疑似ゲートウェイの設定 ---
+FAKE_GATEWAY_GUILDS = int(os.environ.get("FAKE_GATEWAY_GUILDS", "8")) # 全シャード合計の疑似サーバー数
+FAKE_GATEWAY_RACES = int(os.environ.get("FAKE_GATEWAY_RACES", "1")) # 1サーバーで続けて開催するレース数
+FAKE_GATEWAY_PLAYERS = int(os.environ.get("FAKE_GATEWAY_PLAYERS", "10")) # 1レースの人間プレイヤー数
+FAKE_GATEWAY_SEND_LATENCY = float(os.environ.get("FAKE_GATEWAY_SEND_LATENCY", "0.05")) # 1回の送信にかかる秒数
+FAKE_GATEWAY_CRASH_AFTER = int(os.environ.get("FAKE_GATEWAY_CRASH_AFTER", "0")) # 初回起動時にこのレース数で異常終了する (再起動の確認用, 0 = しない)
+
+
+def shard_for_guild(guild_id: int, shard_count: int) -> int:
+    """Discord と同じ規則でサーバーを担当するシャード番号を返す"""
+    return (guild_id >> 22) % shard_count
+
+
+def fake_guild_ids(count: int) -> List[int]:
+    """疑似サーバーのID (シャード番号が 1, 2, ... と順に割り当たる)"""
+    return [(index + 1) << 22 for index in range(count)]
+
+
+class FakeChannel:
+    """送信したメッセージ数だけを数える疑似チャンネル"""
+
+    def __init__(self, channel_id: int, guild_id: int):
+        self.id = channel_id
+        self.guild_id = guild_id
+        self.sent = 0
+
+    async def send(self, content: str = None, **kwargs):
+        await asyncio.sleep(FAKE_GATEWAY_SEND_LATENCY)
+        self.sent += 1
+        return types.SimpleNamespace(id=self.sent, channel=self, content=content)
+
+
+async def run_worker(bot_module) -> int:
+    """このプロセスの担当サーバーでレースを開催し、終了コードを返す (bot.py の __main__ から呼ばれる)"""
+    shard_count = max(1, bot_module.SHARD_COUNT)
+    shard_ids = bot_module.SHARD_IDS or list(range(shard_count))
+    guild_ids = [guild_id for guild_id in fake_guild_ids(FAKE_GATEWAY_GUILDS) if shard_for_guild(guild_id, shard_count) in shard_ids]
+    restarts = int(os.environ.get("SHARD_WORKER_RESTARTS", "0")) # スーパーバイザーが数えた再起動回数
+    logger.info(f"Fake gateway: shards {shard_ids} of {shard_count}, {len(guild_ids)} guilds, pid {os.getpid()} (restarts: {restarts}).")
+    await db_executor.ping()
+
+    finished = 0
+    messages = 0
+    started = time.perf_counter()
+    # 前回の異常終了で中断されたレースを先に再開する (チャンネルIDはサーバーID + 1)
+    resumed = await bot_module.restore_race_checkpoints([str(guild_id) for guild_id in guild_ids],
+                                                        lambda channel_id: FakeChannel(channel_id, channel_id - 1))
+    if resumed:
+        await asyncio.gather(*resumed)
+        logger.info(f"Fake gateway: resumed {len(resumed)} interrupted races.")
+
+    async def host_races(guild_id: int):
+        nonlocal finished, messages
+        channel = FakeChannel(guild_id + 1, guild_id)
+        for _ in range(FAKE_GATEWAY_RACES):
+            game = GameState(guild_id=str(guild_id), race_events=RaceEvents(), points_saver=db_executor.submit_points_save)
+            bot_module.games[channel.id] = game
+            course_name, _ = RaceCourse(rng=game.rng).get_random_course()
+            # 参加者の作戦はレースの乱数を使わずに選ぶ (本物の参加ボタンと同じく、記録したシードでレースを再現できるように)
+            join_rng = random.Random(f"fake-join-{game.seed}")
+            for index in range(FAKE_GATEWAY_PLAYERS):
+                player = Player(guild_id * 1000 + index, f"Player{index}", is_bot=False)
+                player.strategy = join_rng.choice(GameState.STRATEGIES)
+                game.add_player(player)
+            game.race_started = True
+            # 担当外のサーバーのレースがこのプロセスに来ていないことを確認する
+            foreign = [g.guild_id for g in bot_module.games.values() if shard_for_guild(int(g.guild_id), shard_count) not in shard_ids]
+            if foreign: logger.error(f"Fake gateway: games for foreign guilds in this worker: {foreign}")
+            await bot_module.run_race_simulation(channel, game, course_name)
+            finished += 1
+            if FAKE_GATEWAY_CRASH_AFTER and restarts == 0 and finished >= FAKE_GATEWAY_CRASH_AFTER:
+                logger.error(f"Fake gateway: simulated crash after {finished} races.")
+                logging.shutdown()
+                os._exit(1)
+        messages += channel.sent
+
+    await asyncio.gather(*(host_races(guild_id) for guild_id in guild_ids))
+    elapsed = time.perf_counter() - started
+    logger.info(f"Fake gateway: shards {shard_ids} finished {finished} races ({messages} messages) in {elapsed:.1f}s.")
+    await checkpoint_writer.flush() # 終了したレースのチェックポイントの削除を反映する
+    db_executor.shutdown(wait=True) # ポイント保存を待ってから終了する
+    return 0
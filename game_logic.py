@@ -1,10 +1,12 @@
 # game_logic.py (2025-04-28 最終版)
+import base64
 import random
-from typing import List, Optional, Set, Dict, Tuple
-from models import PlayerPoints, PlayerPointHistory
-from app import app, db
+import struct
+from array import array
+from typing import Any, Callable, List, Optional, Sequence, Set, Dict, Tuple
 import logging
 import math # 強制脱落の計算で使用
+import lap_engine # 大人数レース用のベクトル化ラップ処理 (NumPy は任意)
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from race_events import RaceEvents
@@ -22,16 +24,55 @@ STRATEGY_START_DASH = 'start_dash'
 STRATEGY_TOP_SPEED = 'top_speed'
 STRATEGY_CORNERING = 'cornering'
 
+# --- ラップ中の出来事フラグ (GameState.lap_events。レースログに記録する) ---
+LAP_EVENT_REVOLUTION = 1
+LAP_EVENT_FORCED_ELIMINATION = 2
+LAP_EVENT_FINAL_DUEL = 4
+LAP_EVENT_GREAT_COMEBACK = 8
+
+def _table_flag(column: str, local_attr: str) -> property:
+    """PlayerTable に登録済みならテーブルの列を、未登録なら自身のスロットを読み書きするプロパティを作る"""
+    def getter(self: 'Player') -> bool:
+        table = self._table
+        if table is None: return getattr(self, local_attr)
+        return getattr(table, column)[self._seat] == 1
+    def setter(self: 'Player', value: bool):
+        table = self._table
+        if table is None: setattr(self, local_attr, bool(value))
+        else: getattr(table, column)[self._seat] = 1 if value else 0
+    return property(getter, setter)
+
 class Player:
-    """プレイヤー情報を保持するクラス"""
+    """プレイヤー情報を保持するクラス
+    (__slots__ で軽量化。GameState に登録されると状態フラグと作戦は PlayerTable の配列に保持される)"""
+    __slots__ = ('id', 'name', 'is_bot', '_strategy', '_is_active', '_eliminated', '_used_in_current_lap', '_table', '_seat')
+
     def __init__(self, id: int, name: str, is_bot: bool = False):
         self.id = id
         self.name = name
         self.is_bot = is_bot
-        self.is_active = True
-        self.eliminated = False
-        self.used_in_current_lap = False
-        self.strategy: Optional[str] = None # 選択した作戦
+        self._is_active = True
+        self._eliminated = False
+        self._used_in_current_lap = False
+        self._strategy: Optional[str] = None # 選択した作戦
+        self._table: Optional['PlayerTable'] = None # 登録先のテーブル
+        self._seat = -1 # テーブル内の行番号
+
+    is_active = _table_flag('active', '_is_active')
+    eliminated = _table_flag('eliminated', '_eliminated')
+    used_in_current_lap = _table_flag('used', '_used_in_current_lap')
+
+    @property
+    def strategy(self) -> Optional[str]:
+        table = self._table
+        if table is None: return self._strategy
+        return table.strategy_name(table.strategy_codes[self._seat])
+
+    @strategy.setter
+    def strategy(self, value: Optional[str]):
+        table = self._table
+        if table is None: self._strategy = value
+        else: table.strategy_codes[self._seat] = table.strategy_code(value)
 
     def __eq__(self, other):
         # 同一プレイヤーかどうかの比較用
@@ -42,6 +83,66 @@ class Player:
         # Setなどで使うためハッシュ可能にする
         return hash(self.id)
 
+class PlayerTable:
+    """1レース分のプレイヤー状態を列ごとの配列で持つテーブル (struct-of-arrays)
+
+    GameState が内部で使い、行番号 (seat) は参加順。
+    フラグは bytearray (0/1) なので、ラップごとのリセットなどを一括で行える。"""
+    __slots__ = ('ids', 'strategy_codes', 'active', 'eliminated', 'used', '_strategy_names', '_strategy_index')
+
+    def __init__(self, strategies: Sequence[str] = ()):
+        self.ids = array('q') # Discord ID (CPUは負の連番)
+        self.strategy_codes = bytearray() # 作戦コード (0 = 未選択)
+        self.active = bytearray()
+        self.eliminated = bytearray()
+        self.used = bytearray() # 現ラップで行動済みか
+        self._strategy_names: List[Optional[str]] = [None] # 作戦コード -> 作戦ID
+        self._strategy_index: Dict[Optional[str], int] = {None: 0} # 作戦ID -> 作戦コード
+        for strategy in strategies: self.strategy_code(strategy)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def strategy_code(self, strategy: Optional[str]) -> int:
+        """作戦IDをコードに変換する (未知の作戦は新しいコードを割り当てる)"""
+        code = self._strategy_index.get(strategy)
+        if code is None:
+            code = len(self._strategy_names)
+            if code > 255: raise ValueError("Too many strategies for PlayerTable.")
+            self._strategy_names.append(strategy); self._strategy_index[strategy] = code
+        return code
+
+    def strategy_name(self, code: int) -> Optional[str]:
+        return self._strategy_names[code]
+
+    def attach(self, player: Player) -> int:
+        """プレイヤーの現在の状態を行として追加し、以後の状態をテーブルで持たせる"""
+        is_active, eliminated, used, strategy = player.is_active, player.eliminated, player.used_in_current_lap, player.strategy
+        seat = len(self.ids)
+        self.ids.append(player.id)
+        self.strategy_codes.append(self.strategy_code(strategy))
+        self.active.append(1 if is_active else 0)
+        self.eliminated.append(1 if eliminated else 0)
+        self.used.append(1 if used else 0)
+        player._table = self; player._seat = seat
+        return seat
+
+    def clear_used(self):
+        """全員の行動済みフラグを一括で下ろす"""
+        self.used[:] = bytes(len(self.used))
+
+    def snapshot_active(self) -> bytes:
+        """現在の生存フラグのコピーを返す (mark_used に渡す)"""
+        return bytes(self.active)
+
+    def mark_used(self, mask: bytes):
+        """mask が 1 の行の行動済みフラグを一括で立てる (0/1 の列同士の OR を整数演算でまとめて行う)"""
+        merged = int.from_bytes(self.used, 'little') | int.from_bytes(mask, 'little')
+        self.used[:] = merged.to_bytes(len(self.used), 'little')
+
+    def count_active(self) -> int:
+        return self.active.count(1)
+
 class GameState:
     """1レースのゲーム状態全体を管理するクラス"""
     # クラス変数として定数を定義
@@ -57,9 +158,30 @@ class GameState:
     FORCED_ELIM_MIN_ABSOLUTE = 2 # ★最低でも脱落させる人数
     FORCED_ELIM_MIN_SURVIVORS = 3 # ★最低でも残す生存者数
 
-    def __init__(self, guild_id: str, race_events: 'RaceEvents'):
-        """ゲーム状態の初期化"""
-        self.players: List[Player] = [] # 現在の全プレイヤーリスト
+    def __init__(self, guild_id: str, race_events: 'RaceEvents',
+                 points_saver: Optional[Callable[[str, Dict[str, int], Dict[str, str]], Any]] = None,
+                 use_player_table: bool = True, vector_lap_min_players: Optional[int] = None,
+                 seed: Optional[int] = None):
+        """ゲーム状態の初期化 (points_saver を渡すとレース終了時のDB保存をそちらに委譲する。
+        use_player_table=False ならプレイヤー状態を PlayerTable ではなく各 Player に持たせる。
+        参加者が vector_lap_min_players 人以上なら NumPy のラップ処理を使う (省略時は VECTOR_LAP_MIN_PLAYERS)。
+        レースの乱数はすべて seed から作る self.rng を使うため、同じ seed と参加者なら同じ展開を再現できる)"""
+        # レースごとの乱数 (省略時はグローバルの random からシードを引くので、random.seed() 済みなら再現可能)
+        self.seed: int = seed if seed is not None else random.getrandbits(63)
+        self.rng = random.Random(self.seed)
+        race_events.rng = self.rng # 実況テキストの選択も同じ乱数列から行う
+        self.players: List[Player] = [] # 現在の全プレイヤーリスト (参加順。追加は _register_player 経由で行う)
+        # プレイヤー索引 (大人数のレースでもリスト全体を走査しないようにする)
+        self._players_by_id: Dict[int, Player] = {} # id -> Player
+        self._seat_by_id: Dict[int, int] = {} # id -> 参加順 (get_active_players などの並び順に使う)
+        self._active_ids: Set[int] = set() # 生存中のプレイヤーID
+        self._eliminated_ids: Set[int] = set() # 脱落中のプレイヤーID
+        self._active_cache: Optional[List[Player]] = None # 参加順に並べた生存者 (状態変化で破棄)
+        self._eliminated_cache: Optional[List[Player]] = None # 参加順に並べた脱落者 (状態変化で破棄)
+        self._human_players: List[Player] = [] # 人間プレイヤー (参加順)
+        self.player_table: Optional[PlayerTable] = PlayerTable(self.STRATEGIES) if use_player_table else None
+        self.vector_lap_min_players = lap_engine.VECTOR_LAP_MIN_PLAYERS if vector_lap_min_players is None else vector_lap_min_players
+        self._vector_engine: Optional[lap_engine.VectorLapEngine] = None # 初めて必要になったときに作る
         self.race_started = False
         self.current_lap = 0
         self.final_duel = False # 一騎打ちモードか
@@ -68,6 +190,10 @@ class GameState:
         self.second_place: Optional[Player] = None # 準優勝者
         self.eliminated_this_lap: List[Player] = [] # 現ラップ脱落者リスト
         self.revived_this_lap: List[Player] = [] # 現ラップ復活者リスト
+        self.lap_events = 0 # 現ラップで起きた出来事 (LAP_EVENT_* の OR)
+        self.recorder: Optional[Any] = None # レースログの記録係 (race_log.RaceRecorder。ラップの区切りで呼ばれる)
+        self._eliminated_this_lap_ids: Set[int] = set() # eliminated_this_lap の所属判定用
+        self._revived_this_lap_ids: Set[int] = set() # revived_this_lap の所属判定用
         self.game_finished = False # ゲーム終了フラグ
         # 大逆転イベント用フラグと情報
         self.great_comeback_occurred = False
@@ -76,6 +202,8 @@ class GameState:
 
         self.guild_id: str = guild_id # サーバーID
         self.race_events: 'RaceEvents' = race_events # イベントテキスト生成用
+        self.points_saver = points_saver # ポイント保存処理 (None なら同期的にDB保存)
+        logger.info(f"Race seed for guild {guild_id}: {self.seed}")
         self.strategy_advantage: Dict[str, float] = self._calculate_strategy_advantage() # 今回の有利作戦確率
 
         self._initialize_cpu_players() # CPUプレイヤー生成
@@ -92,7 +220,7 @@ class GameState:
         current_sum = 0.0
         for i in range(num_strategies):
             if i < num_strategies - 1:
-                fluctuation = random.uniform(-max_fluctuation, max_fluctuation)
+                fluctuation = self.rng.uniform(-max_fluctuation, max_fluctuation)
                 prob = base_prob + fluctuation
                 probabilities.append(max(0.01, prob)) # 最低1%保証
                 current_sum += probabilities[-1]
@@ -113,12 +241,13 @@ class GameState:
 
     def add_player(self, player: Player) -> bool:
         """人間プレイヤーをゲーム開始前に追加する"""
-        if not player.is_bot and player not in self.players and not self.race_started:
-            self.players.append(player)
+        already_joined = player.id in self._players_by_id
+        if not player.is_bot and not already_joined and not self.race_started:
+            self._register_player(player)
             self.initial_players.append(player) # 参加賞判定用のリストにも追加
             logger.info(f"Player {player.name} (ID: {player.id}, Strategy: {player.strategy}) joined.")
             return True
-        elif player in self.players: logger.warning(f"Player {player.name} already in game."); return False
+        elif already_joined: logger.warning(f"Player {player.name} already in game."); return False
         elif self.race_started: logger.warning(f"Race already started. Cannot add {player.name}."); return False
         return False
 
@@ -151,46 +280,90 @@ class GameState:
                 is_bot=True
             )
             if self.STRATEGIES:
-                 cpu_player.strategy = random.choice(self.STRATEGIES)
+                 cpu_player.strategy = self.rng.choice(self.STRATEGIES)
             else:
                  cpu_player.strategy = None
 
-            self.players.append(cpu_player)
+            self._register_player(cpu_player)
         logger.info(f"Initialized {actual_count} CPU players with random strategies.")
+
+    def _register_player(self, player: Player):
+        """プレイヤーをリストと索引の両方に登録する"""
+        self._seat_by_id[player.id] = len(self.players)
+        self.players.append(player)
+        if self.player_table is not None: self.player_table.attach(player)
+        self._players_by_id[player.id] = player
+        if player.is_active and not player.eliminated:
+            self._active_ids.add(player.id); self._active_cache = None
+        elif player.eliminated:
+            self._eliminated_ids.add(player.id); self._eliminated_cache = None
+        if not player.is_bot:
+            self._human_players.append(player)
+
+    def _sorted_by_seat(self, player_ids: Set[int]) -> List[Player]:
+        """ID集合を参加順のプレイヤーリストに変換する (対象人数分のコストのみ)"""
+        seat_by_id = self._seat_by_id
+        return [self._players_by_id[player_id] for player_id in sorted(player_ids, key=seat_by_id.__getitem__)]
     # --- プレイヤーリスト取得系メソッド ---
-    def get_player_count(self) -> int: return len([p for p in self.players if not p.is_bot])
-    def get_human_players(self) -> List[Player]: return [p for p in self.players if not p.is_bot]
+    def get_player_count(self) -> int: return len(self._human_players)
+    def get_human_players(self) -> List[Player]: return list(self._human_players)
     def get_players(self) -> List[Player]: return list(self.players)
-    def get_active_players(self) -> List[Player]: return [p for p in self.players if p.is_active and not p.eliminated]
+    def get_player(self, player_id: int) -> Optional[Player]: return self._players_by_id.get(player_id)
+    def get_active_count(self) -> int: return len(self._active_ids)
+
+    def get_active_players(self) -> List[Player]:
+        """生存中のプレイヤーを参加順で返す (状態が変わるまで並べ替え結果を再利用する)"""
+        if self._active_cache is None:
+            self._active_cache = self._sorted_by_seat(self._active_ids)
+        return list(self._active_cache)
+
+    def get_eliminated_players(self) -> List[Player]:
+        """脱落中のプレイヤーを参加順で返す"""
+        if self._eliminated_cache is None:
+            self._eliminated_cache = self._sorted_by_seat(self._eliminated_ids)
+        return list(self._eliminated_cache)
 
     # --- プレイヤー状態変更メソッド ---
     def eliminate_player(self, player: Player):
         """指定プレイヤーを脱落状態にする"""
-        target_player = next((p for p in self.players if p.id == player.id), None)
+        target_player = self._players_by_id.get(player.id)
         if target_player and target_player.is_active:
             target_player.is_active = False
             target_player.eliminated = True
-            if target_player not in self.eliminated_this_lap:
+            self._active_ids.discard(target_player.id); self._eliminated_ids.add(target_player.id)
+            self._active_cache = None; self._eliminated_cache = None
+            if target_player.id not in self._eliminated_this_lap_ids:
+                self._eliminated_this_lap_ids.add(target_player.id)
                 self.eliminated_this_lap.append(target_player)
             # logger.info(f"Player {target_player.name} eliminated.") # 必要ならログ復活
 
     def revive_player(self, player: Player):
          """指定プレイヤーを復活状態にする"""
-         target_player = next((p for p in self.players if p.id == player.id), None)
+         target_player = self._players_by_id.get(player.id)
          if target_player and not target_player.is_active and target_player.eliminated:
               target_player.is_active = True
               target_player.eliminated = False
               target_player.used_in_current_lap = False
-              if target_player not in self.revived_this_lap:
+              self._eliminated_ids.discard(target_player.id); self._active_ids.add(target_player.id)
+              self._active_cache = None; self._eliminated_cache = None
+              if target_player.id not in self._revived_this_lap_ids:
+                  self._revived_this_lap_ids.add(target_player.id)
                   self.revived_this_lap.append(target_player)
               # logger.info(f"Player {target_player.name} revived.") # 必要ならログ復活
 
     def reset_lap_usage(self):
         """ラップ開始時に状態をリセット"""
+        if self.recorder is not None and self.current_lap > 0:
+            self.recorder.record_lap(self) # 前のラップの結果をリセット前に記録
         self.current_lap += 1
+        self.lap_events = 0
         self.eliminated_this_lap = []
         self.revived_this_lap = []
-        for p in self.players: p.used_in_current_lap = False
+        self._eliminated_this_lap_ids = set()
+        self._revived_this_lap_ids = set()
+        if self.player_table is not None: self.player_table.clear_used() # 一括リセット
+        else:
+            for p in self.players: p.used_in_current_lap = False
         # 一騎打ちフラグ更新
         if self.next_lap_final_duel:
             active_players = self.get_active_players()
@@ -202,15 +375,33 @@ class GameState:
     # game_logic.py の GameState クラス内
 
     # ★★★ 戻り値の型ヒントを変更 ★★★
+    def _get_lap_engine(self) -> Optional[lap_engine.VectorLapEngine]:
+        """大人数レースならベクトル化したラップ処理エンジンを返す (NumPy が無い・人数が少ない場合は None)"""
+        if self.player_table is None or len(self.players) < self.vector_lap_min_players or not lap_engine.is_available():
+            return None
+        if self._vector_engine is None:
+            self._vector_engine = lap_engine.VectorLapEngine(self.rng.getrandbits(64)) # レースの乱数から NumPy の乱数を作る
+            logger.info(f"Using vectorized lap engine ({len(self.players)} players).")
+        return self._vector_engine
+
     def process_lap_pairwise(self) -> Tuple[List[str], List[str]]:
         """ペア対決方式(バトル数上限あり)でラップを処理し、
         追い抜きテキストリストとスキルテキストリストをタプルで返す"""
+        engine = self._get_lap_engine()
+        if engine is not None: return engine.process_lap_pairwise(self)
         # ★ リストを2つ用意
         overtake_messages = []
         skill_messages = []
 
         active_players = self.get_active_players()
-        available_players = [p for p in active_players if not p.used_in_current_lap]
+        table = self.player_table
+        if table is not None:
+            # 行動可能者 (生存かつ未行動) は全員このラップで行動済みになるので、フラグは最後に一括で立てる
+            used = table.used
+            available_players = [p for p in active_players if not used[p._seat]]
+            lap_mask = table.snapshot_active()
+        else:
+            available_players = [p for p in active_players if not p.used_in_current_lap]
         num_available = len(available_players)
 
         if num_available < 2: # ペアを作れない場合
@@ -218,8 +409,9 @@ class GameState:
                   if player.is_active:
                        text = self.race_events.get_skill_text(player)
                        skill_messages.append(text) # ★ スキルリストに追加
-                       player.used_in_current_lap = True
+                       if table is None: player.used_in_current_lap = True
                        logger.debug(f"Skill (no pairs possible): {player.name}. Text: {text}")
+             if table is not None: table.mark_used(lap_mask)
              active_after_lap = self.get_active_players()
              if len(active_after_lap) == 2: self.next_lap_final_duel = True
              return overtake_messages, skill_messages # ★ 2つのリストを返す
@@ -230,35 +422,41 @@ class GameState:
         num_battles = min(num_battles, num_available // 2)
         logger.info(f"Lap {self.current_lap}: Available={num_available}, Num Battles Calculated={num_battles}")
 
-        random.shuffle(available_players)
+        self.rng.shuffle(available_players)
         paired_players_list = available_players[:num_battles * 2]
         single_players_list = available_players[num_battles * 2:]
 
         # ペア対決処理
         favored_strategy = self.get_favored_strategy()
+        debug_enabled = logger.isEnabledFor(logging.DEBUG) # 無効時はログ文字列を組み立てない
+        if table is not None: strategy_codes = table.strategy_codes; favored_code = table.strategy_code(favored_strategy)
         for i in range(0, len(paired_players_list), 2):
             player1, player2 = paired_players_list[i], paired_players_list[i+1]
             winner, loser = None, None
             # (勝敗判定ロジックは変更なし)
-            p1_is_favored = player1.strategy == favored_strategy; p2_is_favored = player2.strategy == favored_strategy
-            if p1_is_favored == p2_is_favored: winner, loser = random.sample([player1, player2], 2)
-            elif p1_is_favored: winner, loser = (player1, player2) if random.random() < self.STRATEGY_WIN_BONUS_RATE else (player2, player1)
-            else: winner, loser = (player2, player1) if random.random() < self.STRATEGY_WIN_BONUS_RATE else (player1, player2)
-            was_advantageous = (winner.strategy == favored_strategy) and (loser.strategy != favored_strategy)
+            if table is not None: p1_is_favored = strategy_codes[player1._seat] == favored_code; p2_is_favored = strategy_codes[player2._seat] == favored_code
+            else: p1_is_favored = player1.strategy == favored_strategy; p2_is_favored = player2.strategy == favored_strategy
+            if p1_is_favored == p2_is_favored: winner, loser = self.rng.sample([player1, player2], 2)
+            elif p1_is_favored: winner, loser = (player1, player2) if self.rng.random() < self.STRATEGY_WIN_BONUS_RATE else (player2, player1)
+            else: winner, loser = (player2, player1) if self.rng.random() < self.STRATEGY_WIN_BONUS_RATE else (player1, player2)
 
             text = self.race_events.get_overtake_text(winner, loser)
             overtake_messages.append(text) # ★ 追い抜きリストに追加
             self.eliminate_player(loser)
-            player1.used_in_current_lap = True; player2.used_in_current_lap = True
-            logger.debug(f"Overtake: W:{winner.name}({winner.strategy}) vs L:{loser.name}({loser.strategy}). Fav:{favored_strategy}. WinAdv:{was_advantageous}.")
+            if table is None: player1.used_in_current_lap = True; player2.used_in_current_lap = True
+            if debug_enabled:
+                was_advantageous = (winner.strategy == favored_strategy) and (loser.strategy != favored_strategy)
+                logger.debug(f"Overtake: W:{winner.name}({winner.strategy}) vs L:{loser.name}({loser.strategy}). Fav:{favored_strategy}. WinAdv:{was_advantageous}.")
 
         # シングルプレイヤー処理 (スキルイベント)
+        active_flags = table.active if table is not None else None
         for player in single_players_list:
-            if player.is_active:
+            if (active_flags[player._seat] == 1) if active_flags is not None else player.is_active:
                 text = self.race_events.get_skill_text(player)
                 skill_messages.append(text) # ★ スキルリストに追加
-                player.used_in_current_lap = True
-                logger.debug(f"Skill: {player.name}({player.strategy}). Text: {text}")
+                if table is None: player.used_in_current_lap = True
+                if debug_enabled: logger.debug(f"Skill: {player.name}({player.strategy}). Text: {text}")
+        if table is not None: table.mark_used(lap_mask)
 
         # ラップ終了後の生存者チェック
         active_after_lap = self.get_active_players()
@@ -269,6 +467,7 @@ class GameState:
 
     def process_final_duel(self) -> Tuple[List[str], str]:
         """最終決戦（大逆転チェック含む）"""
+        self.lap_events |= LAP_EVENT_FINAL_DUEL
         # 大逆転チェックを先に行う
         gc_happened, gc_message = self.process_great_comeback()
         if gc_happened: return [], gc_message # 大逆転発生時は専用メッセージのみ返す
@@ -285,9 +484,9 @@ class GameState:
         # 作戦ボーナス込みで勝敗決定
         winner, loser = None, None
         favored_strategy = self.get_favored_strategy(); p1_is_favored = player1.strategy == favored_strategy; p2_is_favored = player2.strategy == favored_strategy
-        if p1_is_favored == p2_is_favored: winner, loser = random.sample(duelists, 2)
-        elif p1_is_favored: winner, loser = (player1, player2) if random.random() < self.STRATEGY_WIN_BONUS_RATE else (player2, player1)
-        else: winner, loser = (player2, player1) if random.random() < self.STRATEGY_WIN_BONUS_RATE else (player1, player2)
+        if p1_is_favored == p2_is_favored: winner, loser = self.rng.sample(duelists, 2)
+        elif p1_is_favored: winner, loser = (player1, player2) if self.rng.random() < self.STRATEGY_WIN_BONUS_RATE else (player2, player1)
+        else: winner, loser = (player2, player1) if self.rng.random() < self.STRATEGY_WIN_BONUS_RATE else (player1, player2)
 
         self.winner = winner; self.second_place = loser; self.game_finished = True
         logger.info(f"Final duel finished. W:{winner.name}({winner.strategy}), L:{loser.name}({loser.strategy}). Fav:{favored_strategy}.")
@@ -311,7 +510,17 @@ class GameState:
         if self.current_lap < 2: return [], [] # Lap 1 は発生しない
 
         revival_chance = self._get_revival_chance(self.current_lap) # 確率は変更済み (Lap10-15: 0.5%, Lap16+: 0.2%)
-        eligible_for_revival = [p for p in self.players if p.eliminated and p not in self.eliminated_this_lap]
+        engine = self._get_lap_engine()
+        if engine is not None: # 大人数レース: 対象者全員分の判定をまとめて行う
+            for player in engine.select_revivals(self, revival_chance):
+                self.revive_player(player)
+                revived_players.append(player)
+                messages.append(self.race_events.get_revival_text(player))
+            if revived_players:
+                logger.info(f"Revival ({revival_chance*100:.1f}%): {len(revived_players)} players revived (Limit: {self.MAX_REVIVALS_PER_LAP}).")
+            return revived_players, messages
+
+        eligible_for_revival = [p for p in self.get_eliminated_players() if p.id not in self._eliminated_this_lap_ids]
 
         # ★ 追加: このラップで復活した人数をカウント
         revived_count_this_lap = 0
@@ -324,7 +533,7 @@ class GameState:
                 break # このラップでの復活処理を打ち切り
 
             # 確率判定
-            if random.random() < revival_chance:
+            if self.rng.random() < revival_chance:
                 self.revive_player(player)
                 revived_players.append(player)
                 messages.append(self.race_events.get_revival_text(player))
@@ -357,7 +566,8 @@ class GameState:
         # 発生確率計算 (上限20%に更新済み)
         trigger_prob = max(0.0, min(self.FORCED_ELIM_MAX_CHANCE, self.FORCED_ELIM_BASE_CHANCE + self.FORCED_ELIM_CHANCE_PER_PLAYER * (active_count - self.FORCED_ELIM_MIN_PLAYERS)))
         logger.debug(f"FE check: Active={active_count}, Prob={trigger_prob:.3f}")
-        if random.random() >= trigger_prob: return [], [] # 発生せず
+        engine = self._get_lap_engine()
+        if not (engine.roll(trigger_prob) if engine is not None else self.rng.random() < trigger_prob): return [], [] # 発生せず
 
         # 脱落人数計算 (割合ベースに修正済み)
         target_elim = math.floor(active_count * self.FORCED_ELIM_PERCENTAGE)
@@ -369,11 +579,12 @@ class GameState:
              logger.warning(f"FE calc result ({num_eliminations}) < min ({self.FORCED_ELIM_MIN_ABSOLUTE}). Cancelling."); return [], []
 
         # 脱落者選定と実行
-        eliminated_candidates = random.sample(active_players, num_eliminations)
+        eliminated_candidates = engine.sample_active(self, num_eliminations) if engine is not None else self.rng.sample(active_players, num_eliminations)
         for player in eliminated_candidates: self.eliminate_player(player); eliminated_players.append(player)
 
         # メッセージ生成
         if eliminated_players:
+            self.lap_events |= LAP_EVENT_FORCED_ELIMINATION
             event_text, result_text = self.race_events.get_forced_elimination_text(eliminated_players)
             messages = [event_text, result_text]
             logger.info(f"FE triggered ({trigger_prob*100:.1f}%): {num_eliminations} players elim ({', '.join([p.name for p in eliminated_players])}).")
@@ -383,10 +594,11 @@ class GameState:
         """革命イベント"""
         # ループ内ログはコメントアウト済み
         if self.current_lap < 3: return False, "", [], []
-        if random.random() >= 0.04: return False, "", [], []
-        active_players = list(self.get_active_players()); eliminated_players = [p for p in self.players if p.eliminated]
+        if self.rng.random() >= 0.04: return False, "", [], []
+        active_players = list(self.get_active_players()); eliminated_players = self.get_eliminated_players()
         if len(active_players) < 4 or not eliminated_players: return False, "", [], []
         logger.info("Revolution event triggered!")
+        self.lap_events |= LAP_EVENT_REVOLUTION
         demoted = list(active_players); promoted = list(eliminated_players)
         for player in demoted: self.eliminate_player(player) # loggerなし
         for player in promoted: self.revive_player(player) # loggerなし
@@ -397,11 +609,12 @@ class GameState:
         """大逆転イベント"""
         # ポイント計算呼び出し削除済み
         if not self.final_duel: return False, ""
-        if random.random() >= 0.05: return False, "" # 5%確率
+        if self.rng.random() >= 0.05: return False, "" # 5%確率
         logger.info("Great Comeback event triggered!")
-        eliminated_players = [p for p in self.players if p.eliminated]; final_duelists = list(self.get_active_players())
+        eliminated_players = self.get_eliminated_players(); final_duelists = list(self.get_active_players())
         if not eliminated_players or len(final_duelists) != 2: logger.warning("GC condition not met."); return False, ""
-        comeback_player = random.choice(eliminated_players); loser1, loser2 = final_duelists
+        self.lap_events |= LAP_EVENT_GREAT_COMEBACK
+        comeback_player = self.rng.choice(eliminated_players); loser1, loser2 = final_duelists
         self.revive_player(comeback_player); self.eliminate_player(loser1); self.eliminate_player(loser2)
         self.winner = comeback_player; self.second_place = None; self.game_finished = True; self.great_comeback_occurred = True
         self.great_comeback_winner = comeback_player; self.great_comeback_losers = final_duelists
@@ -445,35 +658,98 @@ class GameState:
 
         return summary
 
+    def calculate_points(self) -> Dict[str, int]:
+        """レース結果から各プレイヤーの獲得ポイントを計算する (DBアクセスなし)"""
+        points_to_add: Dict[str, int] = {}
+        # 大逆転シナリオ
+        if self.great_comeback_occurred and self.great_comeback_winner:
+            logger.info("Calculating points for Great Comeback.")
+            winner_id = f"CPU_{abs(self.great_comeback_winner.id)}" if self.great_comeback_winner.is_bot else str(self.great_comeback_winner.id); points_to_add[winner_id] = WINNER_POINTS
+            for loser in self.great_comeback_losers: loser_id = f"CPU_{abs(loser.id)}" if loser.is_bot else str(loser.id); points_to_add[loser_id] = GREAT_COMEBACK_SECOND_PLACE_POINTS
+        # 通常終了シナリオ
+        elif self.winner:
+            logger.info("Calculating points for normal finish.")
+            winner_id = f"CPU_{abs(self.winner.id)}" if self.winner.is_bot else str(self.winner.id); points_to_add[winner_id] = WINNER_POINTS
+            if self.second_place: second_id = f"CPU_{abs(self.second_place.id)}" if self.second_place.is_bot else str(self.second_place.id); points_to_add[second_id] = SECOND_PLACE_POINTS
+        # 勝者なしシナリオ
+        else: logger.info("Calculating points for no winner scenario.")
+        # 参加ポイント付与
+        for player in self.initial_players:
+             player_id_str = f"CPU_{abs(player.id)}" if player.is_bot else str(player.id)
+             if player_id_str not in points_to_add: points_to_add[player_id_str] = PARTICIPATION_POINTS
+        return points_to_add
+
+    def get_display_names(self) -> Dict[str, str]:
+        """人間プレイヤーの参加時の表示名を {discord_id: 表示名} で返す (ランキング表示用にDBへ保存する)"""
+        return {str(p.id): p.name for p in self.initial_players if not p.is_bot}
+
+    # --- チェックポイント (再起動後のレース再開用) ---
+    def to_checkpoint(self) -> Dict[str, Any]:
+        """ラップの区切り (または開始前) のゲーム状態を JSON にできる辞書で返す
+
+        参加者・フラグ・ラップ数・有利作戦の確率・乱数の状態 (実況テキストの山札と NumPy の乱数を含む) を持ち、
+        from_checkpoint で復元すると中断しなかった場合と同じ展開で続きを進められる。"""
+        version, internal_state, gauss_next = self.rng.getstate()
+        return {
+            "seed": self.seed,
+            "lap": self.current_lap,
+            "race_started": self.race_started,
+            "final_duel": self.final_duel,
+            "next_lap_final_duel": self.next_lap_final_duel,
+            "strategy_advantage": [self.strategy_advantage.get(strategy, 0.0) for strategy in self.STRATEGIES],
+            "vector_lap_min_players": self.vector_lap_min_players,
+            "players": [[p.id, p.name, p.strategy, p.is_bot, p.is_active] for p in self.players], # 参加順
+            "rng": [version, base64.b64encode(struct.pack(f'<{len(internal_state)}I', *internal_state)).decode('ascii'), gauss_next],
+            "event_decks": self.race_events.get_deck_state(),
+            "vector_rng": self._vector_engine.get_rng_state() if self._vector_engine is not None else None,
+        }
+
+    @classmethod
+    def from_checkpoint(cls, data: Dict[str, Any], guild_id: str, race_events: 'RaceEvents',
+                        points_saver: Optional[Callable[[str, Dict[str, int], Dict[str, str]], Any]] = None) -> 'GameState':
+        """to_checkpoint の辞書からゲーム状態を復元する"""
+        game = cls(guild_id, race_events, points_saver=points_saver,
+                   vector_lap_min_players=data["vector_lap_min_players"], seed=data["seed"])
+        # 初期化で作られたCPUを破棄し、保存時の参加者を参加順に登録し直す
+        game.players = []; game._players_by_id = {}; game._seat_by_id = {}; game._human_players = []
+        game._active_ids = set(); game._eliminated_ids = set(); game._active_cache = None; game._eliminated_cache = None
+        if game.player_table is not None: game.player_table = PlayerTable(cls.STRATEGIES)
+        for player_id, name, strategy, is_bot, is_active in data["players"]:
+            player = Player(player_id, name, is_bot=is_bot)
+            player.strategy = strategy
+            if not is_active: player.is_active = False; player.eliminated = True
+            game._register_player(player)
+        game.initial_players = list(game.players)
+        game.current_lap = data["lap"]
+        game.race_started = data["race_started"]
+        game.final_duel = data["final_duel"]
+        game.next_lap_final_duel = data["next_lap_final_duel"]
+        game.strategy_advantage = dict(zip(cls.STRATEGIES, data["strategy_advantage"]))
+        version, packed_state, gauss_next = data["rng"]
+        packed_state = base64.b64decode(packed_state)
+        game.rng.setstate((version, struct.unpack(f'<{len(packed_state) // 4}I', packed_state), gauss_next))
+        race_events.set_deck_state(data["event_decks"])
+        if data.get("vector_rng") is not None and lap_engine.is_available():
+            game._vector_engine = lap_engine.VectorLapEngine()
+            game._vector_engine.set_rng_state(data["vector_rng"])
+        return game
+
     def _calculate_and_save_points(self):
-        """ポイント計算とDB保存"""
-        # 内部ロジックは変更なし
+        """ポイント計算とDB保存 (points_saver があればそちらに委譲し、イベントループをブロックしない)"""
         logger.info(f"Calculating points for guild {self.guild_id}...")
         if not self.guild_id: logger.error("Guild ID not set."); return
         try:
-            with app.app_context():
-                points_to_add: Dict[str, int] = {}
-                # 大逆転シナリオ
-                if self.great_comeback_occurred and self.great_comeback_winner:
-                    logger.info("Calculating points for Great Comeback.")
-                    winner_id = f"CPU_{abs(self.great_comeback_winner.id)}" if self.great_comeback_winner.is_bot else str(self.great_comeback_winner.id); points_to_add[winner_id] = WINNER_POINTS
-                    for loser in self.great_comeback_losers: loser_id = f"CPU_{abs(loser.id)}" if loser.is_bot else str(loser.id); points_to_add[loser_id] = GREAT_COMEBACK_SECOND_PLACE_POINTS
-                # 通常終了シナリオ
-                elif self.winner:
-                    logger.info("Calculating points for normal finish.")
-                    winner_id = f"CPU_{abs(self.winner.id)}" if self.winner.is_bot else str(self.winner.id); points_to_add[winner_id] = WINNER_POINTS
-                    if self.second_place: second_id = f"CPU_{abs(self.second_place.id)}" if self.second_place.is_bot else str(self.second_place.id); points_to_add[second_id] = SECOND_PLACE_POINTS
-                # 勝者なしシナリオ
-                else: logger.info("Calculating points for no winner scenario.")
-                # 参加ポイント付与
-                for player in self.initial_players:
-                     player_id_str = f"CPU_{abs(player.id)}" if player.is_bot else str(player.id)
-                     if player_id_str not in points_to_add: points_to_add[player_id_str] = PARTICIPATION_POINTS
-                # DB保存実行
-                logger.info(f"Points calculated: {points_to_add}")
-                for discord_id, points in points_to_add.items():
-                    try: PlayerPoints.add_points(discord_id, self.guild_id, points)
-                    except Exception as db_err: logger.error(f"Failed to save points for {discord_id}: {db_err}", exc_info=True)
+            points_to_add = self.calculate_points()
+            logger.info(f"Points calculated: {points_to_add}")
+            display_names = self.get_display_names()
+            if self.points_saver is not None:
+                # DB保存は呼び出し側 (DBスレッドプール等) に任せる
+                self.points_saver(self.guild_id, points_to_add, display_names)
+                return
+            # DB保存実行 (同期)。DBを使わない用途 (シミュレーター等) で app を読み込まないよう、ここでインポートする
+            from db_executor import save_points_sync
+            save_errors = save_points_sync(self.guild_id, points_to_add, display_names)
+            for discord_id, db_err in save_errors.items(): logger.error(f"Failed to save points for {discord_id}: {db_err}")
         except Exception as e: logger.error(f"Critical error in _calculate_and_save_points: {e}", exc_info=True)
 
     # game_logic.py の GameState クラス内
@@ -0,0 +1,48 @@
+import os
+import logging
+from typing import Any, Dict
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+# --- ゲートウェイ・キャッシュ設定 ---
+GATEWAY_PROFILE = os.getenv('GATEWAY_PROFILE', 'default') # 'minimal' なら必要最小限のインテントとキャッシュで動かす (大規模運用向け)
+MINIMAL_MESSAGE_CACHE_SIZE = int(os.environ.get("MINIMAL_MESSAGE_CACHE_SIZE", "0")) # minimal で保持するメッセージ数 (0 = 保持しない)
+
+PROFILE_DEFAULT = 'default'
+PROFILE_MINIMAL = 'minimal'
+PROFILES = (PROFILE_DEFAULT, PROFILE_MINIMAL)
+
+
+def build_client_options(profile: str, message_content: bool, prefix_commands: bool,
+                         message_cache_size: int = MINIMAL_MESSAGE_CACHE_SIZE) -> Dict[str, Any]:
+    """Bot (commands.Bot / AutoShardedBot) に渡すインテントとキャッシュの設定を作る
+
+    default: 従来どおり Intents.default() + メッセージ本文 + リアクション。キャッシュも discord.py の既定のまま。
+    minimal: Bot が実際に使うものだけを受け取る。
+      - guilds: 実況の送信先チャンネル・再開時の get_channel・コマンドの権限判定に必要
+      - guild_messages: プレフィックス / @メンション のコマンドを使う場合のみ
+      - リアクション・入力中・ボイス・絵文字などのイベントは受け取らない (Bot は使っていない)
+      - メンバーはキャッシュせず、起動時のメンバー取得 (chunk) もしない。
+        参加ボタンは interaction.user、ランキングはDBに保存済みの表示名 (無ければ UserNameResolver の REST) を使うので不要
+      - 送信済みメッセージは Message オブジェクトを直接編集するので、メッセージキャッシュも不要"""
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown gateway profile: {profile} (choices: {', '.join(PROFILES)})")
+    if profile == PROFILE_DEFAULT:
+        intents = discord.Intents.default()
+        intents.message_content = message_content
+        intents.reactions = True
+        # intents.members = True # 必要なら有効化
+        return {"intents": intents}
+
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.guild_messages = prefix_commands
+    intents.message_content = message_content and prefix_commands
+    return {
+        "intents": intents,
+        "member_cache_flags": discord.MemberCacheFlags.none(),
+        "chunk_guilds_at_startup": False,
+        "max_messages": message_cache_size if message_cache_size > 0 else None, # 0 以下を渡すと discord.py は既定の 1000 件にする
+    }
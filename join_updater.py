@@ -0,0 +1,96 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Callable, List, Optional
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+# --- 参加受付メッセージの更新設定 ---
+JOIN_UPDATE_INTERVAL_SECONDS = float(os.environ.get("JOIN_UPDATE_INTERVAL_SECONDS", "2.0")) # 募集メッセージを編集する最短間隔
+JOIN_NOTIFY_MAX_LINES = int(os.environ.get("JOIN_NOTIFY_MAX_LINES", "10")) # 参加通知に表示する直近の参加者数
+
+
+class JoinMessageUpdater:
+    """参加ボタンが押されたときの表示更新をまとめるクラス
+
+    参加のたびに募集メッセージを編集して通知を送る代わりに、参加を記録しておき、
+    最短 interval 秒ごとに1回だけ、最新の参加者数で募集メッセージを編集し、
+    直近の参加者を並べた1通の参加通知 (初回のみ送信し、以降は編集) を更新する。
+    受付終了時に close() を呼ぶと、未反映の更新を取り消して参加通知を削除する。"""
+
+    def __init__(self, channel: discord.abc.Messageable, message: discord.Message,
+                 render_embed: Callable[[], discord.Embed], interval: float = JOIN_UPDATE_INTERVAL_SECONDS,
+                 max_lines: int = JOIN_NOTIFY_MAX_LINES):
+        self.channel = channel
+        self.message = message # 募集メッセージ
+        self.render_embed = render_embed # 最新の参加者数で募集メッセージの Embed を作る
+        self.interval = interval
+        self.max_lines = max(1, max_lines)
+        self._joins: List[str] = [] # 参加通知の行 (参加順)
+        self._dirty = False # 前回の反映後に参加があったか
+        self._last_flush = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._notify_message: Optional[discord.Message] = None # 参加通知 (1通を編集して使い回す)
+        self._closed = False
+        self.edits = 0 # 実行した REST 呼び出し (送信・編集) の回数
+
+    def add_join(self, line: str):
+        """参加を記録し、次の更新を予約する (すぐに返る)"""
+        if self._closed: return
+        self._joins.append(line)
+        self._dirty = True
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        try:
+            wait = self._last_flush + self.interval - time.monotonic()
+            if wait > 0: await asyncio.sleep(wait)
+            await self.flush()
+        finally:
+            self._task = None
+        if self._dirty and not self._closed: # 反映中に参加があった
+            self._task = asyncio.create_task(self._flush_later())
+
+    async def flush(self):
+        """溜まった参加を募集メッセージと参加通知に反映する"""
+        if not self._dirty or self._closed: return
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        # 編集中に増えた参加は次回に回し、2つのメッセージは同じ時点の内容にそろえる
+        join_embed = self.render_embed()
+        recent = self._joins[-self.max_lines:]
+        hidden = len(self._joins) - len(recent)
+        notify_embed = discord.Embed(description="\n".join(recent), color=discord.Color.green())
+        if hidden: notify_embed.set_footer(text=f"ほか {hidden} 人が参加済み")
+        try:
+            await self.message.edit(embed=join_embed)
+            self.edits += 1
+        except Exception as e:
+            logger.error(f"Error editing join message: {e}", exc_info=True)
+        try:
+            if self._notify_message is None:
+                notify_message = await self.channel.send(embed=notify_embed)
+                if self._closed: await notify_message.delete(); return # 送信中に受付が終了した
+                self._notify_message = notify_message
+            else:
+                await self._notify_message.edit(embed=notify_embed)
+            self.edits += 1
+        except Exception as e:
+            logger.error(f"Error updating join notification: {e}", exc_info=True)
+
+    async def close(self):
+        """受付終了時に呼ぶ (未反映の更新を取り消し、参加通知を削除する)"""
+        self._closed = True
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._notify_message is not None:
+            try:
+                await self._notify_message.delete()
+            except discord.NotFound: pass
+            except Exception as e: logger.error(f"Error deleting join notification: {e}")
+            self._notify_message = None
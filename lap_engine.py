@@ -0,0 +1,114 @@
+import os
+import logging
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError: # NumPy は任意 (無ければ従来のラップ処理だけを使う)
+    np = None
+
+if TYPE_CHECKING:
+    from game_logic import GameState, Player
+
+logger = logging.getLogger(__name__)
+
+# --- ベクトル化ラップ処理の設定 ---
+VECTOR_LAP_MIN_PLAYERS = int(os.environ.get("VECTOR_LAP_MIN_PLAYERS", "200")) # 参加者がこの人数以上のレースで使う
+
+
+def is_available() -> bool:
+    """NumPy が使えるか"""
+    return np is not None
+
+
+class VectorLapEngine:
+    """大人数レース用のラップ処理 (NumPy)
+
+    GameState と同じルール・確率 (STRATEGY_WIN_BONUS_RATE, バトル数の上限, MAX_REVIVALS_PER_LAP) で、
+    1ラップ分の乱数をまとめて生成し、勝敗・脱落・復活を PlayerTable の列に対する配列演算で決める。
+    乱数の消費順が異なるため同じシードでも結果は従来処理と一致しないが、分布は同じになる
+    (benchmarks/check_lap_engine.py で確認できる)。"""
+
+    def __init__(self, seed: Optional[int] = None):
+        if np is None:
+            raise RuntimeError("VectorLapEngine requires NumPy.")
+        self.rng = np.random.default_rng(seed)
+
+    def get_rng_state(self) -> Dict[str, Any]:
+        """NumPy の乱数の内部状態 (JSON にできる辞書) を返す (チェックポイント用)"""
+        return self.rng.bit_generator.state
+
+    def set_rng_state(self, state: Dict[str, Any]):
+        self.rng.bit_generator.state = state
+
+    def roll(self, probability: float) -> bool:
+        """probability の確率で True を返す"""
+        return self.rng.random() < probability
+
+    def process_lap_pairwise(self, game: 'GameState') -> Tuple[List[str], List[str]]:
+        """GameState.process_lap_pairwise と同じ処理 (追い抜きテキストとスキルテキストのリストを返す)"""
+        table = game.player_table
+        players = game.players # 行番号 = players のインデックス
+        overtake_messages: List[str] = []
+        skill_messages: List[str] = []
+
+        active = np.frombuffer(table.active, dtype=np.uint8)
+        used = np.frombuffer(table.used, dtype=np.uint8)
+        available_seats = np.flatnonzero((active == 1) & (used == 0))
+        used[available_seats] = 1 # 行動可能者は全員このラップで行動済みになる
+        del active, used # bytearray のバッファ参照を早めに手放す
+        num_available = len(available_seats)
+
+        if num_available < 2: # ペアを作れない場合
+            for seat in available_seats.tolist():
+                skill_messages.append(game.race_events.get_skill_text(players[seat]))
+            if game.get_active_count() == 2: game.next_lap_final_duel = True
+            return overtake_messages, skill_messages
+
+        num_battles = min(8, max(1, num_available // 4))
+        num_battles = min(num_battles, num_available // 2)
+        logger.info(f"Lap {game.current_lap}: Available={num_available}, Num Battles Calculated={num_battles} (vectorized)")
+
+        order = self.rng.permutation(available_seats)
+        first_seats = order[0:num_battles * 2:2]
+        second_seats = order[1:num_battles * 2:2]
+
+        # 作戦の有利不利と勝敗をまとめて判定
+        strategy_codes = np.frombuffer(table.strategy_codes, dtype=np.uint8)
+        favored_code = table.strategy_code(game.get_favored_strategy())
+        first_favored = strategy_codes[first_seats] == favored_code
+        second_favored = strategy_codes[second_seats] == favored_code
+        del strategy_codes
+        draws = self.rng.random(num_battles)
+        bonus_rate = game.STRATEGY_WIN_BONUS_RATE
+        first_wins = np.where(first_favored == second_favored, draws < 0.5,
+                              np.where(first_favored, draws < bonus_rate, draws >= bonus_rate))
+
+        for first_seat, second_seat, first_won in zip(first_seats.tolist(), second_seats.tolist(), first_wins.tolist()):
+            player1, player2 = players[first_seat], players[second_seat]
+            winner, loser = (player1, player2) if first_won else (player2, player1)
+            overtake_messages.append(game.race_events.get_overtake_text(winner, loser))
+            game.eliminate_player(loser)
+
+        # シングルプレイヤー処理 (スキルイベント)
+        for seat in order[num_battles * 2:].tolist():
+            skill_messages.append(game.race_events.get_skill_text(players[seat]))
+
+        if game.get_active_count() == 2: game.next_lap_final_duel = True; logger.info("Two players remaining.")
+        return overtake_messages, skill_messages
+
+    def select_revivals(self, game: 'GameState', revival_chance: float) -> List['Player']:
+        """復活するプレイヤーを参加順に最大 MAX_REVIVALS_PER_LAP 人選ぶ (このラップの脱落者は対象外)"""
+        table = game.player_table
+        eligible = np.frombuffer(table.eliminated, dtype=np.uint8) == 1 # コピーが作られる
+        if game.eliminated_this_lap:
+            eligible[[player._seat for player in game.eliminated_this_lap]] = False
+        eligible_seats = np.flatnonzero(eligible)
+        revived_seats = eligible_seats[self.rng.random(len(eligible_seats)) < revival_chance][:game.MAX_REVIVALS_PER_LAP]
+        return [game.players[seat] for seat in revived_seats.tolist()]
+
+    def sample_active(self, game: 'GameState', count: int) -> List['Player']:
+        """生存者から count 人を重複なしで選ぶ"""
+        active_seats = np.flatnonzero(np.frombuffer(game.player_table.active, dtype=np.uint8) == 1)
+        chosen = self.rng.choice(active_seats, size=count, replace=False)
+        return [game.players[seat] for seat in chosen.tolist()]
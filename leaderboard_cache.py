@@ -0,0 +1,90 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# --- キャッシュ設定 ---
+LEADERBOARD_CACHE_TTL_SECONDS = float(os.environ.get("LEADERBOARD_CACHE_TTL_SECONDS", "300")) # 週間/月間の集計期間の移動を反映する最長時間
+LEADERBOARD_CACHE_MAX_ENTRIES = int(os.environ.get("LEADERBOARD_CACHE_MAX_ENTRIES", "1000")) # 保持するサーバー数の上限 (LRUで追い出し)
+
+RankingRow = Tuple[str, int, Optional[str], Optional[datetime]] # (discord_id, points, display_name, name_updated_at)
+Rankings = Dict[str, List[RankingRow]] # {period: [行, ...]}
+
+
+class LeaderboardCache:
+    """サーバーごとのランキングをメモリに保持する TTL + LRU キャッシュ
+
+    ランキングはそのサーバーでレースが終わったとき (またはリセット時) にしか変わらないため、
+    書き込み側で invalidate() を呼べば、それまでの !ranking はDBにアクセスせずに返せる。
+    DB読み込み中に書き込みが入った場合に古い結果を保存しないよう、
+    サーバーごとの世代番号を読み込み開始時に取得し、put() 時に一致を確認する。
+    DBスレッドプールとイベントループの両方から呼ばれるためロックで保護する。"""
+
+    def __init__(self, ttl_seconds: float = LEADERBOARD_CACHE_TTL_SECONDS, max_entries: int = LEADERBOARD_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[float, Rankings]]" = OrderedDict() # (guild_id, limit) -> (保存時刻, ランキング)
+        self._generations: Dict[str, int] = {} # guild_id -> 世代番号 (invalidate のたびに増える)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "invalidations": 0, "stale_puts": 0}
+
+    def get(self, guild_id: str, periods: List[str], limit: int) -> Optional[Rankings]:
+        """キャッシュ済みのランキングを返す (未登録・期限切れ・期間不足なら None)"""
+        key = (guild_id, limit)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                self._stats["expired"] += 1
+                entry = None
+            if entry is None or any(period not in entry[1] for period in periods):
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key) # LRU: 最近使ったものを末尾へ
+            self._stats["hits"] += 1
+            return {period: entry[1][period] for period in periods}
+
+    def generation(self, guild_id: str) -> int:
+        """DB読み込みを始める前に呼び、put() に渡す世代番号を取得する"""
+        with self._lock:
+            return self._generations.get(guild_id, 0)
+
+    def put(self, guild_id: str, limit: int, rankings: Rankings, generation: int):
+        """DBから読み込んだランキングを保存する (読み込み中に invalidate されていれば破棄)"""
+        key = (guild_id, limit)
+        with self._lock:
+            if self._generations.get(guild_id, 0) != generation:
+                self._stats["stale_puts"] += 1
+                return
+            self._entries[key] = (time.monotonic(), dict(rankings))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, guild_id: str):
+        """サーバーのランキングが変わったときに呼ぶ (書き込みのコミット後)"""
+        with self._lock:
+            self._generations[guild_id] = self._generations.get(guild_id, 0) + 1
+            for key in [key for key in self._entries if key[0] == guild_id]:
+                del self._entries[key]
+            self._stats["invalidations"] += 1
+        logger.debug(f"Leaderboard cache invalidated for guild {guild_id}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """ヒット/ミス数などの統計を返す (キャッシュサイズ調整用)"""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+# プロセス全体で共有するランキングキャッシュ
+leaderboard_cache = LeaderboardCache()
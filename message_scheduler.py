@@ -0,0 +1,269 @@
+import os
+import heapq
+import asyncio
+import logging
+import itertools
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+# --- 送信スケジューラの設定 ---
+# Discord の制限は 1チャンネル 5件/5秒・Bot全体 50リクエスト/秒。
+# どの区間でも burst + rate * 窓の秒数 が制限を超えないようにし、全体は他のAPI呼び出し分の余裕も残す。
+MESSAGE_CHANNEL_RATE = float(os.environ.get("MESSAGE_CHANNEL_RATE", "0.6")) # 1チャンネルあたりの送信数/秒
+MESSAGE_CHANNEL_BURST = int(os.environ.get("MESSAGE_CHANNEL_BURST", "2"))
+MESSAGE_GLOBAL_RATE = float(os.environ.get("MESSAGE_GLOBAL_RATE", "25.0")) # Bot全体の送信数/秒
+MESSAGE_GLOBAL_BURST = int(os.environ.get("MESSAGE_GLOBAL_BURST", "20"))
+MESSAGE_CHANNEL_MAX_BACKLOG = int(os.environ.get("MESSAGE_CHANNEL_MAX_BACKLOG", "20")) # これを超えると送信側を待たせる
+MESSAGE_SLOW_WARN_SECONDS = float(os.environ.get("MESSAGE_SLOW_WARN_SECONDS", "10.0")) # キュー滞在がこれを超えたら警告
+MESSAGE_MAX_LENGTH = 2000 # Discord の1メッセージの上限 (結合後もこれを超えない)
+
+# 優先度 (大きいほど先に Bot 全体の送信枠を得る)
+PRIORITY_LOW = 0 # 実況の演出テキスト
+PRIORITY_NORMAL = 1 # ラップ結果など
+PRIORITY_HIGH = 2 # 最終結果・エラー通知
+
+
+class TokenBucket:
+    """rate 個/秒で補充され、最大 capacity 個まで貯まるトークンバケット"""
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: int, now: float):
+        self.rate = max(rate, 1e-6)
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = now
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def take(self, now: float) -> bool:
+        """トークンを1つ消費する (無ければ False)"""
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def delay(self, now: float) -> float:
+        """次のトークンが貯まるまでの秒数"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def full_delay(self, now: float) -> float:
+        """満杯 (capacity 個) になるまでの秒数"""
+        self._refill(now)
+        return (self.capacity - self.tokens) / self.rate
+
+
+class _PriorityLimiter:
+    """Bot全体のトークンバケット。待ちが発生したら優先度の高い順 (同じなら到着順) に枠を渡す"""
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = [] # (-priority, 到着順, future) のヒープ
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def acquire(self, priority: int) -> bool:
+        """送信枠を1つ得る (待たされたら True を返す)"""
+        loop = asyncio.get_running_loop()
+        if not self._waiters and self.bucket.take(loop.time()):
+            return False
+        future = loop.create_future()
+        heapq.heappush(self._waiters, (-priority, next(self._sequence), future))
+        self._schedule(loop)
+        await future
+        return True
+
+    def _schedule(self, loop: asyncio.AbstractEventLoop):
+        if self._timer is None:
+            self._timer = loop.call_later(self.bucket.delay(loop.time()), self._wake, loop)
+
+    def _wake(self, loop: asyncio.AbstractEventLoop):
+        self._timer = None
+        while self._waiters:
+            if self._waiters[0][2].done(): # 待機中にキャンセルされた
+                heapq.heappop(self._waiters); continue
+            if not self.bucket.take(loop.time()): break
+            heapq.heappop(self._waiters)[2].set_result(None)
+        if self._waiters: self._schedule(loop)
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+
+class _PendingMessage:
+    __slots__ = ('text', 'priority', 'future', 'enqueued_at')
+
+    def __init__(self, text: str, priority: int, future: asyncio.Future, enqueued_at: float):
+        self.text = text
+        self.priority = priority
+        self.future = future # 送信後に discord.Message (失敗・破棄なら None) が入る
+        self.enqueued_at = enqueued_at
+
+
+class _ChannelQueue:
+    __slots__ = ('channel', 'bucket', 'pending', 'task', 'idle', 'evict_timer')
+
+    def __init__(self, channel: discord.abc.Messageable, bucket: TokenBucket):
+        self.channel = channel
+        self.bucket = bucket
+        self.pending: Deque[_PendingMessage] = deque()
+        self.task: Optional[asyncio.Task] = None
+        self.idle = asyncio.Event() # 未送信のメッセージが無いときにセットされる
+        self.evict_timer: Optional[asyncio.TimerHandle] = None # 送信が止まった後、バケットが満杯に戻ったら削除する
+
+
+class MessageScheduler:
+    """チャンネルへのテキスト送信をまとめて管理するスケジューラ
+
+    チャンネルごとに送信キューを持ち、チャンネル単位と Bot 全体のトークンバケットで
+    Discord のレート制限に当たらないように送信する (discord.py 内部の 429 リトライ待ちを避ける)。
+    制限で待っている間に同じチャンネルに溜まったメッセージは、2000文字以内で改行区切りの1通にまとめる。
+    チャンネル内の順序は保ち、Bot 全体の枠が足りないときは優先度の高いメッセージ (最終結果など) を持つ
+    チャンネルから先に送る。enqueue から送信完了までの待ち時間を統計として記録する。"""
+
+    def __init__(self, channel_rate: float = MESSAGE_CHANNEL_RATE, channel_burst: int = MESSAGE_CHANNEL_BURST,
+                 global_rate: float = MESSAGE_GLOBAL_RATE, global_burst: int = MESSAGE_GLOBAL_BURST,
+                 max_backlog: int = MESSAGE_CHANNEL_MAX_BACKLOG):
+        self.channel_rate = channel_rate
+        self.channel_burst = channel_burst
+        self.global_rate = global_rate
+        self.global_burst = global_burst
+        self.max_backlog = max(1, max_backlog)
+        self._channels: Dict[int, _ChannelQueue] = {}
+        self._global: Optional[_PriorityLimiter] = None # イベントループ上で初めて使うときに作る
+        self._stats: Dict[str, Any] = {
+            "enqueued": 0,
+            "sent": 0, # 実際の送信回数 (API 呼び出し)
+            "coalesced": 0, # 前のメッセージにまとめて送った件数
+            "failed": 0,
+            "discarded": 0,
+            "channel_waits": 0, # チャンネルの制限で待った回数
+            "global_waits": 0, # Bot全体の制限で待った回数
+            "total_latency_seconds": 0.0,
+            "max_latency_seconds": 0.0,
+        }
+
+    def enqueue(self, channel: discord.abc.Messageable, text: str, priority: int = PRIORITY_NORMAL) -> asyncio.Future:
+        """メッセージを送信キューに入れ、送信後に discord.Message (失敗・破棄なら None) が入る Future を返す"""
+        loop = asyncio.get_running_loop()
+        if self._global is None:
+            self._global = _PriorityLimiter(TokenBucket(self.global_rate, self.global_burst, loop.time()))
+        state = self._channels.get(channel.id)
+        if state is None:
+            state = _ChannelQueue(channel, TokenBucket(self.channel_rate, self.channel_burst, loop.time()))
+            self._channels[channel.id] = state
+        elif state.evict_timer is not None:
+            state.evict_timer.cancel(); state.evict_timer = None
+        state.channel = channel
+        future = loop.create_future()
+        state.pending.append(_PendingMessage(text, priority, future, loop.time()))
+        state.idle.clear()
+        self._stats["enqueued"] += 1
+        if state.task is None:
+            state.task = asyncio.create_task(self._drain(state), name=f"message-scheduler-{channel.id}")
+        return future
+
+    async def send(self, channel: discord.abc.Messageable, text: str, priority: int = PRIORITY_NORMAL) -> asyncio.Future:
+        """enqueue と同じだが、チャンネルの未送信が max_backlog を超えている間は待つ (送信完了は待たない)"""
+        future = self.enqueue(channel, text, priority)
+        state = self._channels.get(channel.id)
+        while state is not None and len(state.pending) > self.max_backlog:
+            await asyncio.shield(state.pending[0].future)
+        return future
+
+    async def flush(self, channel_id: int):
+        """チャンネルのキューが空になるまで待つ"""
+        state = self._channels.get(channel_id)
+        if state is not None:
+            await state.idle.wait()
+
+    def discard(self, channel_id: int) -> int:
+        """チャンネルの未送信メッセージを破棄し、破棄した件数を返す (送信中のものは止めない)"""
+        state = self._channels.get(channel_id)
+        if state is None:
+            return 0
+        discarded = len(state.pending)
+        for message in state.pending:
+            if not message.future.done(): message.future.set_result(None)
+        state.pending.clear()
+        self._stats["discarded"] += discarded
+        return discarded
+
+    def _take_batch(self, pending: Deque[_PendingMessage]) -> List[_PendingMessage]:
+        """先頭から、改行でつないで MESSAGE_MAX_LENGTH 以内に収まる分だけ取り出す"""
+        batch = [pending.popleft()]
+        length = len(batch[0].text)
+        while pending and length + 1 + len(pending[0].text) <= MESSAGE_MAX_LENGTH:
+            length += 1 + len(pending[0].text)
+            batch.append(pending.popleft())
+        return batch
+
+    async def _drain(self, state: _ChannelQueue):
+        """チャンネルのキューを順に送信する (キューが空になったら終了する)"""
+        loop = asyncio.get_running_loop()
+        try:
+            while state.pending:
+                if not state.bucket.take(loop.time()):
+                    self._stats["channel_waits"] += 1
+                    await asyncio.sleep(state.bucket.delay(loop.time()))
+                    continue
+                batch = self._take_batch(state.pending)
+                if await self._global.acquire(max(message.priority for message in batch)):
+                    self._stats["global_waits"] += 1
+                try:
+                    sent = await state.channel.send("\n".join(message.text for message in batch))
+                    self._stats["sent"] += 1
+                    self._stats["coalesced"] += len(batch) - 1
+                except Exception as e:
+                    logger.error(f"Failed to send message to channel {state.channel.id}: {e}", exc_info=True)
+                    sent = None
+                    self._stats["failed"] += len(batch)
+                now = loop.time()
+                for message in batch:
+                    latency = now - message.enqueued_at
+                    self._stats["total_latency_seconds"] += latency
+                    self._stats["max_latency_seconds"] = max(self._stats["max_latency_seconds"], latency)
+                    if not message.future.done(): message.future.set_result(sent)
+                if now - batch[0].enqueued_at > MESSAGE_SLOW_WARN_SECONDS:
+                    logger.warning(f"Message to channel {state.channel.id} waited {now - batch[0].enqueued_at:.1f}s in the send queue.")
+        finally:
+            state.task = None
+            if state.pending: # キャンセルなどで途中終了した
+                self.discard(state.channel.id)
+            state.idle.set()
+            # バケットは残しておく (次の enqueue で満杯から始めると、間隔を空けて送るだけでチャンネルの制限を超える)。
+            # 満杯まで回復して以前の送信の影響が無くなってから削除する
+            self._evict_when_full(state, loop)
+
+    def _evict_when_full(self, state: _ChannelQueue, loop: asyncio.AbstractEventLoop):
+        state.evict_timer = None
+        if self._channels.get(state.channel.id) is not state or state.task is not None or state.pending:
+            return # 送信を再開した
+        delay = state.bucket.full_delay(loop.time())
+        if delay <= 0:
+            del self._channels[state.channel.id]
+        else:
+            state.evict_timer = loop.call_later(delay, self._evict_when_full, state, loop)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """送信数・まとめた件数・キュー待ち時間などの統計を返す"""
+        stats = dict(self._stats)
+        stats["queue_depth"] = sum(len(state.pending) for state in self._channels.values())
+        stats["active_channels"] = sum(1 for state in self._channels.values() if state.task is not None)
+        stats["global_waiting"] = self._global.waiting if self._global is not None else 0
+        delivered = stats["sent"] + stats["coalesced"] + stats["failed"]
+        stats["avg_latency_seconds"] = stats["total_latency_seconds"] / delivered if delivered else 0.0
+        return stats
+
+
+# プロセス全体で共有する送信スケジューラ
+message_scheduler = MessageScheduler()
@@ -1,12 +1,25 @@
 from app import db # dbオブジェクトをapp.pyからインポート
 # from flask_login import UserMixin # UserMixinは不要になったので削除
-from datetime import datetime, timedelta
+from datetime import date, datetime, time, timedelta
 import logging
-from sqlalchemy import func
+import sqlite3 # SQLite の RETURNING 対応バージョン判定用
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import and_, func, inspect
 # from flask_sqlalchemy import SQLAlchemy # 不要になったので削除
 
 # db = SQLAlchemy() # 不要になったので削除
 
+def _native_upsert_insert():
+    """INSERT ... ON CONFLICT ... RETURNING が使えるDBなら、その方言の insert 関数を返す (非対応なら None)"""
+    dialect_name = db.engine.dialect.name
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        return dialect_insert
+    if dialect_name == 'sqlite' and sqlite3.sqlite_version_info >= (3, 35, 0): # RETURNING 対応版のみ
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        return dialect_insert
+    return None
+
 # UserモデルはDiscordボットに不要なため削除しました。
 # class User(UserMixin, db.Model):
 #     __tablename__ = 'user'
@@ -26,14 +39,17 @@ class PlayerPoints(db.Model):
     points = db.Column(db.Integer, default=0)
     total_games = db.Column(db.Integer, default=0)
     last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    display_name = db.Column(db.String(100)) # 最後に確認した表示名 (ランキング表示でAPIを叩かずに済むように保存)
+    name_updated_at = db.Column(db.DateTime) # display_name を最後に更新した日時
 
     __table_args__ = (
         db.UniqueConstraint('discord_id', 'guild_id', name='unique_player_guild'),
+        db.Index('ix_player_points_guild_points', 'guild_id', 'points'), # 累計ランキング (guild_id で絞り points 順)
     )
 
     @staticmethod
-    def add_points(discord_id: str, guild_id: str, points: int):
-        """プレイヤーにポイントを追加し、履歴も記録する"""
+    def add_points(discord_id: str, guild_id: str, points: int, display_name: Optional[str] = None):
+        """プレイヤーにポイントを追加し、履歴も記録する (display_name を渡すと表示名も同時に更新する)"""
         if not discord_id or not isinstance(discord_id, str):
             logging.error(f"Invalid discord_id provided: {discord_id}")
             raise ValueError(f"Invalid discord_id: {discord_id}")
@@ -48,40 +64,23 @@ class PlayerPoints(db.Model):
             raise ValueError(f"Invalid points value: {points}")
 
         try:
-            player = PlayerPoints.query.filter_by(
-                discord_id=discord_id,
-                guild_id=guild_id
-            ).first()
-
-            # ポイントを追加する際は必ずゲーム数を1増やす
-            new_total_games = 1
-            if player is None:
-                logging.info(f"Creating new player record for discord_id: {discord_id} in guild: {guild_id}")
-                player = PlayerPoints(
-                    discord_id=discord_id,
-                    guild_id=guild_id,
-                    points=points,
-                    total_games=new_total_games # 新規作成時は1
-                )
-                db.session.add(player)
-            else:
-                logging.info(f"Updating existing player record for discord_id: {discord_id} in guild: {guild_id}")
-                player.points += points
-                new_total_games = player.total_games + 1 # 既存プレイヤーは+1
-                player.total_games = new_total_games
-                player.last_updated = datetime.utcnow()
+            # ネイティブ UPSERT で累計を加算し、更新後の値をそのまま受け取る (ポイントを追加する際は必ずゲーム数を1増やす)
+            display_names = {discord_id: display_name} if display_name else None
+            totals = PlayerPoints._upsert_totals(guild_id, {discord_id: points}, datetime.utcnow(), display_names)
+            total_points, game_number = totals[discord_id]
+            PlayerPointDaily.add_daily_points(guild_id, {discord_id: points}, datetime.utcnow().date()) # 日別集計も同じトランザクションで更新
 
             # ポイント履歴を記録
             history = PlayerPointHistory(
                 discord_id=discord_id,
                 guild_id=guild_id,
                 points_earned=points,
-                total_points=player.points, # 更新後の累計ポイント
-                game_number=new_total_games # 何回目のゲームでの獲得か
+                total_points=total_points, # 更新後の累計ポイント
+                game_number=game_number # 何回目のゲームでの獲得か
             )
             db.session.add(history)
             db.session.commit()
-            logging.info(f"Successfully added {points} points to player {discord_id} in guild {guild_id}. New total: {player.points}")
+            logging.info(f"Successfully added {points} points to player {discord_id} in guild {guild_id}. New total: {total_points}")
 
         except Exception as e:
             db.session.rollback()
@@ -90,8 +89,143 @@ class PlayerPoints(db.Model):
             raise Exception(f"Error adding points for discord_id {discord_id} in guild {guild_id}: {str(e)}")
 
     @staticmethod
-    def get_rankings(guild_id: str, period: str = 'all', limit: int = 5):
-        """指定されたサーバーの指定された期間のランキングを取得する"""
+    def add_points_bulk(guild_id: str, points_by_id: Dict[str, int],
+                        display_names: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """複数プレイヤーのポイントを1トランザクションでまとめて追加し、履歴も記録する
+        display_names を渡すと表示名も同時に更新する。
+        戻り値は保存できなかった discord_id とエラー内容の辞書 (全件成功なら空)"""
+        if not guild_id or not isinstance(guild_id, str):
+            logging.error(f"Invalid guild_id provided: {guild_id}")
+            raise ValueError(f"Invalid guild_id: {guild_id}")
+
+        # 不正な行は事前に弾き、残りの行だけを保存する
+        errors: Dict[str, str] = {}
+        valid_points: Dict[str, int] = {}
+        for discord_id, points in points_by_id.items():
+            if not discord_id or not isinstance(discord_id, str):
+                logging.error(f"Invalid discord_id provided: {discord_id}")
+                errors[str(discord_id)] = f"Invalid discord_id: {discord_id}"
+            elif not isinstance(points, int):
+                logging.error(f"Invalid points value provided for {discord_id}: {points}")
+                errors[discord_id] = f"Invalid points value: {points}"
+            else:
+                valid_points[discord_id] = points
+
+        if not valid_points:
+            return errors
+
+        try:
+            now = datetime.utcnow()
+            totals = PlayerPoints._upsert_totals(guild_id, valid_points, now, display_names)
+            PlayerPointDaily.add_daily_points(guild_id, valid_points, now.date()) # 日別集計も同じトランザクションで更新
+            history_rows = [
+                PlayerPointHistory(
+                    discord_id=discord_id,
+                    guild_id=guild_id,
+                    points_earned=points,
+                    total_points=totals[discord_id][0], # 更新後の累計ポイント
+                    game_number=totals[discord_id][1] # 何回目のゲームでの獲得か
+                )
+                for discord_id, points in valid_points.items()
+            ]
+
+            # 履歴はまとめて INSERT し、コミットは1回だけ
+            db.session.add_all(history_rows)
+            db.session.commit()
+            logging.info(f"Successfully added points for {len(valid_points)} players in guild {guild_id} (bulk).")
+
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Bulk point save failed for guild {guild_id}, falling back to per-player saves: {str(e)}", exc_info=True)
+            # 1件の不正データでレース全体の結果を失わないよう、1件ずつ保存し直して失敗行を特定する
+            for discord_id, points in valid_points.items():
+                try:
+                    PlayerPoints.add_points(discord_id, guild_id, points, (display_names or {}).get(discord_id))
+                except Exception as row_err:
+                    errors[discord_id] = str(row_err)
+
+        return errors
+
+    @staticmethod
+    def _upsert_totals(guild_id: str, points_by_id: Dict[str, int], now: datetime,
+                       display_names: Optional[Dict[str, str]] = None) -> Dict[str, Tuple[int, int]]:
+        """累計ポイントとゲーム数を加算し、更新後の (points, total_games) を discord_id ごとに返す (コミットはしない)
+        display_names に含まれるプレイヤーは表示名と name_updated_at も更新する。
+
+        PostgreSQL と SQLite (3.35以降) では unique_player_guild 制約を使った
+        INSERT ... ON CONFLICT DO UPDATE ... RETURNING を1文で実行する。
+        加算はDB側で行うため、同じサーバーの複数チャンネルが同時に終了しても更新が失われない。"""
+        dialect_insert = _native_upsert_insert()
+        if dialect_insert is None:
+            logging.debug(f"Native upsert not available for dialect '{db.engine.dialect.name}'. Using read-modify-write.")
+            return PlayerPoints._read_modify_write_totals(guild_id, points_by_id, now, display_names)
+
+        display_names = display_names or {}
+        stmt = dialect_insert(PlayerPoints).values([
+            {
+                'discord_id': discord_id,
+                'guild_id': guild_id,
+                'points': points,
+                'total_games': 1, # 新規作成時は1
+                'last_updated': now,
+                'display_name': display_names.get(discord_id),
+                'name_updated_at': now if discord_id in display_names else None,
+            }
+            for discord_id, points in points_by_id.items()
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['discord_id', 'guild_id'], # unique_player_guild と同じ列
+            set_={
+                'points': func.coalesce(PlayerPoints.points, 0) + stmt.excluded.points,
+                'total_games': func.coalesce(PlayerPoints.total_games, 0) + 1,
+                'last_updated': stmt.excluded.last_updated,
+                # 表示名が渡されなかった行は既存の値を残す
+                'display_name': func.coalesce(stmt.excluded.display_name, PlayerPoints.display_name),
+                'name_updated_at': func.coalesce(stmt.excluded.name_updated_at, PlayerPoints.name_updated_at),
+            }
+        ).returning(PlayerPoints.discord_id, PlayerPoints.points, PlayerPoints.total_games)
+
+        rows = db.session.execute(stmt).all()
+        return {row.discord_id: (row.points, row.total_games) for row in rows}
+
+    @staticmethod
+    def _read_modify_write_totals(guild_id: str, points_by_id: Dict[str, int], now: datetime,
+                                  display_names: Optional[Dict[str, str]] = None) -> Dict[str, Tuple[int, int]]:
+        """ネイティブ UPSERT が使えないDB向けのフォールバック (IN 句1回で既存レコードを取得して更新)"""
+        existing = {
+            player.discord_id: player
+            for player in PlayerPoints.query.filter(
+                PlayerPoints.guild_id == guild_id,
+                PlayerPoints.discord_id.in_(list(points_by_id))
+            ).all()
+        }
+
+        totals: Dict[str, Tuple[int, int]] = {}
+        for discord_id, points in points_by_id.items():
+            player = existing.get(discord_id)
+            if player is None:
+                player = PlayerPoints(
+                    discord_id=discord_id,
+                    guild_id=guild_id,
+                    points=points,
+                    total_games=1 # 新規作成時は1
+                )
+                db.session.add(player)
+            else:
+                player.points = (player.points or 0) + points
+                player.total_games = (player.total_games or 0) + 1
+                player.last_updated = now
+            if display_names and discord_id in display_names:
+                player.display_name = display_names[discord_id]
+                player.name_updated_at = now
+            totals[discord_id] = (player.points, player.total_games)
+        return totals
+
+    @staticmethod
+    def get_rankings(guild_id: str, period: str = 'all', limit: int = 5, with_names: bool = False):
+        """指定されたサーバーの指定された期間のランキングを取得する
+        with_names=True の場合は保存済みの表示名も同じクエリで取得し、
+        [(discord_id, points, display_name, name_updated_at), ...] を返す"""
         try:
             if period not in ['weekly', 'monthly', 'all']:
                 logging.error(f"Invalid period value: {period}")
@@ -104,38 +238,61 @@ class PlayerPoints(db.Model):
             now = datetime.utcnow()
             rankings = [] # 結果リストを初期化
 
-            if period == 'weekly':
-                start_date = now - timedelta(days=7)
-                rankings = db.session.query(
-                    PlayerPointHistory.discord_id,
-                    func.sum(PlayerPointHistory.points_earned).label('total_points')
+            if period in ('weekly', 'monthly'):
+                # 直近7日/30日 (現在時刻から遡る移動期間) の合計
+                # 期間に丸ごと含まれる日は日別集計テーブルから、期間の始まりを含む最も古い日だけは履歴から集計する
+                # (生の履歴を毎回全件集計せず、1プレイヤーあたり最大7行/30行 + 1日分の履歴で済む)
+                days = 7 if period == 'weekly' else 30
+                start_date = now - timedelta(days=days)
+                start_day = start_date.date()
+                full_days = db.session.query(
+                    PlayerPointDaily.discord_id.label('discord_id'),
+                    PlayerPointDaily.points.label('points')
                 ).filter(
-                    PlayerPointHistory.timestamp >= start_date,
-                    PlayerPointHistory.guild_id == guild_id
-                ).group_by(
-                    PlayerPointHistory.discord_id
-                ).order_by(
-                    func.sum(PlayerPointHistory.points_earned).desc()
-                ).limit(limit).all()
-
-            elif period == 'monthly':
-                start_date = now - timedelta(days=30)
-                rankings = db.session.query(
-                    PlayerPointHistory.discord_id,
-                    func.sum(PlayerPointHistory.points_earned).label('total_points')
+                    PlayerPointDaily.guild_id == guild_id,
+                    PlayerPointDaily.day > start_day
+                )
+                partial_day = db.session.query(
+                    PlayerPointHistory.discord_id.label('discord_id'),
+                    PlayerPointHistory.points_earned.label('points')
                 ).filter(
+                    PlayerPointHistory.guild_id == guild_id,
                     PlayerPointHistory.timestamp >= start_date,
-                    PlayerPointHistory.guild_id == guild_id
+                    PlayerPointHistory.timestamp < datetime.combine(start_day + timedelta(days=1), time.min)
+                )
+                window = full_days.union_all(partial_day).subquery()
+                period_query = db.session.query(
+                    window.c.discord_id,
+                    func.sum(window.c.points).label('total_points')
                 ).group_by(
-                    PlayerPointHistory.discord_id
+                    window.c.discord_id
                 ).order_by(
-                    func.sum(PlayerPointHistory.points_earned).desc()
-                ).limit(limit).all()
+                    func.sum(window.c.points).desc()
+                ).limit(limit)
+
+                if with_names:
+                    # 上位だけを集計したサブクエリに表示名を結合する (1クエリ)
+                    top = period_query.subquery()
+                    rankings = db.session.query(
+                        top.c.discord_id,
+                        top.c.total_points,
+                        PlayerPoints.display_name,
+                        PlayerPoints.name_updated_at
+                    ).outerjoin(
+                        PlayerPoints,
+                        and_(PlayerPoints.guild_id == guild_id, PlayerPoints.discord_id == top.c.discord_id)
+                    ).order_by(
+                        top.c.total_points.desc()
+                    ).all()
+                else:
+                    rankings = period_query.all()
 
             else: # all
                 rankings = db.session.query(
                     PlayerPoints.discord_id,
-                    PlayerPoints.points.label('total_points')
+                    PlayerPoints.points.label('total_points'),
+                    PlayerPoints.display_name,
+                    PlayerPoints.name_updated_at
                 ).filter(
                     PlayerPoints.guild_id == guild_id
                 ).order_by(
@@ -143,6 +300,8 @@ class PlayerPoints(db.Model):
                 ).limit(limit).all()
 
             logging.info(f"Successfully retrieved {len(rankings)} {period} rankings for guild {guild_id}")
+            if with_names:
+                return [(r.discord_id, r.total_points, r.display_name, r.name_updated_at) for r in rankings]
             # 結果を [(discord_id, points), ...] の形式で返す
             return [(r.discord_id, r.total_points) for r in rankings]
 
@@ -150,6 +309,43 @@ class PlayerPoints(db.Model):
             logging.error(f"Error fetching {period} rankings for guild {guild_id}: {str(e)}", exc_info=True)
             return []
 
+    @staticmethod
+    def update_display_names(guild_id: str, display_names: Dict[str, str]) -> int:
+        """保存済みの表示名をまとめて更新する (ランキング表示時のバックグラウンド更新用)"""
+        if not display_names:
+            return 0
+        try:
+            now = datetime.utcnow()
+            players = PlayerPoints.query.filter(
+                PlayerPoints.guild_id == guild_id,
+                PlayerPoints.discord_id.in_(list(display_names))
+            ).all()
+            for player in players:
+                player.display_name = display_names[player.discord_id]
+                player.name_updated_at = now
+            db.session.commit()
+            return len(players)
+        except Exception:
+            db.session.rollback()
+            raise
+
+    @staticmethod
+    def reset_guild(guild_id: str) -> Dict[str, int]:
+        """指定されたサーバーのランキングデータ (累計・履歴) を全て削除する"""
+        if not guild_id or not isinstance(guild_id, str):
+            logging.error(f"Invalid guild_id provided: {guild_id}")
+            raise ValueError(f"Invalid guild_id: {guild_id}")
+        try:
+            deleted_points = PlayerPoints.query.filter_by(guild_id=guild_id).delete()
+            deleted_history = PlayerPointHistory.query.filter_by(guild_id=guild_id).delete()
+            deleted_daily = PlayerPointDaily.query.filter_by(guild_id=guild_id).delete()
+            db.session.commit()
+            logging.info(f"Deleted {deleted_points} points, {deleted_history} history records, {deleted_daily} daily rollups for guild {guild_id}.")
+            return {"points": deleted_points, "history": deleted_history, "daily": deleted_daily}
+        except Exception:
+            db.session.rollback()
+            raise
+
     # get_cpu_name 静的メソッドは削除しました。
 
 class PlayerPointHistory(db.Model):
@@ -163,5 +359,241 @@ class PlayerPointHistory(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     game_number = db.Column(db.Integer) # 何回目のゲームでのポイント獲得か (追加)
 
+    __table_args__ = (
+        # 週間・月間ランキング用のカバリングインデックス (guild_id + 期間で絞り、discord_id ごとに集計)
+        db.Index('ix_point_history_guild_time', 'guild_id', 'timestamp', 'discord_id', 'points_earned'),
+    )
+
+    def __repr__(self):
+        return f'<PlayerPointHistory G:{self.guild_id} P:{self.discord_id} earned:{self.points_earned} total:{self.total_points} time:{self.timestamp}>'
+
+
+class PlayerPointDaily(db.Model):
+    """サーバー・日・プレイヤーごとの獲得ポイント集計 (週間・月間ランキング用のロールアップ)"""
+    __tablename__ = 'player_point_daily'
+    # 主キーの並びは guild_id + 期間での範囲検索に合わせている
+    guild_id = db.Column(db.String(20), primary_key=True)
+    day = db.Column(db.Date, primary_key=True) # UTC の日付
+    discord_id = db.Column(db.String(20), primary_key=True)
+    points = db.Column(db.Integer, nullable=False, default=0) # その日の獲得ポイント合計
+    games = db.Column(db.Integer, nullable=False, default=0) # その日のゲーム数
+
+    @staticmethod
+    def add_daily_points(guild_id: str, points_by_id: Dict[str, int], day: date):
+        """日別集計にポイントを加算する (コミットは呼び出し元のトランザクションで行う)"""
+        dialect_insert = _native_upsert_insert()
+        if dialect_insert is not None:
+            stmt = dialect_insert(PlayerPointDaily).values([
+                {'guild_id': guild_id, 'day': day, 'discord_id': discord_id, 'points': points, 'games': 1}
+                for discord_id, points in points_by_id.items()
+            ])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['guild_id', 'day', 'discord_id'],
+                set_={
+                    'points': PlayerPointDaily.points + stmt.excluded.points,
+                    'games': PlayerPointDaily.games + 1,
+                }
+            )
+            db.session.execute(stmt)
+            return
+
+        existing = {
+            row.discord_id: row
+            for row in PlayerPointDaily.query.filter(
+                PlayerPointDaily.guild_id == guild_id,
+                PlayerPointDaily.day == day,
+                PlayerPointDaily.discord_id.in_(list(points_by_id))
+            ).all()
+        }
+        for discord_id, points in points_by_id.items():
+            row = existing.get(discord_id)
+            if row is None:
+                db.session.add(PlayerPointDaily(guild_id=guild_id, day=day, discord_id=discord_id, points=points, games=1))
+            else:
+                row.points += points
+                row.games += 1
+
+    @staticmethod
+    def _history_aggregate_query(guild_id: Optional[str] = None):
+        """履歴を (guild_id, 日付, discord_id) ごとに集計するクエリ"""
+        history_day = func.date(PlayerPointHistory.timestamp)
+        query = db.session.query(
+            PlayerPointHistory.guild_id,
+            history_day.label('day'),
+            PlayerPointHistory.discord_id,
+            func.sum(PlayerPointHistory.points_earned).label('points'),
+            func.count(PlayerPointHistory.id).label('games')
+        )
+        if guild_id:
+            query = query.filter(PlayerPointHistory.guild_id == guild_id)
+        return query.group_by(PlayerPointHistory.guild_id, history_day, PlayerPointHistory.discord_id)
+
+    @staticmethod
+    def rebuild(guild_id: Optional[str] = None) -> int:
+        """既存の PlayerPointHistory から日別集計を作り直す (guild_id 省略時は全サーバー)"""
+        try:
+            delete_query = PlayerPointDaily.query
+            if guild_id:
+                delete_query = delete_query.filter_by(guild_id=guild_id)
+            delete_query.delete()
+            aggregate = PlayerPointDaily._history_aggregate_query(guild_id).subquery()
+            result = db.session.execute(
+                PlayerPointDaily.__table__.insert().from_select(
+                    ['guild_id', 'day', 'discord_id', 'points', 'games'],
+                    db.select(aggregate.c.guild_id, aggregate.c.day, aggregate.c.discord_id, aggregate.c.points, aggregate.c.games)
+                )
+            )
+            db.session.commit()
+            logging.info(f"Rebuilt {result.rowcount} daily rollup rows (guild: {guild_id or 'all'}).")
+            return result.rowcount
+        except Exception:
+            db.session.rollback()
+            raise
+
+    @staticmethod
+    def check_consistency(guild_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """日別集計と履歴の集計結果を比較し、食い違っている行のリストを返す (一致していれば空)"""
+        expected = {
+            (row.guild_id, str(row.day), row.discord_id): (int(row.points), int(row.games))
+            for row in PlayerPointDaily._history_aggregate_query(guild_id).all()
+        }
+        rollup_query = PlayerPointDaily.query
+        if guild_id:
+            rollup_query = rollup_query.filter_by(guild_id=guild_id)
+        actual = {
+            (row.guild_id, row.day.isoformat(), row.discord_id): (row.points, row.games)
+            for row in rollup_query.all()
+        }
+
+        mismatches = []
+        for key in sorted(set(expected) | set(actual)):
+            if expected.get(key) != actual.get(key):
+                mismatches.append({
+                    'guild_id': key[0], 'day': key[1], 'discord_id': key[2],
+                    'expected': expected.get(key), 'actual': actual.get(key),
+                })
+        if mismatches:
+            logging.warning(f"Found {len(mismatches)} inconsistent daily rollup rows (guild: {guild_id or 'all'}).")
+        return mismatches
+
+    def __repr__(self):
+        return f'<PlayerPointDaily G:{self.guild_id} P:{self.discord_id} day:{self.day} points:{self.points} games:{self.games}>'
+
+
+class GuildSettings(db.Model):
+    """サーバーごとの設定 (レースの実況ペースなど)"""
+    __tablename__ = 'guild_settings'
+    guild_id = db.Column(db.String(20), primary_key=True)
+    pacing_profile = db.Column(db.String(20)) # 実況ペースのプロファイル名 (None = 既定)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @staticmethod
+    def get_pacing_profile(guild_id: str) -> Optional[str]:
+        """サーバーの実況ペース設定を返す (未設定なら None)"""
+        settings = db.session.get(GuildSettings, guild_id)
+        return settings.pacing_profile if settings is not None else None
+
+    @staticmethod
+    def set_pacing_profile(guild_id: str, profile: Optional[str]):
+        """サーバーの実況ペース設定を保存する (None で既定に戻す)"""
+        try:
+            settings = db.session.get(GuildSettings, guild_id)
+            if settings is None:
+                settings = GuildSettings(guild_id=guild_id)
+                db.session.add(settings)
+            settings.pacing_profile = profile
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
     def __repr__(self):
-        return f'<PlayerPointHistory G:{self.guild_id} P:{self.discord_id} earned:{self.points_earned} total:{self.total_points} time:{self.timestamp}>'
\ No newline at end of file
+        return f'<GuildSettings G:{self.guild_id} pacing:{self.pacing_profile}>'
+
+
+class RaceCheckpoint(db.Model):
+    """進行中のレースのチェックポイント (Bot の再起動後にレースを再開・集計するため。チャンネルごとに最新の1件)"""
+    __tablename__ = 'race_checkpoints'
+    channel_id = db.Column(db.String(20), primary_key=True)
+    guild_id = db.Column(db.String(20), nullable=False, index=True)
+    phase = db.Column(db.String(10), nullable=False) # 'recruiting' / 'running' / 'playback' (race_checkpoint.py)
+    position = db.Column(db.Integer, nullable=False, default=0) # 'playback' の再生位置
+    data = db.Column(db.LargeBinary, nullable=False) # 圧縮したゲーム状態
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @staticmethod
+    def apply_batch(changes: Dict[str, Optional[Tuple[str, str, int, bytes]]]) -> int:
+        """チャンネルごとの最新の状態 (guild_id, phase, position, data) をまとめて保存し、None のチャンネルは削除する
+        (1トランザクションで反映し、反映した件数を返す)"""
+        if not changes:
+            return 0
+        try:
+            deleted = [channel_id for channel_id, change in changes.items() if change is None]
+            if deleted:
+                RaceCheckpoint.query.filter(RaceCheckpoint.channel_id.in_(deleted)).delete(synchronize_session=False)
+            saved = {channel_id: change for channel_id, change in changes.items() if change is not None}
+            if saved:
+                existing = {row.channel_id: row for row in RaceCheckpoint.query.filter(RaceCheckpoint.channel_id.in_(list(saved))).all()}
+                now = datetime.utcnow()
+                for channel_id, (guild_id, phase, position, data) in saved.items():
+                    row = existing.get(channel_id)
+                    if row is None:
+                        row = RaceCheckpoint(channel_id=channel_id)
+                        db.session.add(row)
+                    row.guild_id = guild_id
+                    row.phase = phase
+                    row.position = position
+                    row.data = data
+                    row.updated_at = now
+            db.session.commit()
+            return len(changes)
+        except Exception:
+            db.session.rollback()
+            raise
+
+    @staticmethod
+    def load_for_guilds(guild_ids: List[str]) -> List[Tuple[str, str, str, int, bytes, Optional[datetime]]]:
+        """指定サーバーのチェックポイントを (channel_id, guild_id, phase, position, data, updated_at) のリストで返す"""
+        if not guild_ids:
+            return []
+        rows = RaceCheckpoint.query.filter(RaceCheckpoint.guild_id.in_(guild_ids)).all()
+        return [(row.channel_id, row.guild_id, row.phase, row.position, row.data, row.updated_at) for row in rows]
+
+    def __repr__(self):
+        return f'<RaceCheckpoint C:{self.channel_id} G:{self.guild_id} phase:{self.phase} pos:{self.position}>'
+
+
+def ensure_columns():
+    """既存テーブルに後から追加した列 (表示名など) が無ければ ALTER TABLE で追加する
+    (db.create_all は既存テーブルの列を変更しないため)"""
+    inspector = inspect(db.engine)
+    for model in (PlayerPoints, PlayerPointHistory, PlayerPointDaily, GuildSettings, RaceCheckpoint):
+        table = model.__table__
+        if not inspector.has_table(table.name):
+            continue
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            with db.engine.begin() as conn:
+                conn.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            logging.info(f"Added missing column {table.name}.{column.name} ({column_type}).")
+
+
+def ensure_indexes():
+    """既存DBに不足しているインデックスを作成する
+    (db.create_all は既存テーブルにインデックスを追加しないため、起動時に毎回確認する)"""
+    for model in (PlayerPoints, PlayerPointHistory, PlayerPointDaily):
+        for index in model.__table__.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+    logging.info("Database indexes checked/created successfully.")
+
+
+def ensure_rollups():
+    """日別集計テーブルが空で履歴だけが存在する場合 (導入直後の既存DB) に集計を作成する"""
+    needs_backfill = PlayerPointDaily.query.first() is None and PlayerPointHistory.query.first() is not None
+    db.session.commit() # 確認用の読み取りトランザクションを閉じる
+    if needs_backfill:
+        logging.info("Daily rollup table is empty. Backfilling from point history...")
+        PlayerPointDaily.rebuild()
@@ -0,0 +1,83 @@
+import os
+import math
+import logging
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from race_script import ScriptLine
+
+logger = logging.getLogger(__name__)
+
+# --- 実況ペースの設定 ---
+PACING_DEFAULT_PROFILE = os.environ.get("PACING_DEFAULT_PROFILE", "standard") # サーバーで未設定のときのプロファイル
+PACING_BUSY_RACES = int(os.environ.get("PACING_BUSY_RACES", "10")) # 同時進行レースがこれを超えたら待ち時間を縮める
+PACING_LARGE_FIELD = int(os.environ.get("PACING_LARGE_FIELD", "50")) # 参加者 (CPU含む) がこれを超えたら待ち時間を縮める
+PACING_MIN_SCALE = float(os.environ.get("PACING_MIN_SCALE", "0.3")) # 自動圧縮で縮める下限 (倍率)
+
+
+class PacingProfile(NamedTuple):
+    """実況メッセージの送信間隔の設定"""
+    name: str
+    label: str
+    delays: Dict[str, float] # ScriptLine.kind -> 送信後の待ち秒数 (未指定の種類は台本の待ち時間 × scale)
+    scale: float
+    target_seconds: float # レース全体の待ち時間の合計の目安 (0 = 制限なし)
+
+
+PACING_PROFILES: Dict[str, PacingProfile] = {profile.name: profile for profile in (
+    PacingProfile('standard', "標準 (じっくり実況)", {}, 1.0, 0),
+    PacingProfile('fast', "速め", {
+        'announce': 2, 'lap': 1, 'revolution': 2, 'revival': 1, 'accident': 1, 'duel': 1.5,
+        'overtakes': 1.5, 'skills': 1.5, 'quiet': 1, 'summary': 2,
+    }, 1.0, 180),
+    PacingProfile('turbo', "超速 (混雑したサーバー向け)", {
+        'announce': 1, 'lap': 0.5, 'revolution': 1, 'revival': 0.5, 'accident': 0.5, 'duel': 1,
+        'overtakes': 0.75, 'skills': 0.75, 'quiet': 0.5, 'summary': 1,
+    }, 1.0, 60),
+)}
+
+
+def get_profile(name: Optional[str]) -> PacingProfile:
+    """名前からプロファイルを返す (未設定・不明なら既定のプロファイル)"""
+    profile = PACING_PROFILES.get(name or PACING_DEFAULT_PROFILE)
+    if profile is None:
+        if name: logger.warning(f"Unknown pacing profile '{name}'. Using default.")
+        profile = PACING_PROFILES.get(PACING_DEFAULT_PROFILE, PACING_PROFILES['standard'])
+    return profile
+
+
+def load_compression(live_races: int, players: int) -> float:
+    """同時進行レース数と参加者数に応じた待ち時間の倍率 (1.0 = 縮めない)"""
+    scale = 1.0
+    if live_races > PACING_BUSY_RACES:
+        scale *= PACING_BUSY_RACES / live_races
+    if players > PACING_LARGE_FIELD:
+        scale *= math.sqrt(PACING_LARGE_FIELD / players)
+    return max(PACING_MIN_SCALE, min(1.0, scale))
+
+
+class Pacer:
+    """1レース分の実況メッセージの待ち時間を決める
+
+    待ち時間 0 の行 (見出しなど、次の行と続けて出すもの) は 0 のまま。
+    それ以外は プロファイルの種類別の待ち時間 × 混雑度による圧縮 とし、
+    事前計算したレースはさらに合計が target_seconds に収まるように全体を縮める。"""
+
+    def __init__(self, profile: PacingProfile, live_races: int = 1, players: int = 0):
+        self.profile = profile
+        self.compression = load_compression(live_races, players)
+
+    def delay(self, line: ScriptLine) -> float:
+        if line.delay <= 0:
+            return 0.0
+        delay = self.profile.delays.get(line.kind)
+        if delay is None:
+            delay = line.delay * self.profile.scale
+        return delay * self.compression
+
+    def retime(self, lines: Sequence[ScriptLine]) -> List[ScriptLine]:
+        """レース全体の待ち時間を付け直した実況メッセージを返す"""
+        delays = [self.delay(line) for line in lines]
+        total = sum(delays)
+        target = self.profile.target_seconds
+        factor = target / total if target and total > target else 1.0
+        return [line._replace(delay=delay * factor) for line, delay in zip(lines, delays)]
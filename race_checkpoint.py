@@ -0,0 +1,174 @@
+import os
+import json
+import zlib
+import asyncio
+import logging
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+from game_logic import GameState
+from race_events import RaceEvents
+
+logger = logging.getLogger(__name__)
+
+# --- レースのチェックポイント設定 ---
+RACE_CHECKPOINT_ENABLED = os.getenv('RACE_CHECKPOINT_ENABLED', 'True') == 'True' # 進行中のレースを保存し、再起動後に再開する
+RACE_CHECKPOINT_INTERVAL_SECONDS = float(os.environ.get("RACE_CHECKPOINT_INTERVAL_SECONDS", "2.0")) # 溜まった書き込みをDBへまとめて送る間隔
+RACE_CHECKPOINT_RESUME_MAX_AGE_SECONDS = float(os.environ.get("RACE_CHECKPOINT_RESUME_MAX_AGE_SECONDS", "900")) # これより古いレースは再開せず結果だけ出す
+
+CHECKPOINT_FORMAT_VERSION = 1
+
+# レースの段階 (RaceCheckpoint.phase)
+PHASE_RECRUITING = 'recruiting' # 参加受付中 (参加者が揃う前のゲーム状態)
+PHASE_RUNNING = 'running' # 逐次進行中 (最後に終わったラップの区切りのゲーム状態)
+PHASE_PLAYBACK = 'playback' # 事前計算済みで再生中 (ポイント保存済み。計算開始時のゲーム状態 + 再生位置)
+
+CheckpointRow = Tuple[str, str, int, bytes] # (guild_id, phase, position, data)
+CheckpointData = Union[bytes, Callable[[], bytes]] # 関数なら書き込む直前に呼んでデータを作る
+
+
+def encode_checkpoint(game: GameState, course_name: str) -> bytes:
+    """ゲーム状態とコース名を圧縮した JSON にする"""
+    payload = {"v": CHECKPOINT_FORMAT_VERSION, "course": course_name, "game": game.to_checkpoint()}
+    return zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def restore_game(data: bytes, guild_id: str, points_saver: Optional[Callable[..., Any]] = None) -> Tuple[GameState, str]:
+    """encode_checkpoint のデータから (ゲーム状態, コース名) を復元する"""
+    payload = json.loads(zlib.decompress(data).decode('utf-8'))
+    if payload.get("v") != CHECKPOINT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported checkpoint format version: {payload.get('v')}")
+    game = GameState.from_checkpoint(payload["game"], guild_id, RaceEvents(), points_saver=points_saver)
+    return game, payload["course"]
+
+
+class CheckpointWriter:
+    """チェックポイントの書き込みをまとめてDBへ送るクラス
+
+    put / remove はイベントループ上ですぐに返り、チャンネルごとに最新の状態だけを残しておく
+    (ラップごとに上書きされる古い状態はDBまで送らない)。
+    interval 秒ごとに溜まった分を1回のDB処理 (1トランザクション) としてDBスレッドプールに投入する。
+    書き込みは常に1つずつ順に行い、古い状態が新しい状態や削除を後から上書きしないようにする。
+    urgent=True なら待たずに書き込む (レースの段階が変わったときなど)。
+    data に関数を渡すと書き込む直前に1回だけ呼ぶので、頻繁に変わる状態 (参加受付中など) の変換も間引ける。"""
+
+    def __init__(self, interval: float = RACE_CHECKPOINT_INTERVAL_SECONDS,
+                 submit: Optional[Callable[[Dict[str, Optional[CheckpointRow]]], Future]] = None):
+        self.interval = interval
+        self._submit = submit # None なら db_executor.submit_checkpoints (DBを使わない用途で app を読み込まないよう遅延インポート)
+        self._pending: Dict[str, Optional[Tuple[str, str, int, CheckpointData]]] = {} # channel_id -> 最新の状態 (None = 削除)
+        self._inflight: Optional[Future] = None # 実行中の書き込み
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._stats: Dict[str, int] = {
+            "puts": 0,
+            "removes": 0,
+            "coalesced": 0, # DBへ送る前に新しい状態で上書きされた数
+            "batches": 0,
+            "rows_written": 0,
+            "failed_batches": 0,
+            "max_batch_rows": 0,
+        }
+
+    def put(self, channel_id: int, guild_id: str, phase: str, data: CheckpointData, position: int = 0, urgent: bool = False):
+        """チャンネルのチェックポイントを更新する (書き込みは後でまとめて行う)"""
+        self._stats["puts"] += 1
+        self._set(str(channel_id), (str(guild_id), phase, position, data), urgent)
+
+    def remove(self, channel_id: int, urgent: bool = False):
+        """チャンネルのチェックポイントを削除する (レース終了時)"""
+        self._stats["removes"] += 1
+        self._set(str(channel_id), None, urgent)
+
+    def _set(self, key: str, row: Optional[Tuple[str, str, int, CheckpointData]], urgent: bool):
+        if key in self._pending: self._stats["coalesced"] += 1
+        self._pending[key] = row
+        if self._wake is None: self._wake = asyncio.Event()
+        if urgent: self._wake.set()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        try:
+            while self._pending:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.interval) # この間の更新はまとめて1回で書く
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                await self._write_pending()
+        finally:
+            self._task = None
+
+    def _take_batch(self) -> Dict[str, Optional[CheckpointRow]]:
+        """溜まった更新を取り出し、遅延したデータを作る"""
+        batch: Dict[str, Optional[CheckpointRow]] = {}
+        pending, self._pending = self._pending, {}
+        for key, row in pending.items():
+            if row is not None and callable(row[3]):
+                try:
+                    row = row[:3] + (row[3](),)
+                except Exception as e:
+                    logger.error(f"Failed to encode race checkpoint for channel {key}: {e}", exc_info=True)
+                    continue
+            batch[key] = row
+        return batch
+
+    def _submit_batch(self, batch: Dict[str, Optional[CheckpointRow]]) -> Future:
+        submit = self._submit
+        if submit is None:
+            import db_executor
+            submit = db_executor.submit_checkpoints
+        self._stats["batches"] += 1
+        self._stats["max_batch_rows"] = max(self._stats["max_batch_rows"], len(batch))
+        self._inflight = submit(batch)
+        return self._inflight
+
+    def _requeue(self, batch: Dict[str, Optional[CheckpointRow]], error: Exception):
+        """失敗した書き込みを、その後に更新されていないチャンネルの分だけ次回に回す"""
+        self._stats["failed_batches"] += 1
+        logger.error(f"Failed to write {len(batch)} race checkpoints: {error}", exc_info=True)
+        for key, row in batch.items():
+            self._pending.setdefault(key, row)
+
+    async def _write_pending(self):
+        batch = self._take_batch()
+        if not batch: return
+        try:
+            await asyncio.wrap_future(self._submit_batch(batch))
+            self._stats["rows_written"] += len(batch)
+        except asyncio.CancelledError: # 終了時。flush_sync で書き直せるように戻しておく
+            for key, row in batch.items(): self._pending.setdefault(key, row)
+            raise
+        except Exception as e:
+            self._requeue(batch, e)
+
+    async def flush(self):
+        """溜まっている書き込みをすぐに反映し、完了を待つ"""
+        if self._task is not None:
+            self._wake.set()
+            await asyncio.shield(self._task)
+
+    def flush_sync(self, timeout: float = 10.0):
+        """イベントループの終了後に、残った書き込みを同期的に反映する (Bot の終了時)"""
+        try:
+            if self._inflight is not None: self._inflight.result(timeout) # 中断された書き込みを先に終わらせる
+        except Exception as e:
+            logger.error(f"Race checkpoint write failed during shutdown: {e}")
+        batch = self._take_batch()
+        if not batch: return
+        try:
+            self._submit_batch(batch).result(timeout)
+            self._stats["rows_written"] += len(batch)
+            logger.info(f"Wrote {len(batch)} race checkpoints on shutdown.")
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} race checkpoints on shutdown: {e}", exc_info=True)
+
+    def get_stats(self) -> Dict[str, int]:
+        stats = dict(self._stats)
+        stats["pending"] = len(self._pending)
+        return stats
+
+
+# プロセス全体で共有するチェックポイントの書き込み係
+checkpoint_writer = CheckpointWriter()
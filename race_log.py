@@ -0,0 +1,333 @@
+"""レースログ (1レース = 1レコードの長さ付きバイナリ) の記録とオフライン再生
+
+    python -m race_log list [--path race_log.bin]
+    python -m race_log replay --index -1 [--path race_log.bin]
+
+レース終了時に、シード・参加者と作戦・ラップごとの脱落/復活/出来事・結果を
+1レコードにまとめてローテーション付きのファイルに追記する。
+プレイヤーは参加順の番号 (seat) で参照するので、1レースは数百バイト程度に収まる。
+replay はシードと参加者から GameState を作り直してラップごとに進め、記録と一致するか確認する。
+
+レコードの形式 (すべてリトルエンディアン):
+    uint32 ペイロード長, ペイロード
+    ペイロード = version(u8) seed(u64) started_at(f64) guild_id(str) channel_id(i64) course(str) vector_lap_min_players(u32)
+                 参加者数(u16) [id(i64) strategy(u8) is_bot(u8) name(str)]...
+                 ラップ数(u16) [lap(u16) events(u8) 脱落数(u16) seat(u16)... 復活数(u16) seat(u16)...]...
+                 winner(u16) second_place(u16) great_comeback(u8) 大逆転の敗者数(u16) seat(u16)...
+    str = 長さ(u16) + UTF-8, seat = 参加順の番号 (winner / second_place の 0xFFFF = なし)
+"""
+import os
+import sys
+import time
+import struct
+import logging
+import argparse
+import threading
+from datetime import datetime
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+from game_logic import (GameState, Player, LAP_EVENT_REVOLUTION, LAP_EVENT_FORCED_ELIMINATION,
+                        LAP_EVENT_FINAL_DUEL, LAP_EVENT_GREAT_COMEBACK)
+from race_events import RaceEvents, RaceCourse
+from race_script import build_race_script
+
+logger = logging.getLogger(__name__)
+
+# --- レースログ設定 ---
+RACE_LOG_ENABLED = os.getenv('RACE_LOG_ENABLED', 'True') == 'True'
+RACE_LOG_PATH = os.getenv('RACE_LOG_PATH', 'race_log.bin')
+RACE_LOG_MAX_BYTES = int(os.getenv('RACE_LOG_MAX_BYTES', str(10 * 1024 * 1024))) # これを超えたらローテーション
+RACE_LOG_BACKUP_COUNT = int(os.getenv('RACE_LOG_BACKUP_COUNT', '5')) # 残す古いファイル数 (race_log.bin.1 ...)
+
+RACE_LOG_FORMAT_VERSION = 1
+_LENGTH = struct.Struct('<I')
+_NO_SEAT = 0xFFFF # winner / second_place が無いとき (参加者数は u16 なので seat は最大 0xFFFE)
+_HEADER = struct.Struct('<BQd')
+_EVENT_NAMES = ((LAP_EVENT_REVOLUTION, "革命"), (LAP_EVENT_FORCED_ELIMINATION, "強制脱落"),
+                (LAP_EVENT_FINAL_DUEL, "一騎打ち"), (LAP_EVENT_GREAT_COMEBACK, "大逆転"))
+
+
+class JoinRecord(NamedTuple):
+    id: int
+    strategy: Optional[str]
+    is_bot: bool
+    name: str
+
+
+class LapRecord(NamedTuple):
+    lap: int
+    events: int # LAP_EVENT_* の OR
+    eliminated: Tuple[int, ...] # 脱落した seat (脱落順)
+    revived: Tuple[int, ...] # 復活した seat (復活順)
+
+
+class RaceRecord(NamedTuple):
+    seed: int
+    started_at: float
+    guild_id: str
+    channel_id: int
+    course_name: str
+    vector_lap_min_players: int
+    joins: List[JoinRecord] # 参加順 (CPU → 人間)
+    laps: List[LapRecord]
+    winner: Optional[int] # seat
+    second_place: Optional[int]
+    great_comeback: bool
+    great_comeback_losers: Tuple[int, ...]
+
+
+# --- エンコード / デコード ---
+def _strategy_code(strategy: Optional[str]) -> int:
+    return GameState.STRATEGIES.index(strategy) + 1 if strategy in GameState.STRATEGIES else 0
+
+def _strategy_name(code: int) -> Optional[str]:
+    return GameState.STRATEGIES[code - 1] if 0 < code <= len(GameState.STRATEGIES) else None
+
+def _pack_str(buf: bytearray, value: str):
+    data = value.encode('utf-8')[:0xFFFF]
+    buf += struct.pack('<H', len(data)); buf += data
+
+def _pack_seats(buf: bytearray, seats: Tuple[int, ...]):
+    buf += struct.pack(f'<H{len(seats)}H', len(seats), *seats)
+
+def encode_race(record: RaceRecord) -> bytes:
+    """RaceRecord をペイロード (長さ無し) に変換する"""
+    buf = bytearray(_HEADER.pack(RACE_LOG_FORMAT_VERSION, record.seed, record.started_at))
+    _pack_str(buf, record.guild_id)
+    buf += struct.pack('<q', record.channel_id)
+    _pack_str(buf, record.course_name)
+    buf += struct.pack('<IH', min(record.vector_lap_min_players, 0xFFFFFFFF), len(record.joins))
+    for join in record.joins:
+        buf += struct.pack('<qBB', join.id, _strategy_code(join.strategy), 1 if join.is_bot else 0)
+        _pack_str(buf, join.name)
+    buf += struct.pack('<H', len(record.laps))
+    for lap in record.laps:
+        buf += struct.pack('<HB', lap.lap, lap.events)
+        _pack_seats(buf, lap.eliminated); _pack_seats(buf, lap.revived)
+    buf += struct.pack('<HHB', _NO_SEAT if record.winner is None else record.winner,
+                       _NO_SEAT if record.second_place is None else record.second_place, 1 if record.great_comeback else 0)
+    _pack_seats(buf, record.great_comeback_losers)
+    return bytes(buf)
+
+
+class _Reader:
+    """ペイロードを先頭から順に読むための小さなヘルパー"""
+    def __init__(self, data: bytes):
+        self.data = memoryview(data); self.offset = 0
+
+    def unpack(self, fmt: str) -> tuple:
+        values = struct.unpack_from(fmt, self.data, self.offset); self.offset += struct.calcsize(fmt)
+        return values
+
+    def string(self) -> str:
+        (length,) = self.unpack('<H')
+        value = bytes(self.data[self.offset:self.offset + length]).decode('utf-8', errors='replace'); self.offset += length
+        return value
+
+    def seats(self) -> Tuple[int, ...]:
+        (count,) = self.unpack('<H')
+        return self.unpack(f'<{count}H')
+
+def decode_race(payload: bytes) -> RaceRecord:
+    """ペイロードを RaceRecord に戻す"""
+    reader = _Reader(payload)
+    version, seed, started_at = reader.unpack(_HEADER.format)
+    if version != RACE_LOG_FORMAT_VERSION:
+        raise ValueError(f"Unsupported race log version: {version}")
+    guild_id = reader.string()
+    (channel_id,) = reader.unpack('<q')
+    course_name = reader.string()
+    vector_lap_min_players, join_count = reader.unpack('<IH')
+    joins = []
+    for _ in range(join_count):
+        player_id, strategy_code, is_bot = reader.unpack('<qBB')
+        joins.append(JoinRecord(player_id, _strategy_name(strategy_code), bool(is_bot), reader.string()))
+    (lap_count,) = reader.unpack('<H')
+    laps = []
+    for _ in range(lap_count):
+        lap, events = reader.unpack('<HB')
+        laps.append(LapRecord(lap, events, reader.seats(), reader.seats()))
+    winner, second_place, great_comeback = reader.unpack('<HHB')
+    return RaceRecord(seed, started_at, guild_id, channel_id, course_name, vector_lap_min_players, joins, laps,
+                      None if winner == _NO_SEAT else winner, None if second_place == _NO_SEAT else second_place,
+                      bool(great_comeback), reader.seats())
+
+
+# --- 記録 ---
+class RaceLogWriter:
+    """長さ付きレコードをファイルに追記する (サイズ上限でローテーション、スレッドセーフ)"""
+
+    def __init__(self, path: str = RACE_LOG_PATH, max_bytes: int = RACE_LOG_MAX_BYTES, backup_count: int = RACE_LOG_BACKUP_COUNT):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = max(0, backup_count)
+        self._lock = threading.Lock()
+
+    def append(self, payload: bytes):
+        data = _LENGTH.pack(len(payload)) + payload
+        with self._lock:
+            try:
+                size = os.path.getsize(self.path)
+            except FileNotFoundError:
+                size = 0
+            if self.max_bytes > 0 and size and size + len(data) > self.max_bytes:
+                self._rotate()
+            with open(self.path, 'ab') as f:
+                f.write(data)
+
+    def _rotate(self):
+        """race_log.bin -> race_log.bin.1 -> ... と1つずつずらし、一番古いものを捨てる"""
+        if self.backup_count == 0:
+            os.remove(self.path); return
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source): os.replace(source, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+
+class RaceRecorder:
+    """1レース分の出来事をメモリに貯め、終了時に1レコードとして書き出す
+
+    GameState.recorder に設定すると、reset_lap_usage() のたびに前のラップが記録される。"""
+
+    def __init__(self, game: GameState, channel_id: int, course_name: str, writer: Optional[RaceLogWriter] = None):
+        self.writer = writer
+        self.channel_id = channel_id
+        self.course_name = course_name
+        self.started_at = time.time()
+        self._seat_by_id = {player.id: seat for seat, player in enumerate(game.initial_players)}
+        self._joins = [JoinRecord(p.id, p.strategy, p.is_bot, p.name) for p in game.initial_players]
+        self._laps: List[LapRecord] = []
+        self._finished = False
+
+    def _seats(self, players: List[Player]) -> Tuple[int, ...]:
+        return tuple(self._seat_by_id[player.id] for player in players)
+
+    def record_lap(self, game: GameState):
+        if game.current_lap <= 0 or (self._laps and self._laps[-1].lap >= game.current_lap):
+            return # 未開始または記録済み
+        self._laps.append(LapRecord(game.current_lap, game.lap_events,
+                                    self._seats(game.eliminated_this_lap), self._seats(game.revived_this_lap)))
+
+    def finish(self, game: GameState) -> Optional[RaceRecord]:
+        """最後のラップと結果を記録し、writer があればファイルに追記する (2回目以降は何もしない)"""
+        if self._finished: return None
+        self._finished = True
+        self.record_lap(game)
+        seat_of = lambda player: None if player is None else self._seat_by_id.get(player.id)
+        record = RaceRecord(game.seed, self.started_at, game.guild_id, self.channel_id, self.course_name,
+                            game.vector_lap_min_players, self._joins, self._laps,
+                            seat_of(game.winner), seat_of(game.second_place), game.great_comeback_occurred,
+                            self._seats(game.great_comeback_losers))
+        if self.writer is not None:
+            self.writer.append(encode_race(record))
+        return record
+
+
+# プロセス全体で共有するレースログファイル (無効なら None)
+_writer: Optional[RaceLogWriter] = RaceLogWriter() if RACE_LOG_ENABLED else None
+
+def start_recording(game: GameState, channel_id: int, course_name: str) -> Optional[RaceRecorder]:
+    """レース開始時に呼ぶ。記録係を game.recorder に設定して返す (無効なら None)"""
+    if _writer is None: return None
+    game.recorder = RaceRecorder(game, channel_id, course_name, _writer)
+    return game.recorder
+
+def finish_recording(game: GameState):
+    """レース終了時 (中断時も) に呼ぶ。失敗してもレースには影響させない"""
+    recorder = game.recorder
+    if recorder is None: return
+    try:
+        recorder.finish(game)
+    except Exception as e:
+        logger.error(f"Failed to write race log for guild {game.guild_id}: {e}", exc_info=True)
+
+
+# --- 読み込みと再生 ---
+def iter_records(path: str = RACE_LOG_PATH) -> Iterator[RaceRecord]:
+    """ファイル内のレコードを古い順に返す (書き込み途中で切れた末尾は無視する)"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    offset = 0
+    while offset + _LENGTH.size <= len(data):
+        (length,) = _LENGTH.unpack_from(data, offset)
+        start = offset + _LENGTH.size
+        if start + length > len(data):
+            logger.warning(f"Truncated race log record at offset {offset} in {path}."); break
+        yield decode_race(data[start:start + length])
+        offset = start + length
+
+
+def replay(record: RaceRecord) -> Tuple[GameState, RaceRecord]:
+    """記録のシードと参加者から GameState を作り直してレースを再実行し、(GameState, 再実行の記録) を返す"""
+    game = GameState(record.guild_id, RaceEvents(), points_saver=lambda *args: None, seed=record.seed,
+                     vector_lap_min_players=record.vector_lap_min_players)
+    RaceCourse(rng=game.rng).get_random_course() # bot.py と同じくゲーム作成直後にコースを選ぶ
+    for join in record.joins:
+        if join.is_bot: continue # CPU はシードから同じ作戦で作られる
+        player = Player(join.id, join.name, is_bot=False)
+        player.strategy = join.strategy
+        game.add_player(player)
+    recorder = RaceRecorder(game, record.channel_id, record.course_name)
+    game.recorder = recorder
+    game.race_started = True
+    build_race_script(game, record.course_name) # bot.py と同じ順序・同じ乱数の消費でレースを進める
+    return game, recorder.finish(game)
+
+
+def _describe_events(events: int) -> str:
+    return "".join(f"[{name}]" for flag, name in _EVENT_NAMES if events & flag)
+
+def _names(record: RaceRecord, seats: Tuple[int, ...]) -> str:
+    return ", ".join(record.joins[seat].name for seat in seats) or "なし"
+
+def _seat_name(record: RaceRecord, seat: Optional[int]) -> str:
+    return "なし" if seat is None else record.joins[seat].name
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=('list', 'replay'))
+    parser.add_argument('--path', default=RACE_LOG_PATH)
+    parser.add_argument('--index', type=int, default=-1, help="replay するレコードの番号 (負数は末尾から)")
+    args = parser.parse_args(argv)
+    logging.disable(logging.INFO) # ラップごとの INFO ログを出さない
+
+    records = list(iter_records(args.path))
+    if args.command == 'list':
+        for index, record in enumerate(records):
+            humans = sum(1 for join in record.joins if not join.is_bot)
+            started = datetime.fromtimestamp(record.started_at).strftime('%Y-%m-%d %H:%M:%S')
+            print(f"{index:>5} {started} guild={record.guild_id} seed={record.seed} humans={humans} "
+                  f"laps={len(record.laps)} winner={_seat_name(record, record.winner)} bytes={len(encode_race(record))}")
+        return 0
+
+    if not records:
+        print(f"No races in {args.path}."); return 1
+    if not -len(records) <= args.index < len(records):
+        print(f"Index {args.index} is out of range ({len(records)} races)."); return 1
+    record = records[args.index]
+    game, replayed = replay(record)
+    print(f"seed={record.seed} course={record.course_name} players={len(record.joins)}")
+    mismatches = 0
+    if replayed.joins != record.joins:
+        print("Participants differ (CPU strategies depend only on the seed)."); mismatches += 1
+    for lap_index, recorded in enumerate(record.laps):
+        actual = replayed.laps[lap_index] if lap_index < len(replayed.laps) else None
+        status = "OK" if actual == recorded else "MISMATCH"
+        mismatches += 0 if actual == recorded else 1
+        print(f"LAP {recorded.lap:>3} {_describe_events(recorded.events)} 脱落: {_names(record, recorded.eliminated)}"
+              f" / 復活: {_names(record, recorded.revived)}  {status}")
+        if actual is not None and actual != recorded:
+            print(f"        replay: {_describe_events(actual.events)} 脱落: {_names(record, actual.eliminated)}"
+                  f" / 復活: {_names(record, actual.revived)}")
+    if len(replayed.laps) != len(record.laps):
+        print(f"Lap count differs: recorded {len(record.laps)}, replayed {len(replayed.laps)}"); mismatches += 1
+    result_matches = (replayed.winner, replayed.second_place, replayed.great_comeback) == (record.winner, record.second_place, record.great_comeback)
+    print(f"優勝: {_seat_name(record, record.winner)} / 準優勝: {_seat_name(record, record.second_place)}"
+          f"{' (大逆転)' if record.great_comeback else ''}  {'OK' if result_matches else 'MISMATCH'}")
+    return 0 if mismatches == 0 and result_matches else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
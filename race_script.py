@@ -0,0 +1,163 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Iterator, List, NamedTuple, Sequence
+
+from game_logic import GameState
+
+logger = logging.getLogger(__name__)
+
+MAX_SKILL_DISPLAY = 5 # 1ラップで表示するスキルメッセージの最大数
+MAX_MESSAGE_LENGTH = 2000 # Discord の1メッセージの上限
+
+
+class ScriptLine(NamedTuple):
+    """レース実況の1メッセージ (送信後に delay 秒待つ)"""
+    kind: str # 'announce', 'lap', 'revolution', 'revival', 'accident', 'duel', 'outcome', 'overtakes', 'skills', 'quiet', 'summary', 'result'
+    text: str
+    delay: float
+
+
+def generate_race_script(game: GameState, course_name: str, resume: bool = False) -> Iterator[ScriptLine]:
+    """レースを進めながら実況メッセージを1つずつ返す
+
+    ゲームの進行はメッセージを取り出した分だけ進むので、取り出しながら送信すれば従来どおりの逐次進行、
+    list() で最後まで取り出せばレース全体を事前計算できる。乱数の消費順はどちらでも同じ。
+    resume=True ならアナウンスを省き、ラップの区切りから復元したゲームの次のラップから始める。"""
+    # アナウンサーコメント
+    if not resume:
+        favored_strategy = game.get_favored_strategy()
+        announcer_comment = game.race_events.get_announcer_comment(favored_strategy, course_name)
+        yield ScriptLine('announce', f"🎤 **アナウンス**\n{announcer_comment}", 3)
+
+    # 1. メインループ (ゲーム終了まで)
+    while not game.check_game_end():
+        # 1.1 ラップ開始処理
+        game.reset_lap_usage()
+        current_lap = game.current_lap
+        yield ScriptLine('lap', f"\n━━━━━━━━━━━━━━━━━━━━━\n**📢 LAP {current_lap}!**\n━━━━━━━━━━━━━━━━━━━━━", 2)
+
+        # 1.2 イベントフェーズ (革命、復活、強制脱落) は一騎打ちでないラップのみ
+        if not game.final_duel:
+            rev_happened, rev_msg, _, _ = game.process_revolution()
+            if rev_happened:
+                yield ScriptLine('revolution', f"\n🚨 **革命発生！** 🚨\n{rev_msg}", 3)
+                if game.check_game_end(): break # イベントで終了する可能性
+            if not game.game_finished:
+                _, revival_msgs = game.process_revivals()
+                if revival_msgs:
+                    yield ScriptLine('revival', "\n🔥 **猛烈な追い上げ！** 🔥", 0)
+                    for msg in revival_msgs: yield ScriptLine('revival', msg, 1.5)
+            if not game.game_finished:
+                _, forced_elim_msgs = game.process_forced_elimination()
+                if forced_elim_msgs:
+                    yield ScriptLine('accident', "\n💥 **アクシデント発生！** 💥", 0)
+                    yield ScriptLine('accident', forced_elim_msgs[0], 1)
+                    yield ScriptLine('accident', forced_elim_msgs[1], 2)
+                    if game.check_game_end(): break
+
+        # 1.3 アクションフェーズ (ペア対決 or 一騎打ち)
+        if game.game_finished: break
+        if game.final_duel:
+            logger.info(f"Lap {current_lap}: Processing final duel.")
+            battle_msgs, outcome_msg = game.process_final_duel()
+            if battle_msgs:
+                yield ScriptLine('duel', "\n🔥 **最終決戦！一騎打ち！** 🔥", 1)
+                for index, msg in enumerate(battle_msgs):
+                    yield ScriptLine('duel', msg, 3.5 if index == len(battle_msgs) - 1 else 2.5)
+            yield ScriptLine('outcome', f"\n**{outcome_msg}**", 0)
+            break
+
+        overtake_msgs, skill_msgs = game.process_lap_pairwise()
+        if overtake_msgs:
+            combined_overtakes = "\n💥 **今ラップの主な攻防！** 💥\n" + "\n".join(overtake_msgs)
+            if len(combined_overtakes) > MAX_MESSAGE_LENGTH:
+                logger.warning("Combined overtake message too long.")
+                combined_overtakes = "\n💥 **今ラップの主な攻防！** 💥\n（多数の追い抜きが発生）" # 短縮版
+            yield ScriptLine('overtakes', combined_overtakes, 2)
+        if skill_msgs:
+            if len(skill_msgs) > MAX_SKILL_DISPLAY:
+                # ランダムに選んで表示し、省略したことを示すメッセージを追加
+                display_skills = game.rng.sample(skill_msgs, MAX_SKILL_DISPLAY)
+                display_skills.append(f"（他 {len(skill_msgs) - MAX_SKILL_DISPLAY} 人もスキルを発揮！）")
+            else:
+                display_skills = skill_msgs
+            combined_skills = "\n✨ **各車の走り！** ✨\n" + "\n".join(display_skills)
+            if len(combined_skills) > MAX_MESSAGE_LENGTH:
+                logger.warning("Combined skill message too long even after sampling.")
+                combined_skills = "✨ **各車の走り！** ✨\n（多くのプレイヤーがスキルを発揮！）" # 短縮版
+            yield ScriptLine('skills', combined_skills, 2)
+        if not overtake_msgs and not skill_msgs:
+            yield ScriptLine('quiet', "\n🌀 静かなラップ...波乱は起きなかったようだ。", 1.5)
+
+        # 1.4 サマリーフェーズ
+        if game.game_finished: break
+        summary = game.get_lap_summary()
+        if "survivor_names" in summary: # 5人以下なら名前を表示
+            top_group_line = f" > トップグループ ({summary['survivors_count']}台): {', '.join(summary['survivor_names'])}"
+        else:
+            top_group_line = f" > トップグループ: {summary['survivors_count']}台"
+        summary_msg = (
+            f"📊 **LAP {game.current_lap} 結果**\n"
+            f"{top_group_line}\n"
+            f" > 下位グループ: {summary['eliminated_names']}"
+        )
+        if 'revived_names' in summary:
+            summary_msg += f"\n > 追い上げ: {summary['revived_names']}"
+        yield ScriptLine('summary', summary_msg, 3)
+
+        if game.check_game_end(): logger.info(f"Game ended after lap {current_lap} summary."); break
+
+    # 2. 最終結果発表 (一騎打ち/大逆転の結果メッセージはループ内で送信済み)
+    yield from _result_lines(game)
+
+
+def _result_lines(game: GameState) -> Iterator[ScriptLine]:
+    if game.great_comeback_occurred and game.great_comeback_winner:
+        loser_names = " / ".join([p.name for p in game.great_comeback_losers])
+        yield ScriptLine('result', (
+            f"\n--- 最終結果 ---\n"
+            f"🥇 **優勝:** {game.great_comeback_winner.name} (大逆転！)\n"
+            f"🥈 **準優勝:** {loser_names} (同時)"
+        ), 0)
+    elif game.final_duel and game.winner and game.second_place:
+        yield ScriptLine('result', (
+            f"\n--- 最終結果 ---\n"
+            f"🥇 **優勝:** {game.winner.name}\n"
+            f"🥈 **準優勝:** {game.second_place.name}"
+        ), 0)
+    elif game.winner: # 一人残りでの通常終了
+        yield ScriptLine('result', f"\n🏆🏆🏆 **レース終了！ 優勝者は {game.winner.name} です！おめでとう！** 🏆🏆🏆", 0)
+        yield ScriptLine('result', "\u200B", 0) # 空行
+        yield ScriptLine('result', (
+            f"\n--- 最終結果 ---\n"
+            f"🥇 **優勝:** {game.winner.name}\n"
+            f"(準優勝者なし)"
+        ), 0)
+    elif game.game_finished: # 勝者なし終了
+        yield ScriptLine('result', "\n🏁 レース終了！今回は勝者なしとなりました...！", 0)
+
+
+def build_race_script(game: GameState, course_name: str, resume: bool = False) -> List[ScriptLine]:
+    """レースを最後まで計算し、実況メッセージの一覧を返す (ポイント保存もこの中で行われる)"""
+    return list(generate_race_script(game, course_name, resume))
+
+
+class RacePlayback:
+    """事前計算したレースを送信する再生カーソル (GameState は持たない)"""
+    __slots__ = ('lines', 'position')
+
+    def __init__(self, lines: Sequence[ScriptLine]):
+        self.lines = tuple(lines)
+        self.position = 0 # 次に送るメッセージの番号
+
+    @property
+    def remaining(self) -> int:
+        return len(self.lines) - self.position
+
+    async def play(self, send: Callable[[ScriptLine], Awaitable], sleep: Callable[[float], Awaitable] = asyncio.sleep):
+        """残りのメッセージを順に send に渡す (中断後に呼び直すと続きから再生する)"""
+        while self.position < len(self.lines):
+            line = self.lines[self.position]
+            await send(line)
+            self.position += 1
+            if line.delay > 0: await sleep(line.delay)
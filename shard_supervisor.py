@@ -0,0 +1,181 @@
+"""シャード分割した Bot を複数プロセスで起動・監視するスーパーバイザー
+
+    python -m shard_supervisor --shards 4 --workers 2
+    python -m shard_supervisor --shards 4 --workers 2 --fake-gateway --fake-guilds 40 --fake-crash-after 2
+
+シャード 0..shards-1 をワーカー数で分け (ワーカー i はシャード i, i+workers, ...)、
+ワーカーごとに SHARD_COUNT / SHARD_IDS を設定して bot.py を別プロセスで起動する。
+各ワーカーは担当シャードのサーバーのレースだけを持ち、DB接続プールもプロセスごとに独立する。
+レースログ (RACE_LOG_PATH) はワーカーごとのファイルに分ける (ローテーションをプロセスごとに行うため)。
+ワーカーが終了したら待ち時間を倍にしながら再起動し、短時間での異常終了が続いたら諦める。
+--fake-gateway では Discord に接続せず、fake_gateway.py の疑似サーバーでレースを開催する
+(正常終了したワーカーは再起動しない)。
+"""
+import os
+import sys
+import time
+import signal
+import logging
+import argparse
+import subprocess
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+BOT_SCRIPT = os.path.join(REPO_ROOT, "bot.py")
+
+# --- スーパーバイザーの設定 ---
+SHARD_RESTART_BACKOFF_SECONDS = float(os.environ.get("SHARD_RESTART_BACKOFF_SECONDS", "1.0")) # 再起動までの最初の待ち時間
+SHARD_RESTART_MAX_BACKOFF_SECONDS = float(os.environ.get("SHARD_RESTART_MAX_BACKOFF_SECONDS", "60.0"))
+SHARD_STABLE_SECONDS = float(os.environ.get("SHARD_STABLE_SECONDS", "60.0")) # これより長く動いたら正常稼働とみなす
+SHARD_MAX_QUICK_FAILURES = int(os.environ.get("SHARD_MAX_QUICK_FAILURES", "5")) # 短時間での異常終了がこの回数続いたら諦める
+
+
+def prepare_database():
+    """DBのテーブル作成・移行をワーカー起動前に1回だけ行う (ワーカーが同時に create_all して衝突しないように)"""
+    from app import app, db # app のインポート時にテーブル作成・列/インデックスの追加が行われる
+    with app.app_context():
+        db.engine.dispose() # ワーカーは別プロセスで自分の接続プールを作る
+
+
+def partition_shards(shard_count: int, workers: int) -> List[List[int]]:
+    """シャード番号をワーカーに振り分ける (ワーカー i はシャード i, i+workers, ...)"""
+    workers = max(1, min(workers, shard_count))
+    return [list(range(index, shard_count, workers)) for index in range(workers)]
+
+
+class ShardWorker:
+    """1つのワーカープロセスの状態"""
+
+    def __init__(self, index: int, shard_ids: List[int]):
+        self.index = index
+        self.shard_ids = shard_ids
+        self.process: Optional[subprocess.Popen] = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.quick_failures = 0 # 連続した短時間での異常終了の回数
+        self.restart_at: Optional[float] = None # 再起動の予定時刻
+        self.finished = False # 再起動しない (正常終了 or 諦めた)
+
+    @property
+    def name(self) -> str:
+        return f"worker {self.index} (shards {','.join(map(str, self.shard_ids))})"
+
+
+class ShardSupervisor:
+    """ワーカープロセスを起動し、終了したものを再起動する"""
+
+    def __init__(self, shard_count: int, workers: int, extra_env: Optional[Dict[str, str]] = None,
+                 restart_on_success: bool = True, log_dir: str = ".",
+                 backoff: float = SHARD_RESTART_BACKOFF_SECONDS, max_backoff: float = SHARD_RESTART_MAX_BACKOFF_SECONDS,
+                 stable_seconds: float = SHARD_STABLE_SECONDS, max_quick_failures: int = SHARD_MAX_QUICK_FAILURES):
+        self.shard_count = shard_count
+        self.workers = [ShardWorker(index, shard_ids) for index, shard_ids in enumerate(partition_shards(shard_count, workers))]
+        self.extra_env = dict(extra_env or {})
+        self.restart_on_success = restart_on_success
+        self.log_dir = log_dir
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stable_seconds = stable_seconds
+        self.max_quick_failures = max(1, max_quick_failures)
+        self._stopping = False
+
+    def _worker_env(self, worker: ShardWorker) -> Dict[str, str]:
+        env = dict(os.environ)
+        env.update(self.extra_env)
+        env["SHARD_COUNT"] = str(self.shard_count)
+        env["SHARD_IDS"] = ",".join(map(str, worker.shard_ids))
+        env["SHARD_WORKER_RESTARTS"] = str(worker.restarts)
+        env["RACE_LOG_PATH"] = os.path.join(self.log_dir, f"race_log.worker{worker.index}.bin") # ローテーションはプロセスごとに行う
+        return env
+
+    def _start(self, worker: ShardWorker):
+        worker.process = subprocess.Popen([sys.executable, BOT_SCRIPT], cwd=REPO_ROOT, env=self._worker_env(worker))
+        worker.started_at = time.monotonic()
+        worker.restart_at = None
+        logger.info(f"Started {worker.name}: pid {worker.process.pid} (restarts: {worker.restarts}).")
+
+    def _on_exit(self, worker: ShardWorker, returncode: int):
+        uptime = time.monotonic() - worker.started_at
+        worker.process = None
+        if returncode == 0 and not self.restart_on_success:
+            logger.info(f"{worker.name} finished after {uptime:.1f}s.")
+            worker.finished = True
+            return
+        worker.quick_failures = worker.quick_failures + 1 if uptime < self.stable_seconds else 0
+        if worker.quick_failures >= self.max_quick_failures:
+            logger.critical(f"{worker.name} exited {worker.quick_failures} times in a row within {self.stable_seconds:.0f}s. Giving up.")
+            worker.finished = True
+            return
+        delay = min(self.max_backoff, self.backoff * (2 ** worker.quick_failures))
+        worker.restart_at = time.monotonic() + delay
+        logger.warning(f"{worker.name} exited with code {returncode} after {uptime:.1f}s. Restarting in {delay:.1f}s.")
+
+    def stop(self, *args):
+        """全ワーカーを終了させる (シグナルハンドラからも呼ばれる)"""
+        self._stopping = True
+        for worker in self.workers:
+            if worker.process is not None and worker.process.poll() is None:
+                worker.process.terminate()
+
+    def run(self, poll_interval: float = 0.5) -> int:
+        """全ワーカーが終了する (または stop される) まで監視し、諦めたワーカーがあれば 1 を返す"""
+        for worker in self.workers:
+            self._start(worker)
+        while not self._stopping and not all(worker.finished for worker in self.workers):
+            time.sleep(poll_interval)
+            for worker in self.workers:
+                if worker.process is not None:
+                    returncode = worker.process.poll()
+                    if returncode is not None: self._on_exit(worker, returncode)
+                elif worker.restart_at is not None and time.monotonic() >= worker.restart_at and not self._stopping:
+                    worker.restarts += 1
+                    self._start(worker)
+        for worker in self.workers:
+            if worker.process is not None:
+                try:
+                    worker.process.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    worker.process.kill()
+        gave_up = [worker.name for worker in self.workers if worker.finished and worker.quick_failures >= self.max_quick_failures]
+        restarts = sum(worker.restarts for worker in self.workers)
+        logger.info(f"Supervisor stopped: {len(self.workers)} workers, {restarts} restarts, gave up: {gave_up or 'none'}.")
+        return 1 if gave_up else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--shards', type=int, default=int(os.environ.get("SHARD_COUNT", "0")) or (os.cpu_count() or 1),
+                        help="シャードの総数 (既定: SHARD_COUNT または CPU 数)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="ワーカープロセス数 (シャード数が上限)")
+    parser.add_argument('--log-dir', default=".", help="ワーカーごとのレースログの出力先")
+    parser.add_argument('--fake-gateway', action='store_true', help="Discord に接続せず疑似サーバーでレースを開催する")
+    parser.add_argument('--fake-guilds', type=int, default=8, help="疑似サーバーの総数 (--fake-gateway)")
+    parser.add_argument('--fake-races', type=int, default=1, help="1サーバーで開催するレース数 (--fake-gateway)")
+    parser.add_argument('--fake-players', type=int, default=10, help="1レースの人間プレイヤー数 (--fake-gateway)")
+    parser.add_argument('--fake-crash-after', type=int, default=0, help="各ワーカーを初回だけこのレース数で異常終了させる (--fake-gateway)")
+    args = parser.parse_args(argv)
+    if args.shards < 1 or args.workers < 1:
+        parser.error("--shards and --workers must be at least 1")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    extra_env: Dict[str, str] = {}
+    if args.fake_gateway:
+        extra_env.update({
+            "FAKE_GATEWAY": "True",
+            "FAKE_GATEWAY_GUILDS": str(args.fake_guilds),
+            "FAKE_GATEWAY_RACES": str(args.fake_races),
+            "FAKE_GATEWAY_PLAYERS": str(args.fake_players),
+            "FAKE_GATEWAY_CRASH_AFTER": str(args.fake_crash_after),
+        })
+    os.makedirs(args.log_dir, exist_ok=True)
+    prepare_database()
+    supervisor = ShardSupervisor(args.shards, args.workers, extra_env, restart_on_success=not args.fake_gateway, log_dir=args.log_dir)
+    signal.signal(signal.SIGINT, supervisor.stop)
+    signal.signal(signal.SIGTERM, supervisor.stop)
+    return supervisor.run()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""ヘッドレスのレースシミュレーター (Discord・待ち時間・DB保存なし)
+
+    python -m simulate --races 100000 --humans 20 --seed 1
+    python -m simulate --races 20000 --set FORCED_ELIM_MAX_CHANCE=0.3 --json result.json
+
+bot.py と同じ race_script.generate_race_script で GameState を最後まで進め、
+作戦ごとの勝率・ラップ数の分布・革命/大逆転の発生率・獲得ポイントの分布を集計する。
+レースはバッチに分けてプロセスプールで並列に実行する。
+--set で GameState の定数 (FORCED_ELIM_* など) を上書きしてバランス調整を試せる。
+"""
+import os
+import sys
+import json
+import random
+import logging
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from game_logic import GameState, Player, WINNER_POINTS
+from race_events import RaceEvents, RaceCourse
+from race_script import generate_race_script
+
+logger = logging.getLogger(__name__)
+
+MAX_LAPS = 500 # 万一終わらないレースの打ち切りラップ数
+
+
+class SimulationStats:
+    """シミュレーション結果の集計 (バッチごとに作り、merge でまとめる)"""
+
+    def __init__(self):
+        self.races = 0
+        self.entrants_by_strategy: Counter = Counter() # 作戦ごとの出走数 (CPU含む)
+        self.wins_by_strategy: Counter = Counter() # 作戦ごとの優勝数
+        self.favored_wins = 0 # 有利作戦のプレイヤーが優勝したレース数
+        self.human_wins = 0
+        self.no_winner = 0
+        self.lap_counts: Counter = Counter() # ラップ数 -> レース数
+        self.revolutions = 0 # 革命の発生回数
+        self.races_with_revolution = 0
+        self.great_comebacks = 0
+        self.final_duels = 0
+        self.forced_eliminations = 0 # 強制脱落イベントの発生回数
+        self.revivals = 0 # 復活した延べ人数
+        self.human_points: Counter = Counter() # 1人1レースの獲得ポイント -> 件数
+        self.cpu_points: Counter = Counter()
+
+    def merge(self, other: 'SimulationStats'):
+        for name, value in vars(other).items():
+            if isinstance(value, Counter): getattr(self, name).update(value)
+            else: setattr(self, name, getattr(self, name) + value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: dict(sorted(value.items())) if isinstance(value, Counter) else value for name, value in vars(self).items()}
+
+
+def _count_lap_events(events: Dict[str, int], kinds: Counter):
+    """1ラップ分の実況メッセージの種類から出来事の回数を数える"""
+    events["revolutions"] += 1 if kinds['revolution'] else 0
+    events["forced_eliminations"] += 1 if kinds['accident'] else 0
+    events["revivals"] += max(0, kinds['revival'] - 1) # 見出し1行 + 復活者1人につき1行
+
+
+def run_race(humans: int) -> Tuple[GameState, Dict[str, int]]:
+    """1レースを最後まで進め、(終了後の GameState, 出来事の回数) を返す"""
+    game = GameState("simulate", RaceEvents(), points_saver=lambda *args: None) # ポイントはDBに保存しない
+    course_name, _ = RaceCourse(rng=game.rng).get_random_course() # bot.py と同じくゲーム作成直後にコースを選ぶ
+    for i in range(humans):
+        player = Player(i + 1, f"Player{i + 1}")
+        player.strategy = random.choice(GameState.STRATEGIES)
+        game.add_player(player)
+    game.race_started = True
+    events = {"revolutions": 0, "forced_eliminations": 0, "revivals": 0}
+
+    # bot.py と同じ generate_race_script でレースを進める (実況テキストは出来事を数えるためだけに使う)
+    lap_kinds: Counter = Counter()
+    for line in generate_race_script(game, course_name):
+        if line.kind == 'lap':
+            _count_lap_events(events, lap_kinds); lap_kinds.clear()
+            if game.current_lap > MAX_LAPS:
+                logger.warning(f"Race did not finish within {MAX_LAPS} laps."); break
+        lap_kinds[line.kind] += 1
+    _count_lap_events(events, lap_kinds)
+    return game, events
+
+
+def run_batch(humans: int, races: int, seed: str) -> SimulationStats:
+    """races 回のレースを実行して集計する (プロセスプールのワーカーで実行される)"""
+    random.seed(seed)
+    stats = SimulationStats()
+    for _ in range(races):
+        game, events = run_race(humans)
+        stats.races += 1
+        stats.lap_counts[game.current_lap] += 1
+        stats.revolutions += events["revolutions"]
+        stats.races_with_revolution += 1 if events["revolutions"] else 0
+        stats.forced_eliminations += events["forced_eliminations"]
+        stats.revivals += events["revivals"]
+        stats.great_comebacks += 1 if game.great_comeback_occurred else 0
+        stats.final_duels += 1 if game.final_duel else 0
+        for player in game.initial_players:
+            stats.entrants_by_strategy[player.strategy] += 1
+        if game.winner is None:
+            stats.no_winner += 1
+        else:
+            stats.wins_by_strategy[game.winner.strategy] += 1
+            stats.favored_wins += 1 if game.winner.strategy == game.get_favored_strategy() else 0
+            stats.human_wins += 0 if game.winner.is_bot else 1
+        # 大逆転・一騎打ちで終わったレースも含め、ルール上の獲得ポイントを集計する
+        for player_id, points in game.calculate_points().items():
+            (stats.cpu_points if player_id.startswith("CPU_") else stats.human_points)[points] += 1
+    return stats
+
+
+def _init_worker(overrides: Dict[str, Any]):
+    """ワーカープロセスの初期化 (ログ抑制と定数の上書き)"""
+    logging.disable(logging.INFO) # ラップごとの INFO ログを出さない
+    for name, value in overrides.items():
+        setattr(GameState, name, value)
+
+
+def parse_overrides(assignments: List[str]) -> Dict[str, Any]:
+    """--set NAME=VALUE を GameState の定数の上書き内容に変換する"""
+    overrides: Dict[str, Any] = {}
+    for assignment in assignments:
+        name, sep, raw_value = assignment.partition("=")
+        if not sep or not hasattr(GameState, name) or not name.isupper():
+            raise ValueError(f"Unknown GameState constant: {assignment}")
+        current = getattr(GameState, name)
+        overrides[name] = type(current)(raw_value) if isinstance(current, (int, float)) else raw_value
+    return overrides
+
+
+def simulate(races: int, humans: int, seed: int, workers: int, batch_size: int,
+             overrides: Optional[Dict[str, Any]] = None) -> SimulationStats:
+    """races 回のレースをバッチに分けて実行し、集計結果を返す (workers=1 なら同じプロセスで実行)"""
+    overrides = overrides or {}
+    batches = [(humans, min(batch_size, races - start), f"{seed}-{index}")
+               for index, start in enumerate(range(0, races, batch_size))]
+    total = SimulationStats()
+    if workers <= 1:
+        _init_worker(overrides)
+        for batch in batches: total.merge(run_batch(*batch))
+        return total
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(overrides,)) as executor:
+        futures = [executor.submit(run_batch, *batch) for batch in batches]
+        for future in futures: total.merge(future.result())
+    return total
+
+
+def _percentile(counts: Counter, fraction: float) -> int:
+    """度数分布 {値: 件数} から分位点を返す"""
+    target = sum(counts.values()) * fraction
+    seen = 0
+    for value in sorted(counts):
+        seen += counts[value]
+        if seen >= target: return value
+    return 0
+
+
+def print_report(stats: SimulationStats, humans: int):
+    races = stats.races
+    print(f"races: {races}, humans: {humans} (+ CPU)")
+
+    print("\n[作戦ごとの勝率]")
+    print(f"{'strategy':<14}{'entrants':>10}{'wins':>10}{'win share':>11}{'win/entrant':>13}")
+    for strategy in GameState.STRATEGIES:
+        entrants, wins = stats.entrants_by_strategy[strategy], stats.wins_by_strategy[strategy]
+        print(f"{strategy:<14}{entrants:>10}{wins:>10}{wins / races:>10.1%}{wins / entrants if entrants else 0:>13.2%}")
+    print(f"有利作戦の優勝: {stats.favored_wins / races:.1%} / 人間の優勝: {stats.human_wins / races:.1%} / 勝者なし: {stats.no_winner / races:.2%}")
+
+    print("\n[ラップ数]")
+    mean_laps = sum(lap * count for lap, count in stats.lap_counts.items()) / races
+    print(f"mean {mean_laps:.1f}, min {min(stats.lap_counts)}, p50 {_percentile(stats.lap_counts, 0.5)}, "
+          f"p90 {_percentile(stats.lap_counts, 0.9)}, p99 {_percentile(stats.lap_counts, 0.99)}, max {max(stats.lap_counts)}")
+    buckets: Counter = Counter()
+    for lap, count in stats.lap_counts.items(): buckets[(lap - 1) // 5 * 5 + 1] += count
+    for start in sorted(buckets):
+        share = buckets[start] / races
+        print(f"  {start:>3}-{start + 4:<3} {share:>6.1%} {'#' * round(share * 50)}")
+
+    print("\n[イベント]")
+    print(f"革命: {stats.races_with_revolution / races:.1%} のレースで発生 (1レース平均 {stats.revolutions / races:.2f} 回)")
+    print(f"大逆転: {stats.great_comebacks / races:.2%} / 一騎打ち到達: {stats.final_duels / races:.1%}")
+    print(f"強制脱落: 1レース平均 {stats.forced_eliminations / races:.2f} 回 / 復活: 1レース平均 {stats.revivals / races:.1f} 人")
+
+    print("\n[獲得ポイント (人間1人1レースあたり)]")
+    human_total = sum(stats.human_points.values())
+    if human_total:
+        mean_points = sum(points * count for points, count in stats.human_points.items()) / human_total
+        print(f"mean {mean_points:.2f} (優勝 {WINNER_POINTS}pt)")
+        for points in sorted(stats.human_points, reverse=True):
+            print(f"  {points:>3}pt {stats.human_points[points] / human_total:>7.2%}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--races', type=int, default=10_000)
+    parser.add_argument('--humans', type=int, default=20, help="1レースの人間プレイヤー数 (CPU 7人は別)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="プロセス数 (1なら並列化しない)")
+    parser.add_argument('--batch-size', type=int, default=500, help="1ワーカーにまとめて渡すレース数")
+    parser.add_argument('--set', dest='overrides', action='append', default=[], metavar='NAME=VALUE',
+                        help="GameState の定数を上書き (例: FORCED_ELIM_MAX_CHANCE=0.3)")
+    parser.add_argument('--json', metavar='PATH', help="集計結果を JSON で保存する")
+    args = parser.parse_args(argv)
+
+    try:
+        overrides = parse_overrides(args.overrides)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.races < 1:
+        parser.error("--races must be at least 1")
+
+    stats = simulate(args.races, args.humans, args.seed, args.workers, max(1, args.batch_size), overrides)
+    print_report(stats, args.humans)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"races": args.races, "humans": args.humans, "seed": args.seed, "overrides": overrides,
+                       "stats": stats.to_dict()}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
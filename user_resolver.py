@@ -0,0 +1,121 @@
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+# --- 表示名解決の設定 ---
+USER_NAME_CACHE_TTL_SECONDS = float(os.environ.get("USER_NAME_CACHE_TTL_SECONDS", "3600")) # REST で取得した名前を保持する時間
+USER_NAME_CACHE_MAX_ENTRIES = int(os.environ.get("USER_NAME_CACHE_MAX_ENTRIES", "10000"))
+USER_FETCH_MAX_CONCURRENCY = int(os.environ.get("USER_FETCH_MAX_CONCURRENCY", "5")) # 同時に投げる fetch_user の上限
+
+
+class UserNameResolver:
+    """ランキング表示用に Discord ID から表示名を解決するクラス
+
+    1. サーバーのメンバーキャッシュ / bot のユーザーキャッシュ (APIアクセスなし)
+    2. TTL 付きの表示名キャッシュ (以前 REST で取得したもの)
+    3. bot.fetch_user (REST)。重複を除き、同時実行数を制限して並列に実行する
+    の順に参照する。取得に失敗した場合は従来どおりの代替文字列を返す。"""
+
+    def __init__(self, bot: discord.Client, ttl_seconds: float = USER_NAME_CACHE_TTL_SECONDS,
+                 max_entries: int = USER_NAME_CACHE_MAX_ENTRIES, max_concurrency: int = USER_FETCH_MAX_CONCURRENCY):
+        self.bot = bot
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._names: "OrderedDict[int, Tuple[float, str]]" = OrderedDict() # user_id -> (取得時刻, 表示名)
+        self._inflight: Dict[int, asyncio.Task] = {} # 実行中の fetch_user (同じIDへの同時リクエストをまとめる)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._max_concurrency = max(1, max_concurrency)
+        self.stats = {"local_hits": 0, "cache_hits": 0, "fetches": 0, "failures": 0}
+
+    def _get_cached(self, user_id: int) -> Optional[str]:
+        entry = self._names.get(user_id)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > self.ttl_seconds:
+            del self._names[user_id]
+            return None
+        self._names.move_to_end(user_id)
+        return entry[1]
+
+    def _remember(self, user_id: int, name: str):
+        self._names[user_id] = (time.monotonic(), name)
+        self._names.move_to_end(user_id)
+        while len(self._names) > self.max_entries:
+            self._names.popitem(last=False)
+
+    async def _fetch_name(self, user_id: int) -> Tuple[bool, str]:
+        """REST API から表示名を取得し (成功したか, 表示名または代替文字列) を返す"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        async with self._semaphore:
+            self.stats["fetches"] += 1
+            try:
+                user = await self.bot.fetch_user(user_id)
+            except discord.NotFound:
+                self.stats["failures"] += 1
+                return False, f"見つからないUser({user_id})"
+            except Exception as e:
+                self.stats["failures"] += 1
+                logger.error(f"Error fetching user {user_id} for ranking: {e}")
+                return False, f"エラー({user_id})"
+        if not user:
+            self.stats["failures"] += 1
+            return False, f"不明なUser({user_id})"
+        self._remember(user_id, user.display_name)
+        return True, user.display_name
+
+    async def resolve_many(self, discord_ids: Iterable[str], guild: Optional[discord.Guild] = None,
+                           include_failures: bool = True) -> Dict[str, str]:
+        """discord_id (文字列) のリストを {discord_id: 表示名} に解決する
+        include_failures=False の場合、解決できなかったIDは結果に含めない (DB保存用)"""
+        names: Dict[str, str] = {}
+        to_fetch: Dict[int, str] = {} # user_id -> discord_id 文字列
+
+        for discord_id_str in dict.fromkeys(discord_ids): # 重複を除く (順序は維持)
+            try:
+                user_id = int(discord_id_str)
+            except ValueError:
+                if include_failures:
+                    names[discord_id_str] = f"不正なID({discord_id_str})"
+                continue
+
+            member = guild.get_member(user_id) if guild else None
+            user = member or self.bot.get_user(user_id)
+            if user:
+                self.stats["local_hits"] += 1
+                names[discord_id_str] = user.display_name
+                continue
+
+            cached_name = self._get_cached(user_id)
+            if cached_name is not None:
+                self.stats["cache_hits"] += 1
+                names[discord_id_str] = cached_name
+                continue
+
+            to_fetch[user_id] = discord_id_str
+
+        if to_fetch:
+            tasks = []
+            for user_id in to_fetch:
+                task = self._inflight.get(user_id)
+                if task is None:
+                    task = asyncio.ensure_future(self._fetch_name(user_id))
+                    self._inflight[user_id] = task
+                    task.add_done_callback(lambda _t, uid=user_id: self._inflight.pop(uid, None))
+                tasks.append(task)
+            # 他の呼び出し元と共有しているタスクがキャンセルに巻き込まれないよう shield する
+            results = await asyncio.gather(*(asyncio.shield(task) for task in tasks), return_exceptions=True)
+            for (user_id, discord_id_str), result in zip(to_fetch.items(), results):
+                if isinstance(result, tuple) and result[0]:
+                    names[discord_id_str] = result[1]
+                elif include_failures:
+                    names[discord_id_str] = result[1] if isinstance(result, tuple) else f"エラー({discord_id_str})"
+
+        return names